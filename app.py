@@ -1,15 +1,22 @@
 from flask import Flask
 from dotenv import load_dotenv
 import logging
+import sys
 from datetime import datetime
 import os
 from routes.chat_routes import chat_bp
 from routes.health_routes import health_bp
 from routes.admin_routes import admin_bp
 from routes.queue_routes import queue_bp
+from routes.metrics_routes import metrics_bp
 from middlewares.auth import auth_middleware
+from middlewares.forwarding import forwarding_middleware
+from middlewares.metrics import metrics_start, metrics_record
+from middlewares.tracing import tracing_start, tracing_finish, tracing_teardown
+from middlewares.rate_limit import rate_limit_middleware, rate_limit_teardown
 from utils.logging_config import setup_logging
 from utils.config_manager import config_manager
+from utils.lifecycle import lifecycle
 
 load_dotenv()
 
@@ -25,20 +32,40 @@ def create_app() -> Flask:
     os.makedirs(log_dir, exist_ok=True)
     setup_logging(log_dir)
 
+    app.before_request(metrics_start)
+    app.before_request(tracing_start)
+    # Background services start per process; this covers servers that fork
+    # without calling lifecycle.start() themselves
+    app.before_request(lifecycle.start)
     app.before_request(auth_middleware)
+    app.before_request(rate_limit_middleware)
+    app.before_request(forwarding_middleware)
+    app.after_request(metrics_record)
+    app.after_request(tracing_finish)
+    app.teardown_request(rate_limit_teardown)
+    app.teardown_request(tracing_teardown)
 
     app.register_blueprint(chat_bp,   url_prefix='/api/chat')
     app.register_blueprint(health_bp, url_prefix='/api/health')
     app.register_blueprint(admin_bp,  url_prefix='/api/admin')
     app.register_blueprint(queue_bp,  url_prefix='/api/queue')
+    app.register_blueprint(metrics_bp)
     
     return app
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(
-        host=config_manager.get('HOST'),
-        port=config_manager.get('PORT'),
-        debug=config_manager.get_bool('DEBUG')
-    )
+    if sys.argv[1:2] == ['serve']:
+        # Workers import `app`; serving from here would build the app twice
+        raise SystemExit("Run the production server with: python -m server " + " ".join(sys.argv[2:]))
+    else:
+        debug = config_manager.get_bool('DEBUG')
+        # With the debug reloader only the child process serves requests
+        if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            lifecycle.start()
+        app.run(
+            host=config_manager.get('HOST'),
+            port=config_manager.get('PORT'),
+            debug=debug
+        )
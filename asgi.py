@@ -0,0 +1,206 @@
+"""
+ASGI entry point.
+
+`POST /api/chat/send` is served natively on the event loop, so a client
+waiting on a long Grok answer costs a coroutine rather than an OS thread.
+Every other route, and chat requests that must be forwarded to another
+node, fall through to the Flask app.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+from typing import Dict, Any, Callable, Awaitable, List
+from asgiref.wsgi import WsgiToAsgi
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import time
+from app import app as flask_app
+from grok import close_async_http_client
+from middlewares.auth import check_access, identify_client
+from middlewares.metrics import observe_request
+from middlewares.rate_limit import check_rate_limit, forwarded_by_peer
+from models.chat_handler import accepts_attachments, handle_chat_request_async, unsupported_model, unavailable_model
+from routes.chat_routes import handle_base64_files
+from utils.cluster import cluster, FORWARDED_HEADER
+from utils.config_manager import config_manager
+from utils.deadline import Deadline, DEADLINE_HEADER, DEADLINE_FIELD, resolve_timeout
+from utils.lifecycle import lifecycle
+from utils.rate_limiter import rate_limiter
+from utils.session_manager import session_manager
+from utils.tracing import tracer
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+async def app(scope: Dict[str, Any], receive: Callable[[], Awaitable[Dict]], send: Callable) -> None:
+    """ASGI application"""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"].rstrip("/") == "/api/chat/send":
+        body = await _read_body(receive)
+        data = _parse_json(body)
+        session_id = data.get("session_id") if isinstance(data, dict) else None
+        if not (config_manager.get_bool('CLUSTER_FORWARDING') and session_id and not cluster.is_local(session_id)):
+            await _chat_send(scope, data, send)
+            return
+        receive = _replay(body)
+
+    await wsgi_app(scope, receive, send)
+
+async def _lifespan(receive: Callable, send: Callable) -> None:
+    """Handle ASGI startup and shutdown events"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            lifecycle.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await close_async_http_client()
+            lifecycle.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def _chat_send(scope: Dict[str, Any], data: Any, send: Callable) -> None:
+    """Async counterpart of routes.chat_routes.send_message"""
+    started = time.perf_counter()
+    status = 500
+    model = data.get("model") if isinstance(data, dict) else None
+    token = tracer.begin("POST /api/chat/send", started, model=model)
+
+    async def send_and_record(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            trace = tracer.current()
+            trace.attributes["status"] = status
+            if config_manager.get_bool('SERVER_TIMING_ENABLED'):
+                message = {**message, "headers": [*message["headers"],
+                                                  (b"server-timing", trace.server_timing().encode("latin-1"))]}
+        await send(message)
+
+    try:
+        await _admit_chat(scope, data, send_and_record)
+    finally:
+        tracer.end(token)
+        observe_request("/api/chat/send", model, status, time.perf_counter() - started)
+
+async def _admit_chat(scope: Dict[str, Any], data: Any, send: Callable) -> None:
+    """Check access and rate limits, then serve the chat request"""
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+    client = scope.get("client")
+    denial = check_access(headers.get("x-auth-token"), client[0] if client else None)
+    if denial:
+        await _send_json(send, {"status": False, "message": denial[1], "data": None}, denial[0])
+        return
+
+    address = client[0] if client else None
+    limited = None
+    if (config_manager.get_bool('RATE_LIMIT_ENABLED')
+            and not forwarded_by_peer(address, headers.get(FORWARDED_HEADER.lower()))):
+        limited = identify_client(headers.get("x-auth-token"))
+    if limited:
+        rejection = check_rate_limit(limited, address)
+        if rejection:
+            await _send_json(send, *rejection)
+            return
+    try:
+        await _serve_chat(headers, data, send)
+    finally:
+        if limited:
+            rate_limiter.release(limited["name"])
+
+async def _serve_chat(headers: Dict[str, str], data: Any, send: Callable) -> None:
+    """Validate and run an admitted chat request"""
+    if not isinstance(data, dict) or not data.get("model") or not data.get("message"):
+        await _send_json(send, {"status": False, "message": "Missing required fields", "data": None}, 400)
+        return
+
+    model = data["model"]
+    invalid = unsupported_model(model)
+    if invalid:
+        await _send_json(send, invalid, 400)
+        return
+    unavailable = unavailable_model(model)
+    if unavailable:
+        await _send_json(send, *unavailable)
+        return
+
+    try:
+        deadline = Deadline.after(
+            resolve_timeout(model, headers.get(DEADLINE_HEADER.lower()), data.get(DEADLINE_FIELD))
+        )
+    except ValueError as e:
+        await _send_json(send, {"status": False, "message": str(e), "data": None}, 400)
+        return
+
+    session_id = data.get("session_id")
+    loop = asyncio.get_running_loop()
+    temp_files: List[str] = []
+    try:
+        if accepts_attachments(model):
+            temp_files = await loop.run_in_executor(None, contextvars.copy_context().run,
+                                                    handle_base64_files, data.get("files", []))
+
+        if not session_id:
+            session_id = await loop.run_in_executor(None, session_manager.create_session, model)
+            if not session_id:
+                await _send_json(
+                    send,
+                    {"status": False, "message": "Session limit reached, try again later", "data": None},
+                    429,
+                    {"Retry-After": str(config_manager.get('SESSION_OVERFLOW_RETRY_AFTER_SECONDS'))}
+                )
+                return
+
+        response = await handle_chat_request_async(model, data["message"], session_id, temp_files, deadline)
+        await _send_json(send, response, 504 if not response["status"] and deadline.expired else 200)
+
+    except Exception as e:
+        logging.error(f"Error in async chat endpoint: {str(e)}")
+        await _send_json(send, {"status": False, "message": "Internal server error", "data": None}, 500)
+    finally:
+        for temp_file in temp_files:
+            try:
+                os.unlink(temp_file)
+            except OSError:
+                pass
+
+async def _read_body(receive: Callable) -> bytes:
+    """Collect the full request body"""
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+def _parse_json(body: bytes) -> Any:
+    try:
+        return json.loads(body or b"null")
+    except ValueError:
+        return None
+
+def _replay(body: bytes) -> Callable[[], Awaitable[Dict]]:
+    """Build a receive callable that yields an already-read body once"""
+    sent = False
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+    return receive
+
+async def _send_json(send: Callable, payload: Dict[str, Any], status: int,
+                     extra_headers: Dict[str, str] = None) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    for name, value in (extra_headers or {}).items():
+        headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
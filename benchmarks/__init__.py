@@ -0,0 +1,30 @@
+"""
+Offline benchmarks for FreeAIAPI
+
+Everything runs in-process against local stand-ins: fake_grok serves the
+Grok endpoints on a loopback port and fake_chatgpt replaces Chrome with a
+simulated chatgpt.com page. No credentials or network access are needed.
+
+Run with `python -m benchmarks`; see benchmarks/__main__.py for options.
+"""
+import os
+
+# Settings the benchmarks assume. Set before the app's config is first
+# loaded, and they take precedence over .env; exported variables still win.
+ENVIRONMENT = {
+    "AUTH_TOKEN": "benchmark-token",
+    "LOCAL_ONLY": "true",
+    "ENABLED_BACKENDS": "",
+    "SESSION_STORE": "memory",
+    "SESSION_SNAPSHOT_PATH": "",
+    "MAX_SESSIONS": "1000000",
+    "RATE_LIMIT_ENABLED": "false",
+    "GROK_ACCOUNTS_FILE": "",
+    "GROK_ACCOUNT_RATE_PER_MINUTE": "1000000",
+    "GROK_ACCOUNT_BURST": "1000000",
+    "LOG_LEVEL": "warning",
+    "TRACE_FILE": "",
+}
+
+for _key, _value in ENVIRONMENT.items():
+    os.environ.setdefault(_key, _value)
@@ -0,0 +1,75 @@
+"""
+Run the offline benchmark suite
+
+    python -m benchmarks                        # everything, JSON on stdout
+    python -m benchmarks -k session -k queue    # names or groups containing a pattern
+    python -m benchmarks -o results/2025-01-10.json --compare results/baseline.json
+
+A summary table goes to stderr; the JSON report goes to stdout or --output.
+"""
+from typing import List
+import argparse
+import contextlib
+import json
+import sys
+import benchmarks  # noqa: F401  (sets the benchmark environment before the app's config loads)
+from benchmarks import micro  # noqa: F401  (registers the benchmarks)
+from benchmarks.harness import BENCHMARKS, SCHEMA_VERSION, Benchmark, compare, environment, run
+
+def _selected(patterns: List[str]) -> List[Benchmark]:
+    if not patterns:
+        return list(BENCHMARKS)
+    return [bench for bench in BENCHMARKS
+            if any(pattern in bench.key or pattern == bench.group for pattern in patterns)]
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Offline FreeAIAPI benchmarks")
+    parser.add_argument("-k", dest="patterns", action="append", default=[],
+                        help="Run benchmarks whose name contains PATTERN or whose group is PATTERN (repeatable)")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds to time each benchmark (default 1)")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="Report mean latency changes against an earlier report")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    selected = _selected(args.patterns)
+    if args.list:
+        for bench in selected:
+            print(f"{bench.group:12} {bench.key}")
+        return 0
+    if not selected:
+        print("No benchmark matches", file=sys.stderr)
+        return 1
+
+    report = {"schema": SCHEMA_VERSION, "environment": environment(), "min_time": args.min_time, "results": []}
+    print(f"{'benchmark':48} {'ops/s':>12} {'mean':>10} {'p50':>10} {'p99':>10}", file=sys.stderr)
+    for bench in selected:
+        # Keep stray prints of the code under test out of a JSON report on stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run(bench, args.min_time)
+        report["results"].append(result)
+        print(f"{bench.key:48} {result['ops_per_sec']:12.1f} {result['mean_us']:9.1f}us "
+              f"{result['p50_us']:9.1f}us {result['p99_us']:9.1f}us", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = {
+            "baseline_commit": baseline.get("environment", {}).get("commit"),
+            "changes": compare(report["results"], baseline)
+        }
+        print(f"\nagainst {args.compare}:", file=sys.stderr)
+        for change in report["comparison"]["changes"]:
+            print(f"{change['key']:48} {change['baseline_us']:9.1f}us -> {change['current_us']:9.1f}us "
+                  f"{change['change_pct']:+7.1f}%", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+from typing import List, Optional, Tuple
+from html import escape
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+import threading
+import time
+import uuid
+import gpt
+
+# Blocks of the canned assistant reply: (tag, content)
+REPLY_BLOCKS: List[Tuple[str, object]] = [
+    ("p", "Python is a high-level, general-purpose programming language. Its design philosophy "
+          "emphasizes code readability with the use of significant indentation."),
+    ("h2", "Key features"),
+    ("ul", ["Dynamic typing and garbage collection", "Multiple programming paradigms",
+            "A large standard library", "An extensive ecosystem of third-party packages"]),
+    ("p", "Here is a short example that reads a file and counts its words:"),
+    ("pre", ("python", "from collections import Counter\n\n"
+                       "def count_words(path):\n"
+                       "    with open(path) as f:\n"
+                       "        return Counter(f.read().split())\n\n"
+                       "print(count_words('notes.txt').most_common(10))")),
+    ("h3", "When to use it"),
+    ("p", "Python suits scripting, data analysis, web back ends and automation, and is often "
+          "the first language taught in introductory courses."),
+]
+
+def render_user(text: str) -> str:
+    return (f'<div data-message-author-role="user" data-message-id="{uuid.uuid4()}">'
+            f'<div class="flex w-full flex-col gap-1 empty:hidden items-end">'
+            f'<div class="whitespace-pre-wrap">{escape(text)}</div></div></div>')
+
+def render_block(tag: str, content) -> str:
+    if tag == "ul":
+        return "<ul>" + "".join(f"<li><p>{escape(item)}</p></li>" for item in content) + "</ul>"
+    if tag == "pre":
+        lang, code = content
+        return (f'<pre class="!overflow-visible"><div class="contain-inline-size rounded-md border-[0.5px]">'
+                f'<div class="flex items-center text-token-text-secondary px-4 py-2 text-xs">{lang}</div>'
+                f'<div class="sticky top-9"><div class="absolute bottom-0 right-2 flex h-9 items-center">'
+                f'<button class="flex gap-1 items-center">Copy code</button></div></div>'
+                f'<div class="overflow-y-auto p-4" dir="ltr"><code class="!whitespace-pre hljs language-{lang}">'
+                f'{escape(code)}</code></div></div></pre>')
+    return f"<{tag}>{escape(content)}</{tag}>"
+
+def render_assistant(blocks: List[Tuple[str, object]]) -> str:
+    return (f'<div data-message-author-role="assistant" data-message-id="{uuid.uuid4()}">'
+            f'<div class="flex w-full flex-col gap-1 empty:hidden first:pt-[3px]">'
+            f'<div class="markdown prose w-full break-words dark:prose-invert light">'
+            + "".join(render_block(tag, content) for tag, content in blocks) +
+            '</div></div></div>')
+
+def render_page(turns: List[str]) -> str:
+    """A chatgpt.com page around the rendered turns, with the usual surrounding chrome"""
+    nav = "".join(f'<li><a href="/c/{uuid.UUID(int=i)}" class="flex items-center gap-2 p-2">'
+                  f'Conversation {i}</a></li>' for i in range(40))
+    return (f'<html><head><title>ChatGPT</title></head><body><div class="flex h-full w-full">'
+            f'<nav class="flex h-full w-full flex-col"><ol>{nav}</ol></nav>'
+            f'<main class="relative h-full w-full flex-1"><div class="flex h-full flex-col">'
+            + "".join(turns) +
+            '</div></main></div></body></html>')
+
+class _Element:
+    def __init__(self, driver: "FakeChatGPTDriver"):
+        self.driver = driver
+
+    def click(self) -> None:
+        pass
+
+class _Textbox(_Element):
+    def clear(self) -> None:
+        self.driver.draft = ""
+
+    def send_keys(self, keys: str) -> None:
+        if keys == Keys.RETURN:
+            self.driver.submit()
+        elif keys == Keys.BACKSPACE:
+            self.driver.draft = self.driver.draft[:-1]
+        else:
+            self.driver.draft += keys
+
+class FakeChatGPTDriver:
+    """
+    WebDriver stand-in serving a simulated chatgpt.com conversation
+
+    Supports what ChatGPTClient uses: loading the page, typing into the
+    prompt box, and polling for the streaming and send buttons. Submitting a
+    prompt starts a reply that streams in block by block over
+    `reply_seconds`; until it is done the "Stop streaming" button is shown
+    and page_source holds the partial reply, as on the real page.
+    """
+
+    def __init__(self, reply_seconds: float = 1.0, blocks: Optional[List[Tuple[str, object]]] = None,
+                 history: int = 0):
+        self.reply_seconds = reply_seconds
+        self.blocks = blocks or REPLY_BLOCKS
+        self.current_url = "about:blank"
+        self.draft = ""
+        self._turns: List[str] = []
+        self._reply_started: Optional[float] = None
+        self._lock = threading.Lock()
+        for i in range(history):
+            self._turns.append(render_user(f"Earlier question {i}"))
+            self._turns.append(render_assistant(self.blocks))
+
+    def get(self, url: str) -> None:
+        self.current_url = url
+
+    def quit(self) -> None:
+        pass
+
+    def submit(self) -> None:
+        with self._lock:
+            self._settle()
+            self._turns.append(render_user(self.draft))
+            self.draft = ""
+            self._reply_started = time.monotonic()
+
+    def _progress(self) -> float:
+        if self._reply_started is None:
+            return 1.0
+        if not self.reply_seconds:
+            return 1.0
+        return min((time.monotonic() - self._reply_started) / self.reply_seconds, 1.0)
+
+    def _settle(self) -> None:
+        """Fold a finished reply into the transcript"""
+        if self._reply_started is not None and self._progress() >= 1.0:
+            self._turns.append(render_assistant(self.blocks))
+            self._reply_started = None
+
+    @property
+    def streaming(self) -> bool:
+        with self._lock:
+            self._settle()
+            return self._reply_started is not None
+
+    @property
+    def page_source(self) -> str:
+        with self._lock:
+            self._settle()
+            turns = list(self._turns)
+            if self._reply_started is not None:
+                shown = max(int(len(self.blocks) * self._progress()), 1)
+                turns.append(render_assistant(self.blocks[:shown]))
+        return render_page(turns)
+
+    def find_element(self, by: str, value: str) -> _Element:
+        if by == By.ID and value == "prompt-textarea":
+            return _Textbox(self)
+        if by == By.CLASS_NAME and value == "flex-col":
+            return _Element(self)
+        if by == By.CSS_SELECTOR and "Stop streaming" in value and self.streaming:
+            return _Element(self)
+        if by == By.CSS_SELECTOR and "send-button" in value and not self.streaming:
+            return _Element(self)
+        raise NoSuchElementException(f"{by}={value}")
+
+def offline_client(driver: FakeChatGPTDriver) -> gpt.ChatGPTClient:
+    """A ChatGPTClient bound to a fake driver, skipping the browser launch and page load"""
+    client = gpt.ChatGPTClient.__new__(gpt.ChatGPTClient)
+    client.logger = None
+    client.driver = driver
+    return client
+
+class FakeChrome:
+    """
+    Makes ChatGPTClient open fake drivers instead of Chrome
+
+    The client's own pacing (page load wait, typing speed, pauses) is kept,
+    since it is part of what a real ChatGPT request costs.
+    """
+
+    def __init__(self, reply_seconds: float = 1.0, history: int = 0):
+        self.reply_seconds = reply_seconds
+        self.history = history
+        self.launched_total = 0
+        self._saved = None
+
+    def __call__(self, options=None) -> FakeChatGPTDriver:
+        self.launched_total += 1
+        return FakeChatGPTDriver(self.reply_seconds, history=self.history)
+
+    def install(self) -> "FakeChrome":
+        self._saved = gpt.Chrome
+        gpt.Chrome = self
+        return self
+
+    def uninstall(self) -> None:
+        if self._saved is not None:
+            gpt.Chrome = self._saved
+            self._saved = None
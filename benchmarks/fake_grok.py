@@ -0,0 +1,157 @@
+from typing import List, Optional
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import json
+import random
+import threading
+import time
+import uuid
+import grok
+
+WORDS = (
+    "the", "model", "returns", "tokens", "as", "they", "are", "generated", "which", "lets",
+    "clients", "render", "partial", "answers", "while", "python", "request", "session", "queue", "latency"
+)
+
+def stream_body(tokens: int = 200, token_size: int = 6, follow_ups: bool = True) -> str:
+    """
+    Build a Grok add_response body: one JSON object per line
+
+    Mirrors what Grok sends: an item header, then one line per generated
+    token, then a final line carrying follow-up suggestions and web results.
+
+    Args:
+        tokens: Number of message tokens
+        token_size: Approximate characters per token
+        follow_ups: Whether to end with a metadata line
+    """
+    rng = random.Random(tokens * 1000 + token_size)
+    lines = [json.dumps({"userChatItemId": uuid.uuid4().hex, "agentChatItemId": uuid.uuid4().hex})]
+    for _ in range(tokens):
+        word = rng.choice(WORDS)
+        token = " " + (word * (token_size // len(word) + 1))[:max(token_size - 1, 1)]
+        lines.append(json.dumps({"result": {"sender": "ASSISTANT", "message": token}}))
+    if follow_ups:
+        lines.append(json.dumps({"result": {
+            "sender": "ASSISTANT",
+            "followUpSuggestions": [{"properties": {"messageType": "TEXT"}, "label": f"Tell me more about {w}"}
+                                    for w in WORDS[:3]],
+            "webResults": [{"url": f"https://example.com/{w}", "title": w.title(), "preview": " ".join(WORDS)}
+                           for w in WORDS[:5]],
+            "xPostIds": [str(1800000000000000000 + i) for i in range(3)]
+        }}))
+    return "\n".join(lines)
+
+class FakeGrokServer:
+    """
+    Local stand-in for the Grok endpoints, for benchmarks and load tests
+
+    Serves CreateGrokConversation, attachment uploads and add_response on a
+    loopback port. Replies start after `latency` seconds; with a
+    `token_delay` they are streamed with chunked encoding, one line every
+    `token_delay` seconds, otherwise sent in one piece.
+    A share `error_rate` of add_response calls fails with `error_status`.
+    All settings can be changed while the server runs.
+    """
+
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0, tokens: int = 200,
+                 token_size: int = 6, error_rate: float = 0.0, error_status: int = 503):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.token_size = token_size
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests_total = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._body_cache = {}
+        self._saved_urls = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def body_lines(self) -> List[bytes]:
+        """Reply lines for the current settings, built once per setting"""
+        key = (self.tokens, self.token_size)
+        lines = self._body_cache.get(key)
+        if lines is None:
+            lines = self._body_cache[key] = [
+                line.encode() + b"\n" for line in stream_body(self.tokens, self.token_size).splitlines()
+            ]
+        return lines
+
+    def start(self) -> "FakeGrokServer":
+        """Start serving on a free loopback port"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body in one segment, or delayed ACKs add ~40 ms per reply
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with fake._lock:
+                    fake.requests_total += 1
+                if "CreateGrokConversation" in self.path:
+                    self._reply(200, json.dumps({
+                        "data": {"create_grok_conversation": {"conversation_id": uuid.uuid4().hex}}
+                    }).encode())
+                elif "attachment" in self.path:
+                    self._reply(200, json.dumps([{"mediaId": uuid.uuid4().hex, "mimeType": "image/png"}]).encode())
+                else:
+                    self._stream()
+
+            def _reply(self, status: int, body: bytes) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self) -> None:
+                time.sleep(fake.latency)
+                if fake.error_rate and random.random() < fake.error_rate:
+                    self._reply(fake.error_status, b'{"errors":[{"message":"Service Unavailable"}]}')
+                    return
+                lines = fake.body_lines()
+                if not fake.token_delay:
+                    self._reply(200, b"".join(lines))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for line in lines:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                    self.wfile.flush()
+                    time.sleep(fake.token_delay)
+                self.wfile.write(b"0\r\n\r\n")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-grok", daemon=True).start()
+        return self
+
+    def install(self) -> "FakeGrokServer":
+        """Point the grok module at this server instead of x.com"""
+        self._saved_urls = (grok.CREATE_CONVERSATION_URL, grok.ADD_RESPONSE_URL, grok.UPLOAD_FILE_URL)
+        grok.CREATE_CONVERSATION_URL = self.url + "/graphql/{}/CreateGrokConversation"
+        grok.ADD_RESPONSE_URL = self.url + "/2/grok/add_response.json"
+        grok.UPLOAD_FILE_URL = self.url + "/2/grok/attachment.json"
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and restore the real Grok URLs"""
+        if self._saved_urls:
+            grok.CREATE_CONVERSATION_URL, grok.ADD_RESPONSE_URL, grok.UPLOAD_FILE_URL = self._saved_urls
+            self._saved_urls = None
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,169 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_VERSION = 1
+
+# A round is grown until it takes at least this long, so timer overhead
+# stays negligible even for sub-microsecond operations
+MIN_ROUND_SECONDS = 0.01
+MIN_ROUNDS = 5
+
+@dataclass
+class Benchmark:
+    """A registered benchmark: a factory that sets up state and yields the operation to time"""
+    name: str
+    group: str
+    factory: Callable[..., Iterator[Callable[[], Any]]]
+    params: Dict[str, Any] = field(default_factory=dict)
+    threads: int = 1
+
+    @property
+    def key(self) -> str:
+        """Unique id, used to match results across runs"""
+        suffix = ",".join(f"{k}={v}" for k, v in self.params.items())
+        if self.threads > 1:
+            suffix = f"{suffix},threads={self.threads}" if suffix else f"threads={self.threads}"
+        return f"{self.name}[{suffix}]" if suffix else self.name
+
+BENCHMARKS: List[Benchmark] = []
+
+def benchmark(name: str, group: str, variants: Sequence[Dict[str, Any]] = ({},)) -> Callable:
+    """
+    Register a benchmark
+
+    The decorated function is a generator: it gets a variant's params as
+    keyword arguments, does any setup, yields the zero-argument callable to
+    time and cleans up after the yield. Every variant is a separate
+    benchmark; a "threads" entry runs the callable from that many threads
+    at once instead of being passed on.
+    """
+    def register(factory: Callable) -> Callable:
+        for variant in variants:
+            params = dict(variant)
+            threads = params.pop("threads", 1)
+            BENCHMARKS.append(Benchmark(name, group, factory, params, threads))
+        return factory
+    return register
+
+def _run_round(op: Callable[[], Any], ops: int, pool: Optional[ThreadPoolExecutor], threads: int) -> float:
+    """Seconds taken to run op `ops` times, in every thread"""
+    def loop() -> None:
+        for _ in range(ops):
+            op()
+
+    if pool is None:
+        started = time.perf_counter()
+        loop()
+        return time.perf_counter() - started
+    started = time.perf_counter()
+    for future in [pool.submit(loop) for _ in range(threads)]:
+        future.result()
+    return time.perf_counter() - started
+
+def measure(op: Callable[[], Any], min_time: float = 1.0, threads: int = 1) -> Dict[str, Any]:
+    """
+    Time an operation
+
+    The operation runs in rounds of `ops_per_round` calls (per thread), with
+    the round size calibrated first. Latencies are per-call averages of a
+    round, and their percentiles are taken across rounds. With several
+    threads, throughput counts the calls of all threads.
+    """
+    pool = ThreadPoolExecutor(threads, thread_name_prefix="bench") if threads > 1 else None
+    try:
+        ops = 1
+        while True:
+            elapsed = _run_round(op, ops, pool, threads)
+            if elapsed >= MIN_ROUND_SECONDS:
+                break
+            ops *= 2 if elapsed * 10 >= MIN_ROUND_SECONDS else 10
+
+        rounds: List[float] = []
+        deadline = time.perf_counter() + min_time
+        while len(rounds) < MIN_ROUNDS or time.perf_counter() < deadline:
+            rounds.append(_run_round(op, ops, pool, threads))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    latencies = sorted(elapsed / ops * 1e6 for elapsed in rounds)
+    total = sum(rounds)
+
+    def percentile(p: float) -> float:
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)]
+
+    return {
+        "rounds": len(rounds),
+        "ops_per_round": ops,
+        "ops_per_sec": len(rounds) * ops * threads / total,
+        "mean_us": statistics.fmean(latencies),
+        "stdev_us": statistics.stdev(latencies) if len(latencies) > 1 else 0.0,
+        "min_us": latencies[0],
+        "p50_us": percentile(0.50),
+        "p95_us": percentile(0.95),
+        "p99_us": percentile(0.99),
+        "max_us": latencies[-1]
+    }
+
+def run(bench: Benchmark, min_time: float) -> Dict[str, Any]:
+    """Set up, time and tear down one benchmark"""
+    with contextmanager(bench.factory)(**bench.params) as op:
+        result = measure(op, min_time, bench.threads)
+    return {
+        "name": bench.name,
+        "key": bench.key,
+        "group": bench.group,
+        "params": bench.params,
+        "threads": bench.threads,
+        **result
+    }
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def environment() -> Dict[str, Any]:
+    """Where a run happened, so results are only compared like for like"""
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count()
+    }
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Mean latency of each result against a previous report
+
+    Returns:
+        One entry per benchmark present in both: key, baseline and current
+        mean, and the change in percent (positive is slower)
+    """
+    before = {result["key"]: result for result in baseline.get("results", [])}
+    changes = []
+    for result in results:
+        old = before.get(result["key"])
+        if old:
+            changes.append({
+                "key": result["key"],
+                "baseline_us": old["mean_us"],
+                "current_us": result["mean_us"],
+                "change_pct": (result["mean_us"] / old["mean_us"] - 1) * 100
+            })
+    return changes
@@ -0,0 +1,563 @@
+"""
+Open-loop load generator with a latency and saturation report
+
+    python -m benchmarks.load --rates 2,4,8,16 --duration 30
+    python -m benchmarks.load --route queue --rates 5,10,20 --gpt-ratio 0.1
+    python -m benchmarks.load --replay traces.jsonl --replay-speed 2
+    python -m benchmarks.load --url http://127.0.0.1:5055 --rates 10   # server already running
+
+Unless --url is given, the app is started in a subprocess with
+`python -m benchmarks.serve`, which puts it in front of the fake Grok and
+ChatGPT upstreams; --serve-arg passes options on to it and --env sets
+server settings, e.g. --env QUEUE_WORKERS=4 --serve-arg=--grok-latency=1.5.
+
+Requests arrive on a Poisson schedule at each offered rate, whether or not
+earlier ones have finished, and latency is measured from the scheduled
+arrival. A server that falls behind therefore shows up in the latencies
+instead of silently slowing the generator down. A summary goes to stderr
+and the JSON report to stdout or --output.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import argparse
+import base64
+import contextlib
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import requests
+from benchmarks import ENVIRONMENT
+from benchmarks.harness import SCHEMA_VERSION, environment
+
+# Latency histogram bounds in seconds, as used by the app's own metrics
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+FINAL_TASK_STATES = ("completed", "failed", "expired")
+
+@dataclass
+class Request:
+    """One request of the workload"""
+    route: str  # "chat" (/api/chat/send) or "queue" (/api/queue/submit, then polling)
+    model: str
+    new_session: bool
+    files: int = 0
+    message: str = "What is Python?"
+
+@dataclass
+class Outcome:
+    """How one request went"""
+    request: Request
+    latency: float  # seconds from scheduled arrival to final answer
+    status: int  # HTTP status; for queue tasks 200 if completed, else the status of the failing call
+    ok: bool
+    timings: Dict[str, float] = field(default_factory=dict)  # Server-Timing or task timings, ms
+    dispatch_lag: float = 0.0  # seconds the request waited for a free client thread
+    finished: float = 0.0  # seconds from the start of the step
+    error: Optional[str] = None
+
+class Workload:
+    """Random requests following a traffic mix"""
+
+    def __init__(self, route: str, gpt_ratio: float, new_session_ratio: float,
+                 attachment_ratio: float, seed: int):
+        self.route = route
+        self.gpt_ratio = gpt_ratio
+        self.new_session_ratio = new_session_ratio
+        self.attachment_ratio = attachment_ratio
+        self.rng = random.Random(seed)
+
+    def sample(self) -> Request:
+        route = self.route if self.route != "mixed" else self.rng.choice(("chat", "queue"))
+        model = "gpt" if self.rng.random() < self.gpt_ratio else "grok"
+        return Request(
+            route=route,
+            model=model,
+            new_session=self.rng.random() < self.new_session_ratio,
+            # ChatGPT takes no attachments
+            files=1 if model == "grok" and self.rng.random() < self.attachment_ratio else 0
+        )
+
+    def poisson(self, rate: float, duration: float) -> Iterator[Tuple[float, Request]]:
+        """(offset, request) pairs arriving at `rate` per second on average"""
+        offset = self.rng.expovariate(rate)
+        while offset < duration:
+            yield offset, self.sample()
+            offset += self.rng.expovariate(rate)
+
+def load_replay(path: str, speed: float, workload: Workload) -> List[Tuple[float, Request]]:
+    """
+    Arrival schedule from a captured request log
+
+    Accepts TRACE_FILE records (chat sends and queue submissions are
+    replayed at their original offsets; requests whose trace has a
+    decode_files span get an attachment) and plain entries of the form
+    {"at": 1.5, "route": "chat", "model": "grok", "message": "...",
+    "new_session": false, "files": 1}. Missing fields follow the mix options.
+    """
+    schedule = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            defaults = workload.sample()
+            if "name" in entry:
+                route = {"POST /api/chat/send": "chat", "POST /api/queue/submit": "queue"}.get(entry["name"])
+                if route is None:
+                    continue
+                at = entry["started_at"]
+                files = int(any(span["name"] == "decode_files" for span in entry.get("spans", [])))
+                request = Request(route, entry.get("model") or defaults.model, defaults.new_session, files)
+            else:
+                at = entry.get("at", 0.0)
+                request = Request(
+                    entry.get("route", defaults.route),
+                    entry.get("model", defaults.model),
+                    entry.get("new_session", defaults.new_session),
+                    entry.get("files", defaults.files),
+                    entry.get("message", defaults.message)
+                )
+            schedule.append((at, request))
+    if not schedule:
+        return []
+    schedule.sort(key=lambda item: item[0])
+    start = schedule[0][0]
+    return [((at - start) / speed, request) for at, request in schedule]
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    timings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        match = re.search(r"dur=([\d.]+)", params)
+        if name and match:
+            timings[name] = float(match.group(1))
+    return timings
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    """Prometheus text format as {'name{labels}': value}"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            key, _, value = line.rpartition(" ")
+            try:
+                samples[key] = float(value)
+            except ValueError:
+                pass
+    return samples
+
+class LoadGenerator:
+    """
+    Sends a schedule of requests to a running API
+
+    Sessions created along the way are pooled per model and reused by
+    requests that ask for an existing session, up to `sessions` per model.
+    """
+
+    def __init__(self, base_url: str, token: str, max_inflight: int, poll_interval: float,
+                 timeout: float, sessions: int, attachment_kb: int, seed: int):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"X-Auth-Token": token}
+        self.max_inflight = max_inflight
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_sessions = sessions
+        self.attachment = base64.b64encode(os.urandom(attachment_kb * 1024)).decode()
+        self._sessions: Dict[str, List[str]] = {}
+        self._sessions_lock = threading.Lock()
+        self._rng = random.Random(seed + 1)
+        self._local = threading.local()
+
+    def _http(self) -> requests.Session:
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = requests.Session()
+            http.headers.update(self.headers)
+        return http
+
+    def _pick_session(self, model: str) -> Optional[str]:
+        with self._sessions_lock:
+            pool = self._sessions.get(model)
+            return self._rng.choice(pool) if pool else None
+
+    def _keep_session(self, model: str, session_id: Optional[str]) -> None:
+        if not session_id:
+            return
+        with self._sessions_lock:
+            pool = self._sessions.setdefault(model, [])
+            if session_id in pool:
+                return
+            if len(pool) < self.max_sessions:
+                pool.append(session_id)
+            else:
+                pool[self._rng.randrange(len(pool))] = session_id
+
+    def prime(self, models: List[str], count: int) -> None:
+        """Open sessions for queue tasks to run in, as only chat sends can create them"""
+        for model in models:
+            with self._sessions_lock:
+                missing = count - len(self._sessions.get(model, []))
+            for _ in range(missing):
+                status, ok, _, error = self._chat({"model": model, "message": "Hello"}, model)
+                if not ok:
+                    raise SystemExit(f"Could not open a {model} session ({status}): {error}")
+
+    def metrics(self) -> Dict[str, float]:
+        try:
+            return parse_metrics(self._http().get(f"{self.base_url}/metrics", timeout=10).text)
+        except requests.RequestException:
+            return {}
+
+    def run(self, schedule: Iterator[Tuple[float, Request]]) -> Tuple[List[Outcome], float]:
+        """
+        Send the schedule, in real time
+
+        Returns:
+            Outcomes in completion order and the seconds from start until
+            the last one finished
+        """
+        outcomes: List[Outcome] = []
+        lock = threading.Lock()
+
+        def execute(request: Request, scheduled: float) -> None:
+            outcome = self._execute(request, scheduled)
+            outcome.finished = time.perf_counter() - start
+            with lock:
+                outcomes.append(outcome)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.max_inflight, thread_name_prefix="load") as pool:
+            for offset, request in schedule:
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(execute, request, start + offset)
+        return outcomes, time.perf_counter() - start
+
+    def _execute(self, request: Request, scheduled: float) -> Outcome:
+        lag = time.perf_counter() - scheduled
+        # Only chat sends open sessions; queue tasks always run in an existing one
+        new_session = request.new_session and request.route == "chat"
+        session_id = None if new_session else self._pick_session(request.model)
+        payload: Dict[str, Any] = {"model": request.model, "message": request.message}
+        if session_id:
+            payload["session_id"] = session_id
+        if request.files:
+            payload["files"] = [{"filename": f"file{i}.png", "base64": self.attachment} for i in range(request.files)]
+        try:
+            if request.route == "queue":
+                status, ok, timings, error = self._queue(payload)
+            else:
+                status, ok, timings, error = self._chat(payload, request.model)
+        except requests.RequestException as e:
+            status, ok, timings, error = 0, False, {}, f"{type(e).__name__}: {e}"
+        return Outcome(request, time.perf_counter() - scheduled, status, ok, timings, lag, error=error)
+
+    def _chat(self, payload: Dict[str, Any], model: str) -> Tuple[int, bool, Dict[str, float], Optional[str]]:
+        response = self._http().post(f"{self.base_url}/api/chat/send", json=payload, timeout=self.timeout)
+        timings = parse_server_timing(response.headers.get("Server-Timing", ""))
+        body = _json(response)
+        if response.status_code == 200 and body.get("status"):
+            self._keep_session(model, (body.get("data") or {}).get("session_id"))
+            return 200, True, timings, None
+        return response.status_code, False, timings, body.get("message")
+
+    def _queue(self, payload: Dict[str, Any]) -> Tuple[int, bool, Dict[str, float], Optional[str]]:
+        http = self._http()
+        response = http.post(f"{self.base_url}/api/queue/submit", json=payload, timeout=self.timeout)
+        body = _json(response)
+        if response.status_code != 200 or not body.get("status"):
+            return response.status_code, False, {}, body.get("message")
+        transaction_id = body["data"]["transaction_id"]
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            response = http.get(f"{self.base_url}/api/queue/status/{transaction_id}", timeout=self.timeout)
+            task = _json(response).get("data") or {}
+            if response.status_code != 200:
+                return response.status_code, False, {}, _json(response).get("message")
+            if task.get("status") in FINAL_TASK_STATES:
+                result = task.get("result") or {}
+                if task["status"] == "completed":
+                    self._keep_session(payload["model"], (result.get("data") or {}).get("session_id"))
+                return 200, task["status"] == "completed", task.get("timings") or {}, \
+                    None if task["status"] == "completed" else f"{task['status']}: {result.get('message')}"
+        return 0, False, {}, "Gave up polling the task"
+
+def _json(response: requests.Response) -> Dict[str, Any]:
+    try:
+        body = response.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+def _percentile(values: List[float], p: float) -> float:
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+def summarize(outcomes: List[Outcome], offered: Optional[float], window: float, elapsed: float,
+              before: Dict[str, float], after: Dict[str, float], slo_p99: float) -> Dict[str, Any]:
+    """
+    Latency, throughput, stage breakdown and saturation verdict of one step
+
+    Throughput is the number of answers over the step window plus the time
+    it took to drain the requests still running when the window closed; a
+    server keeping up returns them as fast as they arrive.
+    """
+    latencies = sorted(o.latency for o in outcomes if o.ok)
+    errors: Dict[str, int] = {}
+    for outcome in outcomes:
+        if not outcome.ok:
+            errors[str(outcome.status)] = errors.get(str(outcome.status), 0) + 1
+
+    histogram = {str(bound): sum(1 for latency in latencies if latency <= bound) for bound in BUCKETS}
+    histogram["+Inf"] = len(latencies)
+
+    stages: Dict[str, float] = {}
+    timed = [o.timings for o in outcomes if o.ok and o.timings]
+    for timings in timed:
+        for name, ms in timings.items():
+            stages[name] = stages.get(name, 0.0) + ms / len(timed)
+
+    def delta(key: str) -> float:
+        return after.get(key, 0.0) - before.get(key, 0.0)
+
+    session_events = {key.split('"')[1]: delta(key) for key in after
+                      if key.startswith("session_events_total{") and delta(key)}
+    queue_waits = delta("queue_wait_seconds_count{model=\"grok\"}") + delta("queue_wait_seconds_count{model=\"gpt\"}")
+
+    completed = len(latencies)
+    span = max(window, elapsed)
+    throughput = completed / span if span else 0.0
+    arrivals = len(outcomes) / window if window else 0.0
+    error_rate = (len(outcomes) - completed) / len(outcomes) if outcomes else 0.0
+    p99 = _percentile(latencies, 0.99)
+    reasons = []
+    if arrivals and throughput < 0.9 * arrivals:
+        reasons.append(f"throughput {throughput:.1f}/s is below 90% of the {arrivals:.1f}/s that arrived")
+    if error_rate > 0.01:
+        reasons.append(f"{error_rate:.1%} of requests failed")
+    if p99 > slo_p99:
+        reasons.append(f"p99 {p99:.2f}s exceeds the {slo_p99:g}s objective")
+
+    return {
+        "offered_rps": offered,
+        "arrival_rps": arrivals,
+        "requests": len(outcomes),
+        "completed": completed,
+        "errors": errors,
+        "error_rate": error_rate,
+        "throughput_rps": throughput,
+        "elapsed_s": elapsed,
+        "latency_s": {
+            "mean": statistics.fmean(latencies) if latencies else 0.0,
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "p99": p99,
+            "max": latencies[-1] if latencies else 0.0
+        },
+        "histogram": histogram,
+        "dispatch_lag_max_s": max((o.dispatch_lag for o in outcomes), default=0.0),
+        "stages_ms": {name: round(ms, 1) for name, ms in stages.items()},
+        "session_events": session_events,
+        "queue_attempts": queue_waits,
+        "saturated": bool(reasons),
+        "saturation_reasons": reasons,
+        "sample_errors": sorted({o.error for o in outcomes if o.error})[:5]
+    }
+
+def diagnose(step: Dict[str, Any]) -> List[str]:
+    """Where the time went in a step, most significant first"""
+    stages = dict(step["stages_ms"])
+    total = stages.pop("total", 0.0)
+    findings = []
+    if step["latency_s"]["mean"] and step["dispatch_lag_max_s"] > 1.0:
+        findings.append(f"The load generator itself fell behind by up to {step['dispatch_lag_max_s']:.1f}s: "
+                        f"raise --max-inflight, the results understate the offered load")
+    if total:
+        queue_wait = stages.get("queue_wait", 0.0)
+        if queue_wait / total >= 0.5:
+            findings.append(f"Queue workers: tasks waited {queue_wait:.0f} ms on average for a worker "
+                            f"({queue_wait / total:.0%} of their time); raise QUEUE_WORKERS")
+        slot_wait = stages.get("slot_wait", 0.0)
+        if slot_wait / total >= 0.3:
+            findings.append(f"Backend slots: requests waited {slot_wait:.0f} ms on average for a free slot "
+                            f"({slot_wait / total:.0%}); for ChatGPT raise BROWSER_EXECUTOR_WORKERS")
+        client_mean = step["latency_s"]["mean"] * 1000
+        if client_mean and total < client_mean * 0.7 and not queue_wait:
+            findings.append(f"Request handling: the server accounts for {total:.0f} ms of the "
+                            f"{client_mean:.0f} ms clients waited; the rest is spent before the app sees the "
+                            f"request (too few server threads or workers, or the GIL)")
+        upstream = {name: ms for name, ms in stages.items()
+                    if name.startswith(("grok_", "chatgpt_")) and name != "chatgpt_extraction"}
+        if upstream and not findings:
+            name, ms = max(upstream.items(), key=lambda item: item[1])
+            findings.append(f"Upstream bound: {name} takes {ms:.0f} ms of {total:.0f} ms; the service itself "
+                            f"is not the bottleneck at this rate")
+    rejected = step["session_events"].get("overflow_rejected_total", 0) + step["errors"].get("429", 0)
+    if rejected:
+        findings.append(f"Session limit: {rejected:.0f} requests were refused a session; raise MAX_SESSIONS "
+                        f"or reuse sessions (SESSION_OVERFLOW_POLICY)")
+    if step["session_events"].get("overflow_waited_total"):
+        findings.append("Session limit: requests waited for a free session slot (SESSION_OVERFLOW_POLICY=wait)")
+    if step["errors"].get("503"):
+        findings.append(f"Circuit breakers: {step['errors']['503']} requests refused while a circuit was open")
+    if step["errors"].get("504"):
+        findings.append(f"Deadlines: {step['errors']['504']} requests ran out of time")
+    return findings
+
+@contextlib.contextmanager
+def stub_server(port: int, env: Dict[str, str], serve_args: List[str]) -> Iterator[str]:
+    """Run `python -m benchmarks.serve` until the block ends"""
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.serve", "--port", str(port), *serve_args],
+        cwd=repo, env={**os.environ, **env}
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        started = time.monotonic()
+        while True:
+            if process.poll() is not None:
+                raise SystemExit(f"benchmarks.serve exited with {process.returncode}")
+            try:
+                requests.get(f"{url}/api/health/", headers={"X-Auth-Token": env.get(
+                    "AUTH_TOKEN", ENVIRONMENT["AUTH_TOKEN"])}, timeout=1)
+                break
+            except requests.RequestException:
+                if time.monotonic() - started > 60:
+                    raise SystemExit("benchmarks.serve did not start within 60s")
+                time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def _print_step(step: Dict[str, Any]) -> None:
+    latency = step["latency_s"]
+    rate = f"{step['offered_rps']:g}/s" if step["offered_rps"] else "replay"
+    print(f"{rate:>8} {step['requests']:6d} {step['throughput_rps']:8.2f}/s {latency['p50']:8.3f}s "
+          f"{latency['p95']:8.3f}s {latency['p99']:8.3f}s {step['error_rate']:7.1%}  "
+          f"{'SATURATED' if step['saturated'] else 'ok'}", file=sys.stderr)
+
+def _print_histogram(step: Dict[str, Any]) -> None:
+    counts, previous = [], 0
+    for bound, cumulative in step["histogram"].items():
+        counts.append((bound, cumulative - previous))
+        previous = cumulative
+    widest = max((count for _, count in counts), default=0) or 1
+    for bound, count in counts:
+        if count:
+            print(f"    <= {bound:>6}s {count:6d} {'#' * max(round(count / widest * 40), 1)}", file=sys.stderr)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load", description="Load test the API")
+    target = parser.add_argument_group("target")
+    target.add_argument("--url", help="API to load; default: start python -m benchmarks.serve")
+    target.add_argument("--token", default=os.environ.get("AUTH_TOKEN", ENVIRONMENT["AUTH_TOKEN"]))
+    target.add_argument("--port", type=int, default=5055, help="Port for the started server")
+    target.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Setting for the started server (repeatable)")
+    target.add_argument("--serve-arg", action="append", default=[], metavar="ARG",
+                        help="Option for benchmarks.serve, e.g. --serve-arg=--grok-latency=1 (repeatable)")
+    load = parser.add_argument_group("load")
+    load.add_argument("--rates", default="1,2,4,8", help="Comma-separated arrival rates per second, one step each")
+    load.add_argument("--duration", type=float, default=20, help="Seconds of arrivals per step")
+    load.add_argument("--replay", help="Replay a TRACE_FILE or request log instead of --rates")
+    load.add_argument("--replay-speed", type=float, default=1.0, help="Replay faster (>1) or slower (<1)")
+    load.add_argument("--max-inflight", type=int, default=256, help="Most requests in flight at once")
+    load.add_argument("--timeout", type=float, default=300, help="Seconds before a request is given up")
+    load.add_argument("--poll-interval", type=float, default=0.1, help="Seconds between queue status polls")
+    load.add_argument("--slo-p99", type=float, default=10.0, help="p99 latency objective in seconds")
+    load.add_argument("--stop-at-saturation", action="store_true", help="Skip the rates after the first saturated one")
+    load.add_argument("--seed", type=int, default=1)
+    mix = parser.add_argument_group("traffic mix")
+    mix.add_argument("--route", choices=("chat", "queue", "mixed"), default="chat",
+                     help="/api/chat/send, queue submit and poll, or half of each")
+    mix.add_argument("--gpt-ratio", type=float, default=0.0, help="Share of requests for gpt instead of grok")
+    mix.add_argument("--new-session-ratio", type=float, default=0.2, help="Share of chat requests starting a session; queue tasks reuse sessions, "
+                          "a few of which are opened up front")
+    mix.add_argument("--sessions", type=int, default=50, help="Existing sessions reused per model")
+    mix.add_argument("--attachment-ratio", type=float, default=0.0, help="Share of grok requests with a file")
+    mix.add_argument("--attachment-kb", type=int, default=64, help="Attachment size")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    return parser
+
+def main(argv: List[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    workload = Workload(args.route, args.gpt_ratio, args.new_session_ratio, args.attachment_ratio, args.seed)
+    if args.replay:
+        steps = [(None, load_replay(args.replay, args.replay_speed, workload))]
+    else:
+        steps = [(float(rate), None) for rate in args.rates.split(",") if rate.strip()]
+    server_env = dict(item.split("=", 1) for item in args.env)
+
+    with contextlib.ExitStack() as stack:
+        url = args.url or stack.enter_context(stub_server(args.port, server_env, args.serve_arg))
+        generator = LoadGenerator(url, args.token, args.max_inflight, args.poll_interval, args.timeout,
+                                  args.sessions, args.attachment_kb, args.seed)
+        report: Dict[str, Any] = {
+            "schema": SCHEMA_VERSION,
+            "environment": environment(),
+            "target": url,
+            "options": {key: value for key, value in vars(args).items() if key not in ("token", "output")},
+            "steps": []
+        }
+        print(f"{'rate':>8} {'reqs':>6} {'throughput':>10} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}",
+              file=sys.stderr)
+        for rate, replay in steps:
+            schedule = replay if replay is not None else list(workload.poisson(rate, args.duration))
+            window = args.duration if replay is None else (schedule[-1][0] if schedule else 0.0)
+            queued_models = sorted({request.model for _, request in schedule if request.route == "queue"})
+            generator.prime(queued_models, min(args.sessions, 5))
+            before = generator.metrics()
+            outcomes, elapsed = generator.run(iter(schedule))
+            step = summarize(outcomes, rate, window, elapsed, before, generator.metrics(), args.slo_p99)
+            step["findings"] = diagnose(step)
+            report["steps"].append(step)
+            _print_step(step)
+            if step["saturated"] and args.stop_at_saturation:
+                break
+
+    sustained = [step["offered_rps"] for step in report["steps"] if step["offered_rps"] and not step["saturated"]]
+    saturated = next((step for step in report["steps"] if step["saturated"]), None)
+    report["max_sustainable_rps"] = max(sustained) if sustained else None
+    report["saturation"] = {
+        "offered_rps": saturated["offered_rps"],
+        "reasons": saturated["saturation_reasons"],
+        "findings": saturated["findings"]
+    } if saturated else None
+
+    focus = saturated or (report["steps"][-1] if report["steps"] else None)
+    if focus:
+        print(f"\nmax sustainable rate: {report['max_sustainable_rps'] or 'none of the tested rates'}"
+              f"{'/s' if report['max_sustainable_rps'] else ''}", file=sys.stderr)
+        print(f"latency histogram at {focus['offered_rps'] or 'replay'}"
+              f"{'/s' if focus['offered_rps'] else ''}:", file=sys.stderr)
+        _print_histogram(focus)
+        if focus["stages_ms"]:
+            stages = sorted(focus["stages_ms"].items(), key=lambda item: (item[0] == "total", -item[1]))
+            print("  mean server time per stage: " + ", ".join(
+                f"{name} {ms:.0f}ms" for name, ms in stages), file=sys.stderr)
+        for reason in focus["saturation_reasons"]:
+            print(f"  saturated: {reason}", file=sys.stderr)
+        for finding in focus["findings"]:
+            print(f"  - {finding}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
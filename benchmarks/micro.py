@@ -0,0 +1,124 @@
+"""
+Micro-benchmarks of the request hot path
+
+Groups:
+    parsing: Grok stream parsing and ChatGPT page extraction
+    sessions: SessionManager create/lookup, alone and under contention
+    queue: QueueManager submit and status lookups
+    middleware: auth checks and the full before/after request chain
+    end_to_end: /api/chat/send through Flask against the fake Grok server
+"""
+from typing import Any, Callable, Iterator
+from bs4 import BeautifulSoup
+import itertools
+import threading
+from benchmarks import ENVIRONMENT
+from benchmarks.fake_chatgpt import FakeChatGPTDriver, offline_client, render_assistant, REPLY_BLOCKS
+from benchmarks.fake_grok import FakeGrokServer, stream_body
+from benchmarks.harness import benchmark
+from grok import GrokMessages
+from utils.queue_manager import QueueManager
+from utils.session_manager import SessionManager
+
+Op = Iterator[Callable[[], Any]]
+
+@benchmark("grok_messages_parse", "parsing", [{"tokens": 50}, {"tokens": 1000}])
+def grok_messages_parse(tokens: int) -> Op:
+    body = stream_body(tokens)
+    yield lambda: GrokMessages(body).get_full_message()
+
+@benchmark("chatgpt_parse_message_content", "parsing")
+def chatgpt_parse_message_content() -> Op:
+    element = BeautifulSoup(render_assistant(REPLY_BLOCKS), "html.parser").find(
+        attrs={"data-message-author-role": True}
+    )
+    client = offline_client(FakeChatGPTDriver())
+    yield lambda: client._parse_message_content(element, "assistant")
+
+@benchmark("chatgpt_get_messages", "parsing", [{"history": 1}, {"history": 10}])
+def chatgpt_get_messages(history: int) -> Op:
+    client = offline_client(FakeChatGPTDriver(history=history))
+    yield client.get_messages
+
+@benchmark("session_create", "sessions", [{}, {"threads": 8}])
+def session_create() -> Op:
+    manager = SessionManager()
+    yield lambda: manager.create_session("grok")
+    manager.clear_all_sessions()
+
+@benchmark("session_get", "sessions", [{"sessions": 1000}, {"sessions": 1000, "threads": 8}])
+def session_get(sessions: int) -> Op:
+    manager = SessionManager()
+    ids = itertools.cycle([manager.create_session("grok") for _ in range(sessions)])
+    yield lambda: manager.get_session(next(ids))
+    manager.clear_all_sessions()
+
+@benchmark("session_use", "sessions", [{"sessions": 1000}])
+def session_use(sessions: int) -> Op:
+    manager = SessionManager()
+    ids = itertools.cycle([manager.create_session("grok") for _ in range(sessions)])
+
+    def use() -> None:
+        with manager.use_session(next(ids)):
+            pass
+
+    yield use
+    manager.clear_all_sessions()
+
+@benchmark("queue_add_task", "queue", [{}, {"threads": 8}])
+def queue_add_task() -> Op:
+    manager = QueueManager(max_queue_size=0)  # no workers: tasks only pile up
+    yield lambda: manager.add_task("grok", "What is Python?")
+
+@benchmark("queue_get_task_status", "queue", [{"tasks": 1000}])
+def queue_get_task_status(tasks: int) -> Op:
+    manager = QueueManager(max_queue_size=0)
+    ids = itertools.cycle([manager.add_task("grok", "What is Python?") for _ in range(tasks)])
+    yield lambda: manager.get_task_status(next(ids))
+
+@benchmark("auth_check_access", "middleware")
+def auth_check_access() -> Op:
+    from middlewares.auth import check_access
+    token = ENVIRONMENT["AUTH_TOKEN"]
+    yield lambda: check_access(token, "127.0.0.1")
+
+@benchmark("auth_middleware", "middleware")
+def auth_middleware() -> Op:
+    from app import app
+    from middlewares.auth import auth_middleware
+    context = app.test_request_context("/api/health/", headers={"X-Auth-Token": ENVIRONMENT["AUTH_TOKEN"]},
+                                       environ_base={"REMOTE_ADDR": "127.0.0.1"})
+    context.push()
+    try:
+        yield auth_middleware
+    finally:
+        context.pop()
+
+@benchmark("request_health", "middleware")
+def request_health() -> Op:
+    """The whole middleware chain around a trivial route"""
+    from app import app
+    client = app.test_client()
+    headers = {"X-Auth-Token": ENVIRONMENT["AUTH_TOKEN"]}
+    yield lambda: client.get("/api/health/", headers=headers)
+
+@benchmark("chat_send_grok", "end_to_end", [{"tokens": 200}, {"tokens": 200, "threads": 8}])
+def chat_send_grok(tokens: int) -> Op:
+    """A chat turn in an existing session (one per thread), including the HTTP call to the fake Grok server"""
+    from app import app
+    server = FakeGrokServer(tokens=tokens).start().install()
+    client = app.test_client()
+    headers = {"X-Auth-Token": ENVIRONMENT["AUTH_TOKEN"]}
+    local = threading.local()
+
+    def send() -> None:
+        payload = {"model": "grok", "message": "What is Python?", "session_id": getattr(local, "session_id", None)}
+        response = client.post("/api/chat/send", json=payload, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/chat/send answered {response.status_code}: {response.get_data(as_text=True)}")
+        local.session_id = response.get_json()["data"]["session_id"]
+
+    try:
+        yield send
+    finally:
+        server.stop()
@@ -0,0 +1,59 @@
+"""
+Run the real app against the fake upstreams, for load tests
+
+    python -m benchmarks.serve --port 5055 --grok-latency 0.8 --gpt-reply-seconds 3
+    python -m benchmarks.serve --port 5055 --server prefork --workers 4
+
+The fake Grok server runs in this process (the preforking master, with
+--server prefork) and every worker inherits the patched Grok URLs and the
+fake Chrome. Settings not given here come from the environment as usual,
+e.g. QUEUE_WORKERS=4 python -m benchmarks.serve ...
+"""
+from typing import List
+import argparse
+import os
+import sys
+from benchmarks import ENVIRONMENT
+from benchmarks.fake_chatgpt import FakeChrome
+from benchmarks.fake_grok import FakeGrokServer
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.serve",
+                                     description="Serve the API with fake Grok and ChatGPT upstreams")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--server", choices=("dev", "prefork", "asgi"), default="dev",
+                        help="dev: threaded Flask server; prefork/asgi: python -m app serve (default dev)")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes for prefork/asgi")
+    parser.add_argument("--grok-latency", type=float, default=0.5, help="Seconds before Grok starts replying")
+    parser.add_argument("--grok-token-delay", type=float, default=0.005, help="Seconds between streamed Grok lines")
+    parser.add_argument("--grok-tokens", type=int, default=200, help="Tokens per Grok reply")
+    parser.add_argument("--grok-error-rate", type=float, default=0.0, help="Share of Grok replies that fail with 503")
+    parser.add_argument("--gpt-reply-seconds", type=float, default=3.0, help="Seconds a ChatGPT reply streams for")
+    return parser
+
+def main(argv: List[str] = None) -> None:
+    args = build_parser().parse_args(argv)
+    os.environ["PORT"] = str(args.port)
+    # Werkzeug logs every request at INFO unless told otherwise
+    os.environ.setdefault("LOG_LEVELS", "werkzeug=warning")
+    grok_server = FakeGrokServer(latency=args.grok_latency, token_delay=args.grok_token_delay,
+                                 tokens=args.grok_tokens, error_rate=args.grok_error_rate).start().install()
+    FakeChrome(reply_seconds=args.gpt_reply_seconds).install()
+    print(f"Fake Grok on {grok_server.url}, API on http://127.0.0.1:{args.port} "
+          f"(token {os.environ.get('AUTH_TOKEN', ENVIRONMENT['AUTH_TOKEN'])})", file=sys.stderr, flush=True)
+
+    if args.server == "dev":
+        from app import app
+        from utils.lifecycle import lifecycle
+        lifecycle.start()
+        try:
+            app.run(host="127.0.0.1", port=args.port, threaded=True)
+        finally:
+            lifecycle.stop()
+    else:
+        from server import serve
+        serve(["--workers", str(args.workers), "--bind", f"127.0.0.1:{args.port}"]
+              + (["--asgi"] if args.server == "asgi" else []))
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from selenium.webdriver.common.keys import Keys
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from bs4 import BeautifulSoup
 from typing import List, Dict, Tuple, Optional, Union
+import os
 import re
 import time
 import random
@@ -18,11 +19,11 @@ class Message:
     content: str
 
 class ChatGPTClient:
-    def __init__(self, log_level: Union[int, None] = logging.INFO, log_file: str = "chatgpt.log") -> None:
+    def __init__(self, log_level: Union[int, None] = logging.INFO, log_file: Optional[str] = None) -> None:
         """
         Args:
             log_level: Logging level (logging.INFO, logging.DEBUG, etc.). None to disable logging
-            log_file: Path to log file
+            log_file: Path to log file, for standalone use; inside the API logging is set up by the app
         """
         self.setup_logging(log_level, log_file)
         self.options = ChromeOptions()
@@ -30,21 +31,37 @@ class ChatGPTClient:
         self.init_session()
     
     def __del__(self) -> None:
-        self.driver.quit()
+        self.close()
 
-    def setup_logging(self, log_level: Union[int, None], log_file: str) -> None:
+    def close(self) -> None:
+        """
+        Quit the browser. Safe to call more than once.
+        """
+        driver = getattr(self, "driver", None)
+        if driver is None:
+            return
+        self.driver = None
+        try:
+            driver.quit()
+        except Exception as e:
+            self.log(logging.WARNING, f"Error closing browser: {str(e)}")
+
+    def setup_logging(self, log_level: Union[int, None], log_file: Optional[str]) -> None:
         """
         Args:
             log_level: Logging level or None to disable
-            log_file: Path to log file
+            log_file: Path to log file, or None to leave handlers to the application
         """
-        if log_level is not None:
-            logging.basicConfig(
-                level=log_level,
-                filename=log_file,
-                format='%(asctime)s - %(levelname)s - %(message)s'
-            )
-        self.logger = logging.getLogger(__name__) if log_level is not None else None
+        if log_level is None:
+            self.logger = None
+            return
+        self.logger = logging.getLogger(__name__)
+        if log_file and not any(getattr(h, "baseFilename", None) == os.path.abspath(log_file)
+                                for h in self.logger.handlers):
+            handler = logging.FileHandler(log_file)
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+            handler.setLevel(log_level)
+            self.logger.addHandler(handler)
 
     def log(self, level: int, message: str) -> None:
         """
@@ -106,7 +123,8 @@ class ChatGPTClient:
         mistake_chance: float = 0.0,
         human_correct: bool = True,
         wait_for_reply: bool = True,
-        reply_timeout: int = 120
+        reply_timeout: int = 120,
+        deadline: Optional[float] = None
     ) -> bool:
         """
         Args:
@@ -119,11 +137,12 @@ class ChatGPTClient:
             human_correct: Whether to correct typos
             wait_for_reply: Whether to wait for response
             reply_timeout: Timeout for response in seconds
+            deadline: Epoch time after which to give up; caps typing and the reply wait
         Returns:
             bool: True if message sent successfully
         """
         try:
-            textbox = WebDriverWait(self.driver, 10).until(
+            textbox = WebDriverWait(self.driver, self._bounded(10, deadline)).until(
                 EC.presence_of_element_located((By.ID, "prompt-textarea"))
             )
             
@@ -143,6 +162,10 @@ class ChatGPTClient:
                     textbox.send_keys(char)
                     time.sleep(random.uniform(typing_speed[0], typing_speed[1]))
                 
+                if deadline is not None and time.time() >= deadline:
+                    self.log(logging.WARNING, "Deadline reached while typing")
+                    return False
+
                 if i < len(message.split()) - 1:
                     textbox.send_keys(' ')
                     time.sleep(random.uniform(word_pause[0], word_pause[1]))
@@ -153,13 +176,26 @@ class ChatGPTClient:
             self.log(logging.INFO, f"Message sent: {message[:50]}...")
             
             if wait_for_reply:
-                return self.wait_for_response(timeout=reply_timeout)
+                return self.wait_for_response(timeout=self._bounded(reply_timeout, deadline))
             return True
             
         except Exception as e:
             self.log(logging.ERROR, f"Error sending message: {str(e)}")
             return False
 
+    @staticmethod
+    def _bounded(timeout: float, deadline: Optional[float]) -> float:
+        """
+        Args:
+            timeout: Wait in seconds
+            deadline: Epoch time the wait must not outlast, or None
+        Returns:
+            float: The timeout, shortened to what is left before the deadline
+        """
+        if deadline is None:
+            return timeout
+        return max(min(timeout, deadline - time.time()), 0)
+
     def get_messages(self) -> List[Message]:
         """
         Returns:
@@ -3,12 +3,115 @@ Name: Vibhek Soni
 Age: 19
 Github: https://github.com/vibheksoni
 """
-import requests, uuid, json, mimetypes
-from typing import List, Optional
+import requests, uuid, json, mimetypes, asyncio, logging
+from typing import List, Optional, Dict
 
 CREATE_CONVERSATION_URL = "https://x.com/i/api/graphql/{}/CreateGrokConversation"
 ADD_RESPONSE_URL = "https://api.x.com/2/grok/add_response.json"
 UPLOAD_FILE_URL = "https://x.com/i/api/2/grok/attachment.json"
+CREATE_CONVERSATION_QUERY_ID = "6cmfJY3d7EPWuCSXWrkOFg"
+
+# Seconds allowed for an upstream call when the caller gives no deadline
+DEFAULT_TIMEOUT = 120
+CONNECT_TIMEOUT = 10
+
+class GrokError(Exception):
+    """
+    Raised when Grok answers with an error status or a response that can't be understood.
+    """
+    def __init__(self, message: str, status_code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+class GrokRateLimitError(GrokError):
+    """
+    Raised when Grok signals that the account is being throttled.
+    """
+
+def _check_response(response, action: str) -> None:
+    """
+    Raise GrokError (or GrokRateLimitError on HTTP 429) for an error response.
+    Works with both requests and httpx responses.
+    """
+    status = response.status_code
+    if status == 429:
+        raise GrokRateLimitError(f"Grok rate limit reached while trying to {action}", status)
+    if status >= 400:
+        raise GrokError(f"Grok returned HTTP {status} while trying to {action}", status)
+
+def _json(response, action: str):
+    """
+    Decode a JSON response body, raising GrokError if it isn't JSON.
+    """
+    try:
+        return response.json()
+    except ValueError:
+        raise GrokError(f"Grok returned a non-JSON response while trying to {action}", response.status_code)
+
+def _conversation_info(response) -> dict:
+    """
+    Validate a CreateGrokConversation response.
+    """
+    _check_response(response, "create a conversation")
+    info = _json(response, "create a conversation")
+    try:
+        if not info["data"]["create_grok_conversation"]["conversation_id"]:
+            raise KeyError("conversation_id")
+    except (KeyError, TypeError):
+        raise GrokError("Grok response has no conversation id", response.status_code)
+    return info
+
+def _upload_result(response) -> list:
+    """
+    Validate an attachment upload response and add the attachment URL.
+    """
+    _check_response(response, "upload a file")
+    response_json = _json(response, "upload a file")
+    try:
+        media_id = response_json[0]["mediaId"]
+    except (KeyError, IndexError, TypeError):
+        raise GrokError("Grok upload response has no mediaId", response.status_code)
+    response_json[0]["url"] = f"https://api.x.com/2/grok/attachment.json?mediaId={media_id}"
+    return response_json
+
+def _timeouts(timeout: Optional[float]) -> tuple:
+    """
+    Return a (connect, read) timeout pair for requests, capping the connect phase.
+    """
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+    return (min(CONNECT_TIMEOUT, timeout), timeout)
+
+_async_clients: Dict[asyncio.AbstractEventLoop, "httpx.AsyncClient"] = {}
+
+def get_async_http_client() -> "httpx.AsyncClient":
+    """
+    Return the pooled httpx client for the running event loop, creating it on first use.
+    """
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_keepalive_connections=100))
+        _async_clients[loop] = client
+    return client
+
+def _async_timeouts(timeout: Optional[float]) -> "httpx.Timeout":
+    """
+    httpx counterpart of _timeouts.
+    """
+    import httpx
+
+    connect, read = _timeouts(timeout)
+    return httpx.Timeout(read, connect=connect)
+
+async def close_async_http_client() -> None:
+    """
+    Close the pooled httpx client of the running event loop.
+    """
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
 
 class GrokMessages:
     """
@@ -60,8 +163,13 @@ class GrokMessages:
         lines = self.raw_data.splitlines()
         for line in lines:
             if line.strip():
-                parsed = json.loads(line)
-                result_data = parsed.get("result", {})
+                try:
+                    parsed = json.loads(line)
+                except ValueError:
+                    raise GrokError(f"Malformed line in Grok response: {line[:100]}")
+                if not isinstance(parsed, dict):
+                    raise GrokError(f"Unexpected line in Grok response: {line[:100]}")
+                result_data = parsed.get("result") or {}
                 result = self.Result(
                     sender=result_data.get("sender"),
                     message=result_data.get("message"),
@@ -174,6 +282,7 @@ class Grok:
             "x-twitter-auth-type": "OAuth2Session",
             "x-twitter-client-language": "en"
         }
+        self.headers = {k: v for k, v in headers.items() if v is not None}
         self.session.headers = headers
         self.conversation_info = {
             "data": {
@@ -183,17 +292,42 @@ class Grok:
             }
         }
     
-    def create_conversation(self) -> None:
+    @property
+    def conversation_id(self) -> str:
+        """
+        Return the id of the current conversation, or an empty string if none exists yet.
+        """
+        return self.conversation_info["data"]["create_grok_conversation"]["conversation_id"]
+
+    def set_conversation_id(self, conversation_id: str) -> None:
+        """
+        Continue an existing conversation instead of creating a new one.
+        """
+        self.conversation_info = {
+            "data": {
+                "create_grok_conversation": {
+                    "conversation_id": conversation_id
+                }
+            }
+        }
+
+    def close(self) -> None:
+        """
+        Close the underlying HTTP session and its pooled connections.
+        """
+        self.session.close()
+
+    def create_conversation(self, timeout: Optional[float] = None) -> None:
         """
         Create a new Grok conversation and store the conversation info.
         """
-        query_id = "6cmfJY3d7EPWuCSXWrkOFg"
+        query_id = CREATE_CONVERSATION_QUERY_ID
         data = {"variables":{},"queryId":query_id}
-        response = self.session.post(CREATE_CONVERSATION_URL.format(query_id), json=data)
-        self.conversation_info = response.json()
-        print(self.conversation_info)
+        response = self.session.post(CREATE_CONVERSATION_URL.format(query_id), json=data, timeout=_timeouts(timeout))
+        self.conversation_info = _conversation_info(response)
+        logging.debug(f"Created Grok conversation {self.conversation_id}")
     
-    def upload_file(self, file_path: str) -> dict:
+    def upload_file(self, file_path: str, timeout: Optional[float] = None) -> dict:
         """
         Upload a file and return the JSON response containing mediaId and URL.
         """
@@ -216,12 +350,11 @@ class Grok:
                 }
             except Exception as e:
                 raise Exception(f"Error preparing file upload: {str(e)}")
-            response = self.session.post(UPLOAD_FILE_URL, files=files)
-            response_json = response.json()
-            media_id = response_json[0]["mediaId"]
-            response_json[0]["url"] = f"https://api.x.com/2/grok/attachment.json?mediaId={media_id}"
-            self.session.headers["content-type"] = original_content_type
-            return response_json
+            try:
+                response = self.session.post(UPLOAD_FILE_URL, files=files, timeout=_timeouts(timeout))
+            finally:
+                self.session.headers["content-type"] = original_content_type
+            return _upload_result(response)
     
     def create_message(
         self, 
@@ -239,7 +372,7 @@ class Grok:
             "responses": [],
             "systemPromptName": "",
             "grokModelOptionId": model_name,
-            "conversationId": self.conversation_info["data"]["create_grok_conversation"]["conversation_id"],
+            "conversationId": self.conversation_id,
             "returnSearchResults": returnSearchResults,
             "returnCitations": returnCitations,
             "promptMetadata": {
@@ -269,9 +402,54 @@ class Grok:
             "fileAttachments": file_attachments
         })
     
-    def send(self, request_data: dict) -> str:
+    def send(self, request_data: dict, timeout: Optional[float] = None) -> str:
         """
         Send the conversation payload to the server and return the response text.
         """
-        response = self.session.post(ADD_RESPONSE_URL, json=request_data)
-        return response.text
\ No newline at end of file
+        response = self.session.post(ADD_RESPONSE_URL, json=request_data, timeout=_timeouts(timeout))
+        _check_response(response, "send a message")
+        return response.text
+
+    async def acreate_conversation(self, timeout: Optional[float] = None) -> None:
+        """
+        Async version of create_conversation using the event loop's pooled HTTP client.
+        """
+        query_id = CREATE_CONVERSATION_QUERY_ID
+        data = {"variables":{},"queryId":query_id}
+        response = await get_async_http_client().post(
+            CREATE_CONVERSATION_URL.format(query_id), json=data, headers=self.headers,
+            timeout=_async_timeouts(timeout)
+        )
+        self.conversation_info = _conversation_info(response)
+        logging.debug(f"Created Grok conversation {self.conversation_id}")
+
+    async def aupload_file(self, file_path: str, timeout: Optional[float] = None) -> dict:
+        """
+        Async version of upload_file. The file is read in a worker thread.
+        """
+        headers = {k: v for k, v in self.headers.items() if k != "content-type"}
+        content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        filename = file_path.replace('\\', '/').split('/')[-1]
+
+        def read_file() -> bytes:
+            with open(file_path, "rb") as f:
+                return f.read()
+
+        content = await asyncio.get_running_loop().run_in_executor(None, read_file)
+        response = await get_async_http_client().post(
+            UPLOAD_FILE_URL,
+            files={"image": (filename, content, content_type)},
+            headers=headers,
+            timeout=_async_timeouts(timeout)
+        )
+        return _upload_result(response)
+
+    async def asend(self, request_data: dict, timeout: Optional[float] = None) -> str:
+        """
+        Async version of send.
+        """
+        response = await get_async_http_client().post(
+            ADD_RESPONSE_URL, json=request_data, headers=self.headers, timeout=_async_timeouts(timeout)
+        )
+        _check_response(response, "send a message")
+        return response.text
@@ -1,22 +1,69 @@
 from flask import request, abort
-from functools import wraps
+from functools import lru_cache, wraps
 import os
-from typing import Callable, Any
-from utils.config_manager import config_manager
+from typing import Callable, Any, Dict, Optional, Tuple
+from utils.config_manager import config_manager, token_digest
 import ipaddress
 
+# Client addresses whose allow/deny decision is remembered
+DECISION_CACHE_SIZE = 4096
+
 def auth_middleware() -> None:
     """Validate authentication and IP restrictions"""
-    auth_token = request.headers.get('X-Auth-Token')
-    if not auth_token or auth_token != config_manager.get('AUTH_TOKEN'):
-        abort(401, description="Invalid or missing authentication token")
-    
-    client_ip = request.remote_addr
+    denial = check_access(request.headers.get('X-Auth-Token'), request.remote_addr)
+    if denial:
+        abort(denial[0], description=denial[1])
+
+def check_access(auth_token: Optional[str], client_ip: Optional[str]) -> Optional[Tuple[int, str]]:
+    """
+    Check a token and client address against the access policy
+
+    Returns:
+        None if allowed, otherwise (status code, description)
+    """
+    if not identify_client(auth_token):
+        return 401, "Invalid or missing authentication token"
+
+    return _ip_decision(client_ip, config_manager.generation)
+
+@lru_cache(maxsize=DECISION_CACHE_SIZE)
+def _ip_decision(client_ip: Optional[str], generation: int) -> Optional[Tuple[int, str]]:
+    """
+    Allow/deny decision for a client address under one config generation
+
+    Memoized per address and cleared when the policy settings change; the
+    generation in the key keeps a decision made under an older config from
+    being served after a reload.
+    """
     if config_manager.get_bool('LOCAL_ONLY'):
         if not _is_local_ip(client_ip):
-            abort(403, description="Access restricted to local addresses")
+            return 403, "Access restricted to local addresses"
     elif client_ip not in config_manager.get('ALLOWED_IPS'):
-        abort(403, description="IP address not allowed")
+        return 403, "IP address not allowed"
+    return None
+
+def identify_client(auth_token: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Look up the API client a token belongs to
+
+    Returns:
+        The client's name and limits (see ConfigManager._parse_api_tokens), or None
+    """
+    if not auth_token:
+        return None
+    # Looked up by digest, so timing never depends on how much of the token matched
+    return config_manager.get('API_TOKENS').get(token_digest(auth_token))
+
+def admin_middleware() -> Optional[Tuple[Dict[str, Any], int]]:
+    """Allow only admin clients; runs before every admin route, after auth_middleware"""
+    client = identify_client(request.headers.get('X-Auth-Token'))
+    if not client or not client.get('admin'):
+        return {
+            "status": False,
+            "message": "Admin access required",
+            "data": None
+        }, 403
+    return None
 
 def _is_local_ip(ip: str) -> bool:
     """Check if IP is local"""
@@ -29,3 +76,5 @@ def _is_local_ip(ip: str) -> bool:
         )
     except ValueError:
         return False
+
+config_manager.subscribe(lambda old, new: _ip_decision.cache_clear(), ('LOCAL_ONLY', 'ALLOWED_IPS'))
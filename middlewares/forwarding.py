@@ -0,0 +1,51 @@
+from flask import request, Response
+from typing import Optional
+import json
+import logging
+import requests
+from utils.cluster import cluster, FORWARDED_HEADER
+from utils.config_manager import config_manager
+
+# Hop-by-hop and recomputed headers that must not be copied between hops
+_SKIPPED_HEADERS = {
+    'connection', 'keep-alive', 'transfer-encoding', 'content-length',
+    'content-encoding', 'host', 'proxy-connection', 'te', 'trailer', 'upgrade'
+}
+
+def forwarding_middleware() -> Optional[Response]:
+    """Proxy requests for sessions or tasks owned by another node"""
+    if not config_manager.get_bool('CLUSTER_FORWARDING') or request.headers.get(FORWARDED_HEADER) is not None:
+        return None
+
+    resource_id = _resource_id()
+    if not resource_id or cluster.is_local(resource_id):
+        return None
+
+    owner = cluster.owner_of(resource_id)
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in _SKIPPED_HEADERS}
+    headers['X-Forwarded-For'] = request.remote_addr or ''
+    try:
+        upstream = cluster.forward(owner, request.method, request.full_path.rstrip('?'),
+                                   headers, request.get_data())
+    except requests.RequestException as e:
+        logging.error(f"Forwarding to node {owner} failed: {str(e)}")
+        return Response(
+            json.dumps({"status": False, "message": f"Owning node {owner} unavailable", "data": None}),
+            status=502,
+            mimetype='application/json'
+        )
+
+    response_headers = {k: v for k, v in upstream.headers.items() if k.lower() not in _SKIPPED_HEADERS}
+    return Response(upstream.content, status=upstream.status_code, headers=response_headers)
+
+def _resource_id() -> Optional[str]:
+    """Session or transaction id a request refers to, if any"""
+    view_args = request.view_args or {}
+    for key in ('session_id', 'transaction_id'):
+        if view_args.get(key):
+            return view_args[key]
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        if isinstance(data, dict) and data.get('session_id'):
+            return data['session_id']
+    return None
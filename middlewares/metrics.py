@@ -0,0 +1,45 @@
+from flask import request, g, Response
+from typing import Optional
+import time
+from models.backends import backend_registry
+from models.chat_handler import HEDGE_MODEL
+from utils.metrics import metrics
+
+REQUEST_LATENCY = metrics.histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to returning its response",
+    ("route", "model", "status")
+)
+
+def metrics_start() -> None:
+    """Note when the request arrived; runs before every other middleware"""
+    g.metrics_started = time.perf_counter()
+
+def metrics_record(response: Response) -> Response:
+    """Observe the request's latency by route, model and status"""
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        observe_request(request_route(), request_model(), response.status_code, time.perf_counter() - started)
+    return response
+
+def request_route() -> str:
+    """URL rule the request matched, e.g. '/api/queue/status/<transaction_id>'"""
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+def request_model() -> Optional[str]:
+    """Model named in a JSON request body, if any"""
+    data = request.get_json(silent=True) if request.is_json else None
+    return data.get('model') if isinstance(data, dict) else None
+
+def observe_request(route: str, model: Optional[str], status: int, seconds: float) -> None:
+    """
+    Record one request
+
+    Model names are only used as labels when a backend is registered under
+    them, so clients can't grow the number of series with made-up names.
+    Anything but a string (e.g. {"model": []}) is "unknown" too.
+    """
+    if model and (not isinstance(model, str)
+                  or (model != HEDGE_MODEL and not backend_registry.capabilities(model))):
+        model = "unknown"
+    REQUEST_LATENCY.observe(seconds, route=route, model=model or "", status=status)
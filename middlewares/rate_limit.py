@@ -0,0 +1,80 @@
+from flask import request, g
+from typing import Dict, Any, Optional, Tuple
+from middlewares.auth import identify_client
+from utils.cluster import cluster, FORWARDED_HEADER
+from utils.config_manager import config_manager
+from utils.rate_limiter import rate_limiter, RateLimitExceeded
+
+# Endpoints that consume upstream capacity; status polls and admin calls are not limited
+LIMITED_ENDPOINTS = {'chat.send_message', 'chat.send_batch', 'queue.submit_task'}
+
+def rate_limit_middleware() -> Optional[Tuple[Dict[str, Any], int, Dict[str, str]]]:
+    """Apply per-client and per-IP limits to upstream-bound requests"""
+    if request.endpoint not in LIMITED_ENDPOINTS or not config_manager.get_bool('RATE_LIMIT_ENABLED'):
+        return None
+    if forwarded_by_peer(request.remote_addr, request.headers.get(FORWARDED_HEADER)):
+        return None
+    client = identify_client(request.headers.get('X-Auth-Token'))
+    if not client:
+        return None
+    cost, slots = request_cost(client)
+    denial = check_rate_limit(client, request.remote_addr, cost, slots)
+    if denial:
+        return denial
+    g.rate_limited_client = client["name"]
+    g.rate_limited_slots = slots
+    return None
+
+def rate_limit_teardown(error: Optional[BaseException] = None) -> None:
+    """Release the concurrency slots taken by rate_limit_middleware"""
+    name = g.pop('rate_limited_client', None)
+    if name:
+        rate_limiter.release(name, g.pop('rate_limited_slots', 1))
+
+def request_cost(client: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Rate tokens and concurrency slots a request takes
+
+    A batch costs a token per item and holds a slot per item it runs at
+    once. Invalid batches cost one; the route rejects them.
+    """
+    if request.endpoint != 'chat.send_batch':
+        return 1, 1
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not 0 < len(items) <= config_manager.get('BATCH_MAX_ITEMS'):
+        return 1, 1
+    return len(items), min(len(items), config_manager.get('BATCH_MAX_CONCURRENCY'), client["max_concurrent"])
+
+def forwarded_by_peer(remote_addr: Optional[str], forwarded: Optional[str]) -> bool:
+    """
+    Whether a request was proxied by a peer node
+
+    The peer already charged the client and its address, and holds the
+    client's concurrency slot until the answer comes back, so such requests
+    are not limited again. The forwarding header is only trusted with
+    CLUSTER_FORWARDING on and from a CLUSTER_NODES address.
+    """
+    return (forwarded is not None and config_manager.get_bool('CLUSTER_FORWARDING')
+            and cluster.is_peer(remote_addr))
+
+def check_rate_limit(client: Dict[str, Any], ip: Optional[str], cost: int = 1,
+                     slots: int = 1) -> Optional[Tuple[Dict[str, Any], int, Dict[str, str]]]:
+    """
+    Admit a request from an authenticated client
+
+    Once admitted, the caller must call rate_limiter.release(client["name"], slots)
+    when the request is done.
+
+    Returns:
+        None if admitted, otherwise a 429 response with Retry-After
+    """
+    try:
+        rate_limiter.acquire(client, ip, cost, slots)
+    except RateLimitExceeded as e:
+        return {
+            "status": False,
+            "message": str(e),
+            "data": None
+        }, 429, {"Retry-After": str(max(int(e.retry_after + 0.999), 1))}
+    return None
@@ -0,0 +1,24 @@
+from flask import request, g, Response
+from typing import Optional
+from middlewares.metrics import request_route, request_model
+from utils.config_manager import config_manager
+from utils.tracing import tracer
+
+def tracing_start() -> None:
+    """Open a trace for the request; stages it passes through add spans to it"""
+    g.trace_token = tracer.begin(f"{request.method} {request_route()}")
+
+def tracing_finish(response: Response) -> Response:
+    """Report the request's span breakdown in a Server-Timing header"""
+    trace = tracer.current()
+    if trace is not None:
+        trace.attributes.update(model=request_model(), status=response.status_code)
+        if config_manager.get_bool('SERVER_TIMING_ENABLED'):
+            response.headers['Server-Timing'] = trace.server_timing()
+    return response
+
+def tracing_teardown(error: Optional[BaseException] = None) -> None:
+    """Close the request's trace, writing it to TRACE_FILE if sampled"""
+    token = g.pop('trace_token', None)
+    if token is not None:
+        tracer.end(token)
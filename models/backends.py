@@ -0,0 +1,321 @@
+from typing import Callable, Dict, Any, Optional, List, Tuple
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, asdict, replace
+import asyncio
+import contextvars
+import importlib
+import logging
+import threading
+import time
+from utils.config_manager import config_manager
+from utils.lifecycle import lifecycle
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, breakers
+from utils.resizable_semaphore import ResizableSemaphore
+from utils.tracing import tracer
+
+@dataclass(frozen=True)
+class BackendCapabilities:
+    """
+    What a model backend supports, known without importing it
+
+    Attributes:
+        streaming: Replies can be streamed incrementally
+        attachments: Accepts file attachments
+        max_concurrency: Most requests served at once per process (None: unbounded)
+        portable_sessions: Sessions can be adopted by another process, because
+            the conversation lives upstream rather than in a local client
+    """
+    streaming: bool = False
+    attachments: bool = False
+    max_concurrency: Optional[int] = None
+    portable_sessions: bool = False
+
+class ModelBackend(ABC):
+    """
+    Interface every chat backend implements
+
+    Subclasses implement chat(), raising on failure; backends with native
+    async I/O also implement achat() and set async_native, which is checked
+    when the backend is created. Callers go
+    through handle() and ahandle(), which apply the concurrency limit and
+    circuit breakers and turn errors into response dicts. Blocking backends
+    run handle() on a per-backend thread pool for async callers, so sync
+    and async requests share one max_concurrency limit.
+    """
+
+    name = ""
+    async_native = False
+
+    def __init__(self, capabilities: BackendCapabilities):
+        if self.async_native and type(self).achat is ModelBackend.achat:
+            raise TypeError(f"{type(self).__name__} sets async_native but does not implement achat")
+        self.capabilities = capabilities
+        self._limit = (ResizableSemaphore(capabilities.max_concurrency)
+                       if capabilities.max_concurrency else None)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @abstractmethod
+    def chat(self, message: str, session: Dict[str, Any], files: List[str] = None,
+             deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """
+        Send a message within a session and return the chat response dict
+
+        Upstream waits must not outlast the deadline when one is given.
+        """
+
+    async def achat(self, message: str, session: Dict[str, Any], files: List[str] = None,
+                    deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Async version of chat, required for backends with async_native set"""
+        raise NotImplementedError(f"{type(self).__name__} has no native async chat")
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Whether a failed call may succeed if simply tried again later"""
+        return isinstance(error, (ConnectionError, TimeoutError))
+
+    def breaker_names(self, session: Dict[str, Any]) -> List[str]:
+        """Names of the circuit breakers guarding a call for this session"""
+        return [self.name]
+
+    def handle(self, message: str, session: Dict[str, Any], files: List[str] = None,
+               deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """
+        Run chat() within the backend's concurrency limit and circuit breakers
+
+        Raises:
+            CircuitOpenError: If a breaker is open; no upstream call is made
+            DeadlineExceeded: If the deadline passes before a slot frees up
+        """
+        guards = self._breakers(session)
+        breakers.acquire_all(guards)
+        start = time.monotonic()
+        try:
+            if self._limit is None:
+                result = self.chat(message, session, files, deadline)
+            else:
+                with tracer.span("slot_wait"):
+                    acquired = self._limit.acquire(timeout=deadline.remaining() if deadline else None)
+                if not acquired:
+                    raise DeadlineExceeded(f"Deadline exceeded waiting for a free {self.name} slot")
+                try:
+                    if deadline:
+                        deadline.check()
+                    result = self.chat(message, session, files, deadline)
+                finally:
+                    self._limit.release()
+        except BaseException as e:
+            return self._failed(guards, start, e, deadline)
+        self._record(guards, start, None, deadline)
+        return result
+
+    async def ahandle(self, message: str, session: Dict[str, Any], files: List[str] = None,
+                      deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Async version of handle"""
+        if not self.async_native:
+            loop = asyncio.get_running_loop()
+            # Copying the context keeps the caller's trace (utils.tracing) in the worker thread
+            return await loop.run_in_executor(self._get_executor(), contextvars.copy_context().run,
+                                              self.handle, message, session, files, deadline)
+
+        guards = self._breakers(session)
+        breakers.acquire_all(guards)
+        start = time.monotonic()
+        try:
+            result = await self.achat(message, session, files, deadline)
+        except BaseException as e:
+            return self._failed(guards, start, e, deadline)
+        self._record(guards, start, None, deadline)
+        return result
+
+    def _breakers(self, session: Dict[str, Any]) -> List[CircuitBreaker]:
+        if not config_manager.get_bool('CIRCUIT_BREAKER_ENABLED'):
+            return []
+        slow_call_seconds = config_manager.get('CIRCUIT_SLOW_CALL_SECONDS').get(self.name)
+        return [breakers.get(name, slow_call_seconds) for name in self.breaker_names(session)]
+
+    def _record(self, guards: List[CircuitBreaker], start: float, error: Optional[BaseException],
+                deadline: Optional[Deadline]) -> None:
+        """
+        Feed a call's outcome to its breakers
+
+        Calls cut short by the caller's own deadline only count through their
+        latency, so clients with tight timeouts can't open the circuit. Calls
+        refused before reaching the upstream are given back.
+        """
+        latency = time.monotonic() - start
+        for guard in guards:
+            if isinstance(error, (DeadlineExceeded, CircuitOpenError)):
+                guard.cancel()
+            else:
+                client_gave_up = deadline is not None and deadline.expired
+                guard.record(failed=error is not None and not client_gave_up, latency=latency)
+
+    def _failed(self, guards: List[CircuitBreaker], start: float, error: BaseException,
+                deadline: Optional[Deadline]) -> Dict[str, Any]:
+        """Record a failed call; re-raise control-flow errors, turn the rest into a response"""
+        self._record(guards, start, error, deadline)
+        if isinstance(error, (DeadlineExceeded, CircuitOpenError)) or not isinstance(error, Exception):
+            raise error
+        logging.error(f"{self.name} chat error: {str(error)}")
+        return {
+            "status": False,
+            "message": str(error),
+            "data": None,
+            "retryable": self.is_retryable(error)
+        }
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Run fn on this backend's bounded thread pool, in a copy of the caller's context"""
+        return self._get_executor().submit(contextvars.copy_context().run, fn, *args)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.capabilities.max_concurrency or 8,
+                        thread_name_prefix=self.name or "backend"
+                    )
+        return self._executor
+
+    def resize(self, max_concurrency: int) -> None:
+        """
+        Change max_concurrency of a running backend
+
+        Requests in flight keep their slots; the async thread pool is
+        replaced, letting the old one finish its work in the background.
+        """
+        self.capabilities = replace(self.capabilities, max_concurrency=max_concurrency)
+        if self._limit is not None:
+            self._limit.resize(max_concurrency)
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def close(self) -> None:
+        """Release resources shared by the backend (not per-session clients)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+class BackendRegistry:
+    """
+    Registry of chat backends, imported on first use
+
+    Backends are registered by import path together with their
+    capabilities, so routes can validate requests and nodes can disable
+    backends (ENABLED_BACKENDS) without paying for heavy imports such as
+    selenium until a request actually needs them.
+    """
+
+    def __init__(self):
+        self._specs: Dict[str, Tuple[str, BackendCapabilities]] = {}
+        self._loaded: Dict[str, ModelBackend] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, target: str, capabilities: BackendCapabilities) -> None:
+        """
+        Register a backend
+
+        Args:
+            name: Model name clients send, e.g. 'grok'
+            target: 'module:ClassName' of a ModelBackend subclass
+            capabilities: What the backend supports
+        """
+        self._specs[name] = (target, capabilities)
+
+    def names(self) -> List[str]:
+        """Names of registered and enabled backends"""
+        return [name for name in self._specs if self.is_enabled(name)]
+
+    def is_enabled(self, name: str) -> bool:
+        """Whether a backend is registered and enabled on this node"""
+        if name not in self._specs:
+            return False
+        enabled = config_manager.get('ENABLED_BACKENDS')
+        return not enabled or name in enabled
+
+    def capabilities(self, name: str) -> Optional[BackendCapabilities]:
+        """Declared capabilities of a registered backend, without loading it"""
+        spec = self._specs.get(name)
+        return spec[1] if spec else None
+
+    def get(self, name: str) -> Optional[ModelBackend]:
+        """Return the backend for a model, importing it on first use; None if unknown or disabled"""
+        if not self.is_enabled(name):
+            return None
+        backend = self._loaded.get(name)
+        if backend is not None:
+            return backend
+        with self._lock:
+            if name not in self._loaded:
+                target, capabilities = self._specs[name]
+                module_name, class_name = target.split(':')
+                backend_class = getattr(importlib.import_module(module_name), class_name)
+                self._loaded[name] = backend_class(capabilities)
+                logging.info(f"Loaded model backend {name}")
+            return self._loaded[name]
+
+    def retry_after(self, name: str) -> float:
+        """
+        Seconds until a backend accepts calls again because its circuit is open, else 0
+
+        Lets routes refuse work up front instead of queueing or starting it.
+        """
+        if not config_manager.get_bool('CIRCUIT_BREAKER_ENABLED'):
+            return 0.0
+        return breakers.retry_after(name)
+
+    def resize(self, name: str, max_concurrency: int) -> None:
+        """Change a backend's max_concurrency, live if it is loaded"""
+        with self._lock:
+            target, capabilities = self._specs[name]
+            self._specs[name] = (target, replace(capabilities, max_concurrency=max_concurrency))
+            backend = self._loaded.get(name)
+        if backend is not None:
+            backend.resize(max_concurrency)
+            logging.info(f"Resized model backend {name} to {max_concurrency} concurrent requests")
+
+    def describe(self) -> Dict[str, Dict[str, Any]]:
+        """Capabilities and load state of every enabled backend"""
+        return {
+            name: {**asdict(self._specs[name][1]), "loaded": name in self._loaded}
+            for name in self.names()
+        }
+
+    def preload(self) -> None:
+        """Import the backends ENABLED_BACKENDS names explicitly, so the first request doesn't pay for it"""
+        for name in config_manager.get('ENABLED_BACKENDS'):
+            try:
+                self.get(name)
+            except Exception as e:
+                logging.error(f"Failed to load backend {name}: {str(e)}")
+
+    def close(self) -> None:
+        """Close every loaded backend"""
+        with self._lock:
+            for name, backend in self._loaded.items():
+                try:
+                    backend.close()
+                except Exception as e:
+                    logging.error(f"Failed to close backend {name}: {str(e)}")
+
+backend_registry = BackendRegistry()
+backend_registry.register(
+    "grok",
+    "models.grok_backend:GrokBackend",
+    BackendCapabilities(attachments=True, portable_sessions=True)
+)
+backend_registry.register(
+    "gpt",
+    "models.gpt_backend:GPTBackend",
+    BackendCapabilities(max_concurrency=config_manager.get('BROWSER_EXECUTOR_WORKERS'))
+)
+config_manager.subscribe(
+    lambda old, new: backend_registry.resize("gpt", new['BROWSER_EXECUTOR_WORKERS']),
+    ('BROWSER_EXECUTOR_WORKERS',)
+)
+lifecycle.register("backends", backend_registry.preload, backend_registry.close)
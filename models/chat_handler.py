@@ -1,67 +1,110 @@
-from typing import Dict, Any, Optional, List
-from gpt import ChatGPTClient
-from grok import Grok, GrokMessages
-import os
+from typing import AsyncIterator, Dict, Any, Optional, List, Tuple
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import asynccontextmanager
+import asyncio
+import contextvars
 import logging
+import threading
+import time
+from models.backends import backend_registry, ModelBackend
+from utils.circuit_breaker import CircuitOpenError
+from utils.config_manager import config_manager
+from utils.deadline import Deadline, DeadlineExceeded, model_timeout
+from utils.metrics import metrics
 from utils.session_manager import session_manager
 
-class ModelHandler:
-    """Handles chat interactions with different AI models"""
-    
-    def __init__(self) -> None:
-        self.grok_client = None
-        self.gpt_client = None
-        
-    def get_grok_client(self) -> Grok:
-        """Initialize Grok client if not exists"""
-        if not self.grok_client:
-            self.grok_client = Grok(
-                account_bearer_token=os.getenv('GROK_BEARER_TOKEN'),
-                x_csrf_token=os.getenv('GROK_CSRF_TOKEN'),
-                cookies=os.getenv('GROK_COOKIES')
-            )
-            self.grok_client.create_conversation()
-        return self.grok_client
-        
-    def get_gpt_client(self) -> ChatGPTClient:
-        """Initialize ChatGPT client if not exists"""
-        if not self.gpt_client:
-            self.gpt_client = ChatGPTClient()
-        return self.gpt_client
-
-def handle_chat_request(model: str, message: str, session_id: str, files: List[str] = None) -> Dict[str, Any]:
+# Model name that races the HEDGE_MODELS backends and answers with the first success
+HEDGE_MODEL = "fastest"
+
+HEDGED_REQUESTS = metrics.counter(
+    "hedged_requests_total",
+    "Requests for the 'fastest' model by the backend that answered ('none' if none did) and legs started",
+    ("winner", "legs")
+)
+
+def unsupported_model(model: str) -> Optional[Dict[str, Any]]:
+    """
+    Validate a model name against the enabled backends
+
+    Returns:
+        Error response dict if the model can't be served here, else None
+    """
+    if backend_registry.is_enabled(model):
+        return None
+    if model == HEDGE_MODEL and _hedge_backends():
+        return None
+    return {
+        "status": False,
+        "message": f"Unsupported model: {model}",
+        "data": None
+    }
+
+def circuit_open(name: str, retry_after: float) -> Dict[str, Any]:
+    """Error response for a request refused because an upstream circuit is open"""
+    return {
+        "status": False,
+        "message": f"{name} is temporarily unavailable after repeated upstream failures, "
+                   f"retry in {max(int(retry_after + 0.999), 1)}s",
+        "data": None,
+        "retryable": True,
+        "retry_after": retry_after
+    }
+
+def unavailable_model(model: str) -> Optional[Tuple[Dict[str, Any], int, Dict[str, str]]]:
+    """
+    Fail fast while a backend's circuit is open
+
+    Returns:
+        Response, 503 and a Retry-After header if the backend is refusing calls, else None
+    """
+    if model == HEDGE_MODEL:
+        # Unavailable only once every backend it races is
+        waits = [backend_registry.retry_after(name) for name in _hedge_backends()]
+        retry_after = min(waits) if waits and all(waits) else 0
+    else:
+        retry_after = backend_registry.retry_after(model)
+    if not retry_after:
+        return None
+    return circuit_open(model, retry_after), 503, {"Retry-After": str(max(int(retry_after + 0.999), 1))}
+
+def accepts_attachments(model: str) -> bool:
+    """Whether a model takes file attachments; 'fastest' does if any backend it races does"""
+    names = _hedge_backends() if model == HEDGE_MODEL else [model]
+    return any(backend_registry.capabilities(name).attachments for name in names)
+
+def handle_chat_request(model: str, message: str, session_id: str, files: List[str] = None,
+                        deadline: Optional[Deadline] = None) -> Dict[str, Any]:
     """
     Handle chat requests for different models
-    
+
     Args:
-        model: Model type ('gpt' or 'grok')
+        model: Model name of a registered backend ('gpt' or 'grok'), or
+            HEDGE_MODEL to race them
         message: User message
         session_id: Session identifier
-        files: List of temporary file paths (for Grok only)
-    
+        files: List of temporary file paths (backends with attachment support only)
+        deadline: When the caller stops waiting; upstream calls are bounded by it
+
     Returns:
         Dict containing status, message and response data
     """
     try:
-        session = session_manager.get_session(session_id)
-        if not session:
-            return {
-                "status": False,
-                "message": "Session expired or invalid",
-                "data": None
-            }
+        with session_manager.use_session(session_id) as session:
+            if not session:
+                return _missing_session(session_id)
 
-        if model == "grok":
-            return handle_grok_chat(message, session, files)
-        elif model == "gpt":
-            return handle_gpt_chat(message, session)
-        else:
-            return {
-                "status": False,
-                "message": f"Unsupported model: {model}",
-                "data": None
-            }
+            if model == HEDGE_MODEL:
+                return _hedged_chat(message, session, files, deadline)
 
+            backend = backend_registry.get(model)
+            if not backend:
+                return unsupported_model(model)
+            return backend.handle(message, session, _accepted_files(backend, files), deadline)
+
+    except DeadlineExceeded as e:
+        return _deadline_exceeded(e)
+    except CircuitOpenError as e:
+        return circuit_open(e.name, e.retry_after)
     except Exception as e:
         logging.error(f"Chat handling error: {str(e)}")
         return {
@@ -70,96 +113,319 @@ def handle_chat_request(model: str, message: str, session_id: str, files: List[s
             "data": None
         }
 
-def handle_grok_chat(message: str, session: Dict[str, Any], files: List[str] = None) -> Dict[str, Any]:
-    """Handle Grok model chat with optional file attachments"""
+async def handle_chat_request_async(model: str, message: str, session_id: str,
+                                    files: List[str] = None,
+                                    deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    """
+    Async version of handle_chat_request
+
+    Backends with native async I/O are awaited on the event loop; blocking
+    backends run on their own bounded thread pool and the coroutine awaits
+    the result. The whole call is cancelled once the deadline passes.
+    """
     try:
-        client = session.get("client")
-        if not client:
-            client = ModelHandler().get_grok_client()
-            session["client"] = client
-            session["conversation"] = []
-
-        msg_data = client.create_message("grok-2")
-        
-        session["conversation"].append({"role": "user", "content": message})
-        
-        file_attachments = []
-        if files:
-            for file_path in files:
-                try:
-                    response = client.upload_file(file_path)
-                    if response and response[0]:
-                        file_attachments.append(response[0])
-                except Exception as e:
-                    logging.error(f"Failed to upload file {file_path}: {str(e)}")
-
-        client.add_user_message(msg_data, message, file_attachments=file_attachments)
-        
-        response = client.send(msg_data)
-        response_message = GrokMessages(response)
-
-        if response_message.get_full_message():
-            session["conversation"].append({
-                "role": "assistant", 
-                "content": response_message.get_full_message()
-            })
+        async with _use_session_async(session_id) as session:
+            if not session:
+                return _missing_session(session_id)
 
-        return {
-            "status": True,
-            "message": "Success",
-            "data": {
-                "response": response_message.get_full_message(),
-                "session_id": session["session_id"],
-                "attachments": file_attachments
-            }
-        }
+            if model == HEDGE_MODEL:
+                call = _ahedged_chat(message, session, files, deadline)
+            else:
+                backend = backend_registry.get(model)
+                if not backend:
+                    return unsupported_model(model)
+                call = backend.ahandle(message, session, _accepted_files(backend, files), deadline)
+            if deadline is None:
+                return await call
+            return await asyncio.wait_for(call, deadline.remaining())
 
+    except (DeadlineExceeded, asyncio.TimeoutError) as e:
+        return _deadline_exceeded(e)
+    except CircuitOpenError as e:
+        return circuit_open(e.name, e.retry_after)
     except Exception as e:
-        logging.error(f"Grok chat error: {str(e)}")
+        logging.error(f"Chat handling error: {str(e)}")
         return {
             "status": False,
-            "message": str(e),
+            "message": f"Error processing chat: {str(e)}",
             "data": None
         }
 
-def handle_gpt_chat(message: str, session: Dict[str, Any]) -> Dict[str, Any]:
-    """Handle ChatGPT model chat"""
+@asynccontextmanager
+async def _use_session_async(session_id: str) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """
+    session_manager.use_session for coroutines
+
+    The lookup may read the session store or adopt the session, so it runs
+    on a thread rather than the event loop. If the caller is cancelled while
+    waiting, the session is released once the lookup finishes.
+    """
+    usage = session_manager.use_session(session_id)
+    lookup = asyncio.get_running_loop().run_in_executor(None, contextvars.copy_context().run, usage.__enter__)
     try:
-        client = session.get("client")
-        if not client:
-            client = ModelHandler().get_gpt_client()
-            session["client"] = client
-            session["conversation"] = []
-        
-        session["conversation"].append({"role": "user", "content": message})
-        
-        success = client.send_message(message)
-        if not success:
-            raise Exception("Failed to get response from ChatGPT")
-
-        messages = client.get_messages()
-        if not messages:
-            raise Exception("No response received")
-
-        if messages and messages[-1].content:
-            session["conversation"].append({
-                "role": "assistant",
-                "content": messages[-1].content
+        session = await asyncio.shield(lookup)
+    except asyncio.CancelledError:
+        lookup.add_done_callback(
+            lambda future: future.cancelled() or future.exception() or usage.__exit__(None, None, None)
+        )
+        raise
+    try:
+        yield session
+    finally:
+        usage.__exit__(None, None, None)
+
+def _missing_session(session_id: str) -> Dict[str, Any]:
+    owner = session_manager.get_session_owner(session_id)
+    return {
+        "status": False,
+        "message": f"Session is bound to another worker ({owner})" if owner else "Session expired or invalid",
+        "data": None
+    }
+
+def _deadline_exceeded(error: Exception) -> Dict[str, Any]:
+    logging.warning(f"Chat abandoned: {str(error) or 'Deadline exceeded'}")
+    return {
+        "status": False,
+        "message": "Deadline exceeded",
+        "data": None
+    }
+
+def _accepted_files(backend: ModelBackend, files: Optional[List[str]]) -> List[str]:
+    """Drop attachments for backends that can't take them"""
+    return list(files or []) if backend.capabilities.attachments else []
+
+def _hedge_backends() -> List[str]:
+    """The enabled HEDGE_MODELS, in the order they are tried"""
+    return [name for name in config_manager.get('HEDGE_MODELS') if backend_registry.is_enabled(name)]
+
+class HedgeLegs:
+    """
+    Sessions a 'fastest' session keeps on each backend it races
+
+    Held as the session's client, so they are ended along with it. A leg
+    still answering a request is left to expire on its own.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, model: str) -> Optional[str]:
+        """The leg session for a backend, created on first use or after it expired"""
+        with self._lock:
+            session_id = self.sessions.get(model)
+            if not session_id or not session_manager.get_session(session_id):
+                session_id = session_manager.create_session(model)
+                if session_id:
+                    self.sessions[model] = session_id
+            return session_id
+
+    def close(self) -> None:
+        with self._lock:
+            session_ids, self.sessions = list(self.sessions.values()), {}
+        for session_id in session_ids:
+            session_manager.end_session(session_id)
+
+class _Leg:
+    """One backend's attempt at a hedged request"""
+
+    def __init__(self, model: str, session_id: Optional[str], deadline: Deadline, offset: float):
+        self.model = model
+        self.session_id = session_id
+        # A copy of the request's deadline, cancelled to stop the leg once another wins
+        self.deadline = deadline
+        self.offset = offset
+        self.duration: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.outcome = "running"
+
+class _Hedge:
+    """
+    Progress of one hedged request
+
+    The first backend starts straight away and each next one after
+    HEDGE_DELAY_SECONDS more without an answer, or as soon as every started
+    leg has failed. The first successful answer wins and the legs still
+    running are cancelled: they stop at their next deadline check, so a
+    reply already being generated upstream finishes in the background.
+    The sync and async paths share this and differ in how legs are run.
+    """
+
+    def __init__(self, session: Dict[str, Any], files: Optional[List[str]], deadline: Optional[Deadline]):
+        self.session = session
+        self.deadline = deadline
+        self.start = time.perf_counter()
+        self.next_launch = self.start
+        # A request with attachments only races backends that can read them
+        self.queued = [name for name in _hedge_backends()
+                       if not backend_registry.retry_after(name)
+                       and (not files or backend_registry.capabilities(name).attachments)]
+        self.legs: List[_Leg] = []
+        self.winner: Optional[_Leg] = None
+
+    def active(self) -> List[_Leg]:
+        return [leg for leg in self.legs if leg.result is None]
+
+    def done(self) -> bool:
+        return (self.winner is not None or not (self.queued or self.active())
+                or (self.deadline is not None and self.deadline.expired))
+
+    def should_launch(self) -> bool:
+        return bool(self.queued) and (not self.active() or time.perf_counter() >= self.next_launch)
+
+    def launch(self) -> _Leg:
+        """Start the next leg; one without a session has already failed"""
+        model = self.queued.pop(0)
+        now = time.perf_counter()
+        self.next_launch = now + config_manager.get('HEDGE_DELAY_SECONDS')
+        legs = self.session.get("client")
+        if not isinstance(legs, HedgeLegs):
+            legs = self.session["client"] = HedgeLegs()
+        expires_at = self.deadline.expires_at if self.deadline else Deadline.after(model_timeout(model)).expires_at
+        leg = _Leg(model, legs.session_for(model), Deadline(expires_at), now - self.start)
+        self.legs.append(leg)
+        if not leg.session_id:
+            self.finish(leg, {
+                "status": False,
+                "message": "Session limit reached, try again later",
+                "data": None
             })
+        return leg
 
-        return {
-            "status": True,
-            "message": "Success",
-            "data": {
-                "response": messages[-1].content,
-                "session_id": session["session_id"]
-            }
+    def timeout(self) -> Optional[float]:
+        """How long to wait for a leg before launching the next or giving up"""
+        waits = []
+        if self.queued:
+            waits.append(max(self.next_launch - time.perf_counter(), 0.0))
+        if self.deadline is not None:
+            waits.append(self.deadline.remaining())
+        return min(waits) if waits else None
+
+    def finish(self, leg: _Leg, result: Dict[str, Any]) -> None:
+        leg.result = result
+        leg.duration = time.perf_counter() - self.start - leg.offset
+        if not result["status"]:
+            leg.outcome = "failed"
+        elif self.winner is None:
+            leg.outcome = "won"
+            self.winner = leg
+        else:
+            leg.outcome = "finished"
+
+    def cancel_rest(self) -> List[_Leg]:
+        """Cancel the legs still running and return them"""
+        running = self.active()
+        for leg in running:
+            leg.outcome = "cancelled"
+            leg.deadline.cancel()
+        return running
+
+    def response(self, message: str) -> Dict[str, Any]:
+        """The winner's answer under the hedged session, or why every leg failed"""
+        HEDGED_REQUESTS.inc(winner=self.winner.model if self.winner else "none", legs=len(self.legs))
+        report = {
+            "winner": self.winner.model if self.winner else None,
+            "legs": [
+                {
+                    "model": leg.model,
+                    "outcome": leg.outcome,
+                    "started_ms": round(leg.offset * 1000, 1),
+                    "duration_ms": round(leg.duration * 1000, 1) if leg.duration is not None else None
+                }
+                for leg in self.legs
+            ]
         }
 
-    except Exception as e:
-        logging.error(f"GPT chat error: {str(e)}")
+        if self.winner is not None:
+            answer = self.winner.result["data"]["response"]
+            self.session["conversation"].append({"role": "user", "content": message})
+            if answer:
+                self.session["conversation"].append({"role": "assistant", "content": answer})
+            return {
+                **self.winner.result,
+                "data": {
+                    **self.winner.result["data"],
+                    "session_id": self.session["session_id"],
+                    "model": self.winner.model,
+                    "hedge": report
+                }
+            }
+
+        if not self.legs:
+            return {
+                "status": False,
+                "message": f"No model is available for {HEDGE_MODEL}",
+                "data": None,
+                "retryable": True
+            }
+        if self.deadline is not None and self.deadline.expired:
+            return {
+                "status": False,
+                "message": "Deadline exceeded",
+                "data": None,
+                "hedge": report
+            }
+        failed = [leg for leg in self.legs if leg.result is not None]
         return {
             "status": False,
-            "message": str(e),
-            "data": None
+            "message": "Every model failed: " + "; ".join(f"{leg.model}: {leg.result['message']}" for leg in failed),
+            "data": None,
+            "retryable": any(leg.result.get("retryable") for leg in failed),
+            "hedge": report
         }
+
+def _hedged_chat(message: str, session: Dict[str, Any], files: Optional[List[str]],
+                 deadline: Optional[Deadline]) -> Dict[str, Any]:
+    """Race the HEDGE_MODELS backends, each leg on its backend's thread pool"""
+    hedge = _Hedge(session, files, deadline)
+    futures: Dict[Future, _Leg] = {}
+    while not hedge.done():
+        if hedge.should_launch():
+            leg = hedge.launch()
+            if leg.result is None:
+                futures[_start_leg(leg, message, files)] = leg
+            continue
+        running = [future for future, leg in futures.items() if leg.result is None]
+        finished, _ = wait(running, timeout=hedge.timeout(), return_when=FIRST_COMPLETED)
+        for future in finished:
+            hedge.finish(futures[future], future.result())
+    cancelled = hedge.cancel_rest()
+    for future, leg in futures.items():
+        if leg in cancelled:
+            # Drops a leg still queued for a thread; a running one stops at its deadline
+            future.cancel()
+    return hedge.response(message)
+
+def _start_leg(leg: _Leg, message: str, files: Optional[List[str]]) -> Future:
+    """
+    Run a leg on its backend's bounded thread pool, in a copy of the
+    caller's context to keep its trace
+    """
+    return backend_registry.get(leg.model).submit(handle_chat_request, leg.model, message, leg.session_id,
+                                                  files, leg.deadline)
+
+async def _ahedged_chat(message: str, session: Dict[str, Any], files: Optional[List[str]],
+                        deadline: Optional[Deadline]) -> Dict[str, Any]:
+    """Async version of _hedged_chat; losing legs' tasks are cancelled as well"""
+    hedge = _Hedge(session, files, deadline)
+    tasks: Dict[asyncio.Future, _Leg] = {}
+    try:
+        while not hedge.done():
+            if hedge.should_launch():
+                leg = hedge.launch()
+                if leg.result is None:
+                    task = asyncio.ensure_future(
+                        handle_chat_request_async(leg.model, message, leg.session_id, files, leg.deadline)
+                    )
+                    tasks[task] = leg
+                continue
+            running = [task for task, leg in tasks.items() if leg.result is None]
+            finished, _ = await asyncio.wait(running, timeout=hedge.timeout(), return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                hedge.finish(tasks[task], task.result())
+    finally:
+        cancelled = hedge.cancel_rest()
+        for task, leg in tasks.items():
+            if leg in cancelled:
+                task.cancel()
+    return hedge.response(message)
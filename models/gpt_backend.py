@@ -0,0 +1,130 @@
+from typing import Dict, Any, List, Optional
+from gpt import ChatGPTClient
+from selenium.common.exceptions import WebDriverException
+import logging
+from models.backends import ModelBackend
+from utils.deadline import Deadline
+from utils.metrics import metrics
+from utils.tracing import tracer
+
+# Seconds to wait for a reply when the caller gives no deadline
+REPLY_TIMEOUT = 120
+
+STAGE_LATENCY = metrics.histogram(
+    "chatgpt_stage_duration_seconds",
+    "Time spent in each step of a ChatGPT chat",
+    ("stage",)
+)
+BROWSERS_ACTIVE = metrics.gauge("browsers_active", "Open ChatGPT browsers")
+BROWSERS_LEAKED = metrics.counter(
+    "browsers_leaked_total",
+    "Browsers that were garbage collected while still open instead of being closed"
+)
+BROWSERS_RECYCLED = metrics.counter(
+    "browsers_recycled_total",
+    "Browsers closed and replaced after the page stopped accepting input"
+)
+
+class ChatGPTReplyError(Exception):
+    """The page didn't produce a reply in time; usually transient"""
+
+class BrowserClient(ChatGPTClient):
+    """ChatGPTClient that keeps the browser metrics up to date"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._counted = True
+        BROWSERS_ACTIVE.inc()
+
+    def close(self) -> None:
+        if getattr(self, "_counted", False):
+            self._counted = False
+            BROWSERS_ACTIVE.dec()
+        super().close()
+
+    def __del__(self) -> None:
+        if getattr(self, "_counted", False):
+            BROWSERS_LEAKED.inc()
+        super().__del__()
+
+class GPTBackend(ModelBackend):
+    """
+    ChatGPT through browser automation
+
+    Every session drives its own Chrome instance. Calls block, so the async
+    path runs them on the backend's thread pool, and both paths are capped
+    at max_concurrency browsers working at once.
+    """
+
+    name = "gpt"
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Missing replies and browser hiccups (stale elements, timeouts) are transient"""
+        return isinstance(error, (ChatGPTReplyError, WebDriverException, ConnectionError, TimeoutError))
+
+    def chat(self, message: str, session: Dict[str, Any], files: List[str] = None,
+             deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Handle ChatGPT model chat; the reply wait is bounded by the deadline"""
+        if deadline:
+            deadline.check()
+
+        client = session.get("client")
+        if not client:
+            with tracer.span("chatgpt_launch"):
+                client = BrowserClient()
+            session["client"] = client
+
+        with tracer.span("chatgpt_input", STAGE_LATENCY, stage="input"):
+            sent = client.send_message(message, wait_for_reply=False,
+                                       deadline=deadline.expires_at if deadline else None)
+        if not sent:
+            if not (deadline and deadline.expired):
+                _recycle(session)
+            raise ChatGPTReplyError("Failed to send message to ChatGPT")
+
+        with tracer.span("chatgpt_wait_for_response", STAGE_LATENCY, stage="wait_for_response"):
+            replied = client.wait_for_response(
+                timeout=min(REPLY_TIMEOUT, deadline.remaining()) if deadline else REPLY_TIMEOUT
+            )
+        if not replied:
+            raise ChatGPTReplyError("Failed to get response from ChatGPT")
+
+        with tracer.span("chatgpt_extraction", STAGE_LATENCY, stage="extraction"):
+            messages = client.get_messages()
+        if not messages:
+            raise ChatGPTReplyError("No response received")
+
+        # Recorded only after the reply arrived so a retried attempt isn't recorded twice
+        session["conversation"].append({"role": "user", "content": message})
+        if messages and messages[-1].content:
+            session["conversation"].append({
+                "role": "assistant",
+                "content": messages[-1].content
+            })
+
+        return {
+            "status": True,
+            "message": "Success",
+            "data": {
+                "response": messages[-1].content,
+                "session_id": session["session_id"]
+            }
+        }
+
+def _recycle(session: Dict[str, Any]) -> None:
+    """
+    Close a session's browser after it failed to take input
+
+    The page is usually stuck (logged out, crashed tab, stale DOM); the next
+    attempt for the session opens a fresh browser instead.
+    """
+    client = session.get("client")
+    session["client"] = None
+    if client is None:
+        return
+    BROWSERS_RECYCLED.inc()
+    logging.warning(f"Recycling browser of session {session['session_id']}")
+    try:
+        client.close()
+    except Exception as e:
+        logging.error(f"Error closing browser of session {session['session_id']}: {str(e)}")
@@ -0,0 +1,164 @@
+from typing import Dict, Any, Optional, List
+from dataclasses import dataclass, field
+import asyncio
+import json
+import logging
+import threading
+import time
+from utils.config_manager import config_manager
+from utils.circuit_breaker import CircuitOpenError
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.token_bucket import TokenBucket
+
+DEFAULT_ACCOUNT = "default"
+
+@dataclass
+class GrokAccount:
+    """One set of Grok credentials with its own request budget"""
+    name: str
+    bearer_token: Optional[str]
+    csrf_token: Optional[str]
+    cookies: Optional[str]
+    bucket: TokenBucket
+    paused_until: float = 0.0  # monotonic
+    stats: Dict[str, int] = field(default_factory=lambda: {
+        "requests_total": 0,
+        "waited_total": 0,
+        "throttled_total": 0,
+        "conversations_total": 0
+    })
+
+class GrokAccountPool:
+    """
+    Grok accounts from GROK_ACCOUNTS_FILE, or the single GROK_* credentials.
+
+    Every account has a token bucket of GROK_ACCOUNT_RATE_PER_MINUTE with
+    bursts of GROK_ACCOUNT_BURST. New conversations go to the account with
+    the most tokens left; a conversation stays on its account, since it only
+    exists there. An account Grok throttles (HTTP 429) is paused for
+    GROK_ACCOUNT_PAUSE_SECONDS and takes no new conversations meanwhile.
+
+    The accounts file is a JSON list of objects with name, bearer_token,
+    csrf_token, cookies and optionally rate_per_minute and burst. It is
+    re-read when the config reloads; buckets of unchanged accounts are kept.
+    """
+
+    def __init__(self):
+        self._accounts: Dict[str, GrokAccount] = {}
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, GrokAccount]:
+        """Accounts for the current config, rebuilt after a reload"""
+        if self._generation == config_manager.generation:
+            return self._accounts
+        with self._lock:
+            if self._generation != config_manager.generation:
+                accounts = {}
+                for entry in self._read_entries():
+                    rate = float(entry.get("rate_per_minute") or config_manager.get('GROK_ACCOUNT_RATE_PER_MINUTE'))
+                    burst = float(entry.get("burst") or config_manager.get('GROK_ACCOUNT_BURST'))
+                    previous = self._accounts.get(entry["name"])
+                    same = previous and (
+                        (previous.bearer_token, previous.csrf_token, previous.cookies, previous.bucket.rate, previous.bucket.capacity)
+                        == (entry.get("bearer_token"), entry.get("csrf_token"), entry.get("cookies"), rate / 60, burst)
+                    )
+                    accounts[entry["name"]] = previous if same else GrokAccount(
+                        name=entry["name"],
+                        bearer_token=entry.get("bearer_token"),
+                        csrf_token=entry.get("csrf_token"),
+                        cookies=entry.get("cookies"),
+                        bucket=TokenBucket(rate / 60, burst)
+                    )
+                self._accounts = accounts
+                self._generation = config_manager.generation
+        return self._accounts
+
+    def _read_entries(self) -> List[Dict[str, Any]]:
+        path = config_manager.get('GROK_ACCOUNTS_FILE')
+        if path:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+                valid = [e for e in entries if isinstance(e, dict) and e.get("name")]
+                if valid:
+                    return valid
+                logging.error(f"No usable accounts in {path}")
+            except (OSError, ValueError, TypeError) as e:
+                logging.error(f"Failed to read Grok accounts from {path}: {str(e)}")
+        return [{
+            "name": DEFAULT_ACCOUNT,
+            "bearer_token": config_manager.get('GROK_BEARER_TOKEN'),
+            "csrf_token": config_manager.get('GROK_CSRF_TOKEN'),
+            "cookies": config_manager.get('GROK_COOKIES')
+        }]
+
+    def get(self, name: Optional[str]) -> GrokAccount:
+        """An account by name; unknown or missing names get the first account"""
+        accounts = self._load()
+        return accounts.get(name) or next(iter(accounts.values()))
+
+    def choose(self) -> GrokAccount:
+        """Account for a new conversation: the unpaused one with the most headroom"""
+        now = time.monotonic()
+        accounts = list(self._load().values())
+        ready = [a for a in accounts if a.paused_until <= now]
+        if not ready:
+            return min(accounts, key=lambda a: a.paused_until)
+        return max(ready, key=lambda a: a.bucket.available())
+
+    def _reserve(self, account: GrokAccount, deadline: Optional[Deadline]) -> float:
+        """
+        Take one request from an account's budget
+
+        Returns:
+            Seconds to wait before sending
+        Raises:
+            CircuitOpenError: While the account is paused
+            DeadlineExceeded: If the next token comes after the deadline
+        """
+        paused_for = account.paused_until - time.monotonic()
+        if paused_for > 0:
+            raise CircuitOpenError(f"grok:{account.name}", paused_for)
+        wait = account.bucket.reserve(deadline.remaining() if deadline else None)
+        if wait is None:
+            raise DeadlineExceeded(f"Deadline exceeded waiting for Grok account {account.name}")
+        account.stats["requests_total"] += 1
+        account.stats["waited_total"] += wait > 0
+        return wait
+
+    def acquire(self, account: GrokAccount, deadline: Optional[Deadline] = None) -> None:
+        """Wait for a request slot on an account (see _reserve)"""
+        wait = self._reserve(account, deadline)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, account: GrokAccount, deadline: Optional[Deadline] = None) -> None:
+        """Async version of acquire"""
+        wait = self._reserve(account, deadline)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def throttled(self, account: GrokAccount) -> None:
+        """Pause an account after Grok signalled throttling"""
+        pause = config_manager.get('GROK_ACCOUNT_PAUSE_SECONDS')
+        account.paused_until = time.monotonic() + pause
+        account.stats["throttled_total"] += 1
+        logging.warning(f"Grok account {account.name} rate limited, paused for {pause:.0f}s")
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Budget, pause state and counters per account (no credentials)"""
+        now = time.monotonic()
+        return {
+            account.name: {
+                **account.stats,
+                "tokens": round(account.bucket.available(), 3),
+                "rate_per_minute": account.bucket.rate * 60,
+                "burst": account.bucket.capacity,
+                "paused": account.paused_until > now,
+                "retry_after": round(max(account.paused_until - now, 0.0), 3)
+            }
+            for account in self._load().values()
+        }
+
+grok_accounts = GrokAccountPool()
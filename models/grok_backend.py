@@ -0,0 +1,315 @@
+from typing import Dict, Any, Iterator, Optional, List, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+from grok import Grok, GrokMessages, GrokError, GrokRateLimitError
+import httpx
+import logging
+import os
+import requests
+import threading
+import time
+from models.backends import ModelBackend
+from models.grok_accounts import GrokAccount, grok_accounts
+from utils.blob_store import blob_store
+from utils.config_manager import config_manager
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.metrics import metrics
+from utils.tracing import tracer
+from utils.session_manager import session_manager
+
+STAGE_LATENCY = metrics.histogram(
+    "grok_stage_duration_seconds",
+    "Time spent in each step of a Grok chat; upload is observed once per file",
+    ("stage",)
+)
+UPLOADS_REUSED = metrics.counter(
+    "grok_uploads_reused_total",
+    "Attachments sent with the media of an earlier upload to the same account"
+)
+
+class UploadCache:
+    """
+    Attachments already uploaded to each Grok account, by blob id
+
+    Stored blobs are named by their content hash, so a blob sent to the same
+    account again, e.g. by every item of a batch, reuses the first upload
+    for GROK_UPLOAD_REUSE_SECONDS. Other files, such as the temporary files
+    of /api/chat/send, are always uploaded.
+    """
+
+    MAX_ENTRIES = 1024
+
+    def __init__(self):
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._pending: Dict[Tuple[str, str], List] = {}
+        self._lock = threading.Lock()
+
+    def key(self, account: GrokAccount, file_path: str) -> Optional[Tuple[str, str]]:
+        """Cache key of a file, or None if it must not be reused"""
+        if config_manager.get('GROK_UPLOAD_REUSE_SECONDS') <= 0:
+            return None
+        if os.path.dirname(file_path) != blob_store.root_dir:
+            return None
+        return account.name, os.path.basename(file_path)
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """The unexpired attachment stored under key"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        UPLOADS_REUSED.inc()
+        return entry[1]
+
+    def put(self, key: Tuple[str, str], attachment: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + config_manager.get('GROK_UPLOAD_REUSE_SECONDS'), attachment)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    @contextmanager
+    def claim(self, key: Tuple[str, str]) -> Iterator[None]:
+        """Hold key while uploading, so threads uploading the same blob wait and reuse it"""
+        with self._lock:
+            pending = self._pending.setdefault(key, [threading.Lock(), 0])
+            pending[1] += 1
+        try:
+            with pending[0]:
+                yield
+        finally:
+            with self._lock:
+                pending[1] -= 1
+                if not pending[1]:
+                    del self._pending[key]
+
+_uploads = UploadCache()
+
+class GrokBackend(ModelBackend):
+    """
+    Grok over its HTTP API; async requests wait on a pooled async client
+
+    Requests are spread over the accounts in models.grok_accounts: a session
+    is placed on an account when its conversation is created and stays there.
+    """
+
+    name = "grok"
+    async_native = True
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Dropped connections, timeouts, throttling and 5xx answers are transient"""
+        if isinstance(error, GrokError):
+            return error.status_code is None or error.status_code >= 500 or error.status_code == 429
+        return isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError,
+                                  ConnectionError, TimeoutError))
+
+    def breaker_names(self, session: Dict[str, Any]) -> List[str]:
+        """The backend-wide breaker plus one for the account the session uses"""
+        return [self.name, f"{self.name}:{session.get('account') or 'default'}"]
+
+    def handle(self, message: str, session: Dict[str, Any], files: List[str] = None,
+               deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        _place(session)
+        return super().handle(message, session, files, deadline)
+
+    async def ahandle(self, message: str, session: Dict[str, Any], files: List[str] = None,
+                      deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        _place(session)
+        return await super().ahandle(message, session, files, deadline)
+
+    def chat(self, message: str, session: Dict[str, Any], files: List[str] = None,
+             deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Handle Grok model chat with optional file attachments"""
+        account = grok_accounts.get(session.get("account"))
+        grok_accounts.acquire(account, deadline)
+        try:
+            return self._chat(account, message, session, files, deadline)
+        except GrokRateLimitError:
+            grok_accounts.throttled(account)
+            raise
+
+    def _chat(self, account: GrokAccount, message: str, session: Dict[str, Any],
+              files: List[str], deadline: Optional[Deadline]) -> Dict[str, Any]:
+        client = session.get("client")
+        if not client:
+            client = self._new_client(account)
+            if session.get("conversation_id"):
+                client.set_conversation_id(session["conversation_id"])
+            else:
+                with tracer.span("grok_create_conversation", STAGE_LATENCY, stage="create_conversation"):
+                    client.create_conversation(timeout=_remaining(deadline))
+                account.stats["conversations_total"] += 1
+            _bind_client(session, client)
+
+        msg_data = client.create_message("grok-2")
+
+        file_attachments = []
+        for file_path in files or []:
+            try:
+                attachment = _upload(account, client, file_path, deadline)
+                if attachment:
+                    file_attachments.append(attachment)
+            except Exception as e:
+                if _is_upstream_failure(e):
+                    raise
+                logging.error(f"Failed to upload file {file_path}: {str(e)}")
+
+        client.add_user_message(msg_data, message, file_attachments=file_attachments)
+
+        with tracer.span("grok_send", STAGE_LATENCY, stage="send"):
+            response = client.send(msg_data, timeout=_remaining(deadline))
+        return _result(session, message, _parse(response), file_attachments)
+
+    async def achat(self, message: str, session: Dict[str, Any], files: List[str] = None,
+                    deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Async version of chat; waits on upstream I/O without holding a thread"""
+        account = grok_accounts.get(session.get("account"))
+        await grok_accounts.aacquire(account, deadline)
+        try:
+            return await self._achat(account, message, session, files, deadline)
+        except GrokRateLimitError:
+            grok_accounts.throttled(account)
+            raise
+
+    async def _achat(self, account: GrokAccount, message: str, session: Dict[str, Any],
+                     files: List[str], deadline: Optional[Deadline]) -> Dict[str, Any]:
+        client = session.get("client")
+        if not client:
+            client = self._new_client(account)
+            if session.get("conversation_id"):
+                client.set_conversation_id(session["conversation_id"])
+            else:
+                with tracer.span("grok_create_conversation", STAGE_LATENCY, stage="create_conversation"):
+                    await client.acreate_conversation(timeout=_remaining(deadline))
+                account.stats["conversations_total"] += 1
+            _bind_client(session, client)
+
+        msg_data = client.create_message("grok-2")
+
+        file_attachments = []
+        for file_path in files or []:
+            try:
+                attachment = await _aupload(account, client, file_path, deadline)
+                if attachment:
+                    file_attachments.append(attachment)
+            except Exception as e:
+                if _is_upstream_failure(e):
+                    raise
+                logging.error(f"Failed to upload file {file_path}: {str(e)}")
+
+        client.add_user_message(msg_data, message, file_attachments=file_attachments)
+
+        with tracer.span("grok_send", STAGE_LATENCY, stage="send"):
+            response = await client.asend(msg_data, timeout=_remaining(deadline))
+        return _result(session, message, _parse(response), file_attachments)
+
+    def _new_client(self, account: GrokAccount) -> Grok:
+        """Build a Grok client from an account's credentials"""
+        return Grok(
+            account_bearer_token=account.bearer_token,
+            x_csrf_token=account.csrf_token,
+            cookies=account.cookies
+        )
+
+def _place(session: Dict[str, Any]) -> None:
+    """
+    Pick the account for a session that has no conversation yet
+
+    Sessions with a conversation keep their account; older sessions that
+    never recorded one use the first configured account.
+    """
+    if not session.get("conversation_id"):
+        session["account"] = grok_accounts.choose().name
+    elif not session.get("account"):
+        session["account"] = grok_accounts.get(None).name
+
+def _upload(account: GrokAccount, client: Grok, file_path: str,
+            deadline: Optional[Deadline]) -> Optional[Dict[str, Any]]:
+    """Upload a file, or reuse its earlier upload to the account"""
+    key = _uploads.key(account, file_path)
+    if key is None:
+        with tracer.span("grok_upload", STAGE_LATENCY, stage="upload"):
+            response = client.upload_file(file_path, timeout=_remaining(deadline))
+        return response[0] if response else None
+    with _uploads.claim(key):
+        attachment = _uploads.get(key)
+        if attachment is None:
+            with tracer.span("grok_upload", STAGE_LATENCY, stage="upload"):
+                response = client.upload_file(file_path, timeout=_remaining(deadline))
+            attachment = response[0] if response else None
+            if attachment:
+                _uploads.put(key, attachment)
+    return attachment
+
+async def _aupload(account: GrokAccount, client: Grok, file_path: str,
+                   deadline: Optional[Deadline]) -> Optional[Dict[str, Any]]:
+    """Async version of _upload; concurrent first uploads of a blob are not merged"""
+    key = _uploads.key(account, file_path)
+    attachment = _uploads.get(key) if key is not None else None
+    if attachment is None:
+        with tracer.span("grok_upload", STAGE_LATENCY, stage="upload"):
+            response = await client.aupload_file(file_path, timeout=_remaining(deadline))
+        attachment = response[0] if response else None
+        if attachment and key is not None:
+            _uploads.put(key, attachment)
+    return attachment
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """
+    Whether an upload error means Grok itself is failing
+
+    Those abort the chat so the circuit breakers see them; a file Grok
+    rejects (HTTP 4xx) or can't read is skipped as before.
+    """
+    if isinstance(error, GrokError):
+        return error.status_code is None or error.status_code >= 500 or error.status_code == 429
+    return isinstance(error, (DeadlineExceeded, requests.RequestException, httpx.TransportError))
+
+def _remaining(deadline: Optional[Deadline]) -> Optional[float]:
+    """Timeout for the next upstream call; raises once the deadline has passed"""
+    if deadline is None:
+        return None
+    deadline.check()
+    return deadline.remaining()
+
+def _parse(response: str) -> GrokMessages:
+    """Parse a reply, timed as the parse stage"""
+    with tracer.span("grok_parse", STAGE_LATENCY, stage="parse"):
+        return GrokMessages(response)
+
+def _bind_client(session: Dict[str, Any], client: Grok) -> None:
+    """Attach a Grok client to a session and share its conversation id"""
+    session["client"] = client
+    if session.get("conversation_id") != client.conversation_id:
+        session["conversation_id"] = client.conversation_id
+        session_manager.sync_session(session)
+
+def _result(session: Dict[str, Any], message: str, response_message: GrokMessages,
+            file_attachments: List[dict]) -> Dict[str, Any]:
+    """
+    Record the exchange and build the chat response
+
+    The user message is only recorded once the reply arrived, so a failed
+    attempt that gets retried doesn't leave it in the history twice.
+    """
+    full_message = response_message.get_full_message()
+    session["conversation"].append({"role": "user", "content": message})
+    if full_message:
+        session["conversation"].append({
+            "role": "assistant",
+            "content": full_message
+        })
+
+    return {
+        "status": True,
+        "message": "Success",
+        "data": {
+            "response": full_message,
+            "session_id": session["session_id"],
+            "attachments": file_attachments
+        }
+    }
@@ -1,8 +1,17 @@
-from flask import Blueprint, jsonify
-from typing import Dict, Any, Tuple
+from flask import Blueprint, jsonify, request
+from typing import Dict, Any, Tuple, Union
+from middlewares.auth import admin_middleware
 from utils.session_manager import session_manager
+from utils.blob_store import blob_store
+from models.backends import backend_registry
+from models.grok_accounts import grok_accounts
+from utils.circuit_breaker import breakers
+from utils.rate_limiter import rate_limiter
+from utils.config_manager import config_manager
+from utils.profiler import profiler, ProfilerBusy
 
 admin_bp = Blueprint('admin', __name__)
+admin_bp.before_request(admin_middleware)
 
 @admin_bp.route('/sessions', methods=['GET'])
 def get_sessions() -> Tuple[Dict[str, Any], int]:
@@ -38,3 +47,108 @@ def session_stats() -> Tuple[Dict[str, Any], int]:
         "message": "Session statistics retrieved",
         "data": stats
     }, 200
+
+@admin_bp.route('/blobs/stats', methods=['GET'])
+def blob_stats() -> Tuple[Dict[str, Any], int]:
+    """Get attachment blob store statistics"""
+    stats = blob_store.get_stats()
+    return {
+        "status": True,
+        "message": "Blob store statistics retrieved",
+        "data": stats
+    }, 200
+
+@admin_bp.route('/backends', methods=['GET'])
+def get_backends() -> Tuple[Dict[str, Any], int]:
+    """Get enabled model backends, their capabilities and whether they are loaded"""
+    return {
+        "status": True,
+        "message": "Model backends retrieved",
+        "data": backend_registry.describe()
+    }, 200
+
+@admin_bp.route('/breakers', methods=['GET'])
+def get_breakers() -> Tuple[Dict[str, Any], int]:
+    """Get state and counters of every upstream circuit breaker"""
+    return {
+        "status": True,
+        "message": "Circuit breakers retrieved",
+        "data": breakers.get_stats()
+    }, 200
+
+@admin_bp.route('/breakers/reset', methods=['POST'])
+def reset_breakers() -> Tuple[Dict[str, Any], int]:
+    """Close one circuit breaker (?name=grok) or all of them"""
+    count = breakers.reset(request.args.get('name'))
+    return {
+        "status": True,
+        "message": "Circuit breakers reset",
+        "data": {
+            "reset_count": count
+        }
+    }, 200
+
+@admin_bp.route('/grok/accounts', methods=['GET'])
+def grok_account_stats() -> Tuple[Dict[str, Any], int]:
+    """Get request budget, pause state and usage of every Grok account"""
+    return {
+        "status": True,
+        "message": "Grok accounts retrieved",
+        "data": grok_accounts.get_stats()
+    }, 200
+
+@admin_bp.route('/clients', methods=['GET'])
+def client_stats() -> Tuple[Dict[str, Any], int]:
+    """Get request and rate limit counters of every API client"""
+    return {
+        "status": True,
+        "message": "API clients retrieved",
+        "data": rate_limiter.get_stats()
+    }, 200
+
+@admin_bp.route('/config/reload', methods=['POST'])
+def reload_config() -> Tuple[Dict[str, Any], int]:
+    """Re-read .env now and apply the changes live"""
+    changed = config_manager.load_config()
+    return {
+        "status": True,
+        "message": "Configuration reloaded",
+        "data": {
+            "changed": changed,
+            "generation": config_manager.generation
+        }
+    }, 200
+
+@admin_bp.route('/profile', methods=['POST'])
+def profile() -> Union[Tuple[str, int, Dict[str, str]], Tuple[Dict[str, Any], int]]:
+    """
+    Sample the stacks of every thread and return them collapsed for a flame graph
+
+    Query parameters:
+        seconds: How long to sample (default 10, max PROFILE_MAX_SECONDS)
+        interval_ms: Time between samples (default 10, min 1)
+
+    The request blocks for the whole window; one profile runs at a time.
+    """
+    seconds = request.args.get('seconds', 10, type=float)
+    interval_ms = request.args.get('interval_ms', 10, type=float)
+    max_seconds = config_manager.get('PROFILE_MAX_SECONDS')
+    if not 0 < seconds <= max_seconds or interval_ms < 1:
+        return {
+            "status": False,
+            "message": f"seconds must be in (0, {max_seconds:g}] and interval_ms at least 1",
+            "data": None
+        }, 400
+
+    try:
+        stacks, samples = profiler.profile(seconds, interval_ms / 1000)
+    except ProfilerBusy as e:
+        return {
+            "status": False,
+            "message": str(e),
+            "data": None
+        }, 409
+    return stacks, 200, {
+        "Content-Type": "text/plain; charset=utf-8",
+        "X-Profile-Samples": str(samples)
+    }
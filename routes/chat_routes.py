@@ -1,9 +1,19 @@
-from flask import Blueprint, request, jsonify
-from typing import Dict, Any, Tuple
-from models.chat_handler import handle_chat_request
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from models.backends import backend_registry
+from models.chat_handler import accepts_attachments, handle_chat_request, unsupported_model, unavailable_model
+from utils.blob_store import blob_store
 from utils.session_manager import session_manager
+from utils.config_manager import config_manager
+from utils.deadline import Deadline, DEADLINE_HEADER, DEADLINE_FIELD, resolve_timeout
+from utils.lifecycle import lifecycle
+from utils.tracing import tracer
 from werkzeug.utils import secure_filename
 import tempfile
+import threading
+import time
+import json
 import os
 import logging
 import base64
@@ -32,16 +42,19 @@ def handle_base64_files(files_data: list) -> list[str]:
         List of temporary file paths
     """
     temp_files = []
-    try:
-        for file_data in files_data or []:
-            if file_data.get('base64') and file_data.get('filename'):
-                suffix = os.path.splitext(secure_filename(file_data['filename']))[1]
-                with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp:
-                    file_content = base64.b64decode(file_data['base64'])
-                    temp.write(file_content)
-                    temp_files.append(temp.name)
-    except Exception as e:
-        logging.error(f"Error processing base64 files: {str(e)}")
+    if not files_data:
+        return temp_files
+    with tracer.span("decode_files"):
+        try:
+            for file_data in files_data:
+                if file_data.get('base64') and file_data.get('filename'):
+                    suffix = os.path.splitext(secure_filename(file_data['filename']))[1]
+                    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp:
+                        file_content = base64.b64decode(file_data['base64'])
+                        temp.write(file_content)
+                        temp_files.append(temp.name)
+        except Exception as e:
+            logging.error(f"Error processing base64 files: {str(e)}")
     return temp_files
 
 @chat_bp.route('/send', methods=['POST'])
@@ -51,9 +64,10 @@ def send_message() -> Tuple[Dict[str, Any], int]:
     
     Expected JSON body:
     {
-        "model": "gpt|grok",
+        "model": "gpt|grok|fastest",
         "message": "string",
         "session_id": "string" (optional),
+        "timeout": seconds (optional, or X-Request-Timeout header),
         "files": [
             {
                 "filename": "image.jpg",
@@ -79,16 +93,40 @@ def send_message() -> Tuple[Dict[str, Any], int]:
                 "data": None
             }, 400
 
+        invalid = unsupported_model(model)
+        if invalid:
+            return invalid, 400
+        unavailable = unavailable_model(model)
+        if unavailable:
+            return unavailable
+
+        try:
+            deadline = Deadline.after(
+                resolve_timeout(model, request.headers.get(DEADLINE_HEADER), data.get(DEADLINE_FIELD))
+            )
+        except ValueError as e:
+            return {
+                "status": False,
+                "message": str(e),
+                "data": None
+            }, 400
+
         temp_files = []
         try:
-            if model == "grok":
+            if accepts_attachments(model):
                 temp_files = handle_base64_files(files_data)
 
             if not session_id:
                 session_id = session_manager.create_session(model)
-            
-            response = handle_chat_request(model, message, session_id, temp_files)
-            return response, 200
+                if not session_id:
+                    return {
+                        "status": False,
+                        "message": "Session limit reached, try again later",
+                        "data": None
+                    }, 429, {"Retry-After": str(config_manager.get('SESSION_OVERFLOW_RETRY_AFTER_SECONDS'))}
+
+            response = handle_chat_request(model, message, session_id, temp_files, deadline)
+            return response, 504 if not response["status"] and deadline.expired else 200
         finally:
             for temp_file in temp_files:
                 try:
@@ -103,3 +141,279 @@ def send_message() -> Tuple[Dict[str, Any], int]:
             "message": "Internal server error",
             "data": None
         }, 500
+
+@chat_bp.route('/batch', methods=['POST'])
+def send_batch():
+    """
+    Send many chat messages at once and stream each result as it completes.
+
+    Expected JSON body:
+    {
+        "items": [
+            {
+                "id": "string" (optional, echoed back),
+                "model": "gpt|grok|fastest",
+                "message": "string",
+                "session_id": "string" (optional)
+            }
+        ],
+        "timeout": seconds (optional, or X-Request-Timeout header; per item),
+        "files": [{"filename": "image.jpg", "base64": "..."}] (optional,
+            shared by every item whose model takes attachments)
+    }
+
+    Returns:
+        An application/x-ndjson stream with one line per item in completion
+        order, then a final summary line; or a JSON error and status code
+        if the batch itself is invalid
+    """
+    started = time.perf_counter()
+    try:
+        data = request.get_json(silent=True)
+        items = data.get('items') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return {
+                "status": False,
+                "message": "Missing required fields",
+                "data": None
+            }, 400
+        if len(items) > config_manager.get('BATCH_MAX_ITEMS'):
+            return {
+                "status": False,
+                "message": f"Too many items, at most {config_manager.get('BATCH_MAX_ITEMS')} per batch",
+                "data": None
+            }, 400
+
+        deadlines = {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get('model') or not item.get('message'):
+                return {
+                    "status": False,
+                    "message": f"Missing required fields in item {index}",
+                    "data": None
+                }, 400
+            invalid = unsupported_model(item['model'])
+            if invalid:
+                invalid["message"] += f" in item {index}"
+                return invalid, 400
+            if item['model'] not in deadlines:
+                try:
+                    deadlines[item['model']] = Deadline.after(
+                        resolve_timeout(item['model'], request.headers.get(DEADLINE_HEADER), data.get(DEADLINE_FIELD))
+                    )
+                except ValueError as e:
+                    return {
+                        "status": False,
+                        "message": str(e),
+                        "data": None
+                    }, 400
+
+        refs = []
+        if any(accepts_attachments(model) for model in deadlines):
+            try:
+                with tracer.span("decode_files"):
+                    refs = blob_store.put_many_base64(data.get('files', []))
+            except Exception as e:
+                logging.error(f"Error processing base64 files: {str(e)}")
+                return {
+                    "status": False,
+                    "message": "Invalid file data",
+                    "data": None
+                }, 400
+
+        futures = _start_batch(items, deadlines, refs)
+        return Response(
+            stream_with_context(_stream_batch(futures, started)),
+            mimetype='application/x-ndjson'
+        )
+
+    except Exception as e:
+        logging.error(f"Error in batch endpoint: {str(e)}")
+        return {
+            "status": False,
+            "message": "Internal server error",
+            "data": None
+        }, 500
+
+class BatchPools:
+    """
+    Thread pools running batch items, one per model, shared by every batch
+
+    A model's pool runs at most BATCH_MAX_CONCURRENCY items of all batches,
+    and no more than the backend serves at once, so batches can't park a
+    pile of threads on a slow model's slots. Pools are rebuilt when either
+    limit changes; the old ones finish the items already queued on them.
+    """
+
+    def __init__(self):
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, model: str, fn: Callable[..., Any], *args: Any) -> Future:
+        """Queue fn on the model's pool; holding the lock keeps close() from racing the submit"""
+        with self._lock:
+            pool = self._pools.get(model)
+            if pool is None:
+                limit = config_manager.get('BATCH_MAX_CONCURRENCY')
+                capabilities = backend_registry.capabilities(model)
+                backend_limit = capabilities.max_concurrency if capabilities else None
+                pool = self._pools[model] = ThreadPoolExecutor(
+                    max_workers=max(min(limit, backend_limit or limit), 1),
+                    thread_name_prefix=f"batch-{model}"
+                )
+            return pool.submit(fn, *args)
+
+    def close(self) -> None:
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.shutdown(wait=False)
+
+batch_pools = BatchPools()
+config_manager.subscribe(lambda old, new: batch_pools.close(), ('BATCH_MAX_CONCURRENCY', 'BROWSER_EXECUTOR_WORKERS'))
+lifecycle.register("batch_pools", lambda: None, batch_pools.close)
+
+def _start_batch(items: List[Dict[str, Any]], deadlines: Dict[str, Deadline],
+                 refs: List[Dict[str, Any]]) -> Dict[Future, int]:
+    """
+    Submit batch items to the shared per-model pools
+
+    The shared attachments are released once the last item is done, even
+    if the client went away first.
+
+    Returns:
+        The item index of each future
+    """
+    paths = [blob_store.path_for(ref["blob_id"]) for ref in refs]
+    remaining = [len(items)]
+    lock = threading.Lock()
+
+    def finished(_: Future) -> None:
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            blob_store.release_many(refs)
+
+    futures: Dict[Future, int] = {}
+    for index, item in enumerate(items):
+        model = item['model']
+        files = paths if accepts_attachments(model) else []
+        futures[batch_pools.submit(model, _run_batch_item, index, item, files, deadlines[model])] = index
+    for future in futures:
+        future.add_done_callback(finished)
+    return futures
+
+def _stream_batch(futures: Dict[Future, int], started: float) -> Iterator[str]:
+    """Yield an NDJSON line per item as it finishes, then the summary line"""
+    succeeded = 0
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                line = future.result()
+                succeeded += bool(line["status"])
+                yield json.dumps(line) + "\n"
+        yield json.dumps({
+            "status": True,
+            "message": "Batch completed",
+            "data": {
+                "total": len(futures),
+                "succeeded": succeeded,
+                "failed": len(futures) - succeeded,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+            }
+        }) + "\n"
+    finally:
+        # The client went away: items that haven't started are dropped
+        for future in pending:
+            future.cancel()
+
+def _run_batch_item(index: int, item: Dict[str, Any], files: List[str], deadline: Deadline) -> Dict[str, Any]:
+    """Run one batch item as its own trace and build its result line"""
+    model = item['model']
+    result: Dict[str, Any] = {"index": index, "id": item.get('id')}
+    with tracer.trace("batch_item", model=model, index=index) as trace:
+        try:
+            response, code = _batch_item_response(model, item['message'], item.get('session_id'), files, deadline)
+        except Exception as e:
+            logging.error(f"Error in batch item {index}: {str(e)}")
+            response, code = {
+                "status": False,
+                "message": "Internal server error",
+                "data": None
+            }, 500
+        trace.attributes["status"] = response["status"]
+        result.update(response)
+        result["code"] = code
+        result["timings"] = trace.summary()
+    return result
+
+def _batch_item_response(model: str, message: str, session_id: Optional[str], files: List[str],
+                         deadline: Deadline) -> Tuple[Dict[str, Any], int]:
+    """The response and status code /api/chat/send would give for one item"""
+    unavailable = unavailable_model(model)
+    if unavailable:
+        return unavailable[0], unavailable[1]
+    if deadline.expired:
+        return {
+            "status": False,
+            "message": "Deadline exceeded",
+            "data": None
+        }, 504
+    if not session_id:
+        session_id = session_manager.create_session(model)
+        if not session_id:
+            return {
+                "status": False,
+                "message": "Session limit reached, try again later",
+                "data": None
+            }, 429
+    response = handle_chat_request(model, message, session_id, files, deadline)
+    return response, 504 if not response["status"] and deadline.expired else 200
+
+@chat_bp.route('/history/<session_id>', methods=['GET'])
+def get_history(session_id: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Page through a session's conversation history, oldest message first.
+
+    Query parameters:
+        offset: Index of the first message to return (default 0)
+        limit: Maximum number of messages to return (default 50, max 500)
+
+    Returns:
+        Tuple[Dict, int]: Response data and status code
+    """
+    try:
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+
+        session = session_manager.get_session(session_id)
+        if not session:
+            return {
+                "status": False,
+                "message": "Session expired or invalid",
+                "data": None
+            }, 404
+
+        history = session["conversation"]
+        return {
+            "status": True,
+            "message": "Conversation history retrieved",
+            "data": {
+                "session_id": session_id,
+                "total": len(history),
+                "offset": offset,
+                "limit": limit,
+                "messages": history.page(offset, limit)
+            }
+        }, 200
+
+    except Exception as e:
+        logging.error(f"Error in history endpoint: {str(e)}")
+        return {
+            "status": False,
+            "message": "Internal server error",
+            "data": None
+        }, 500
@@ -0,0 +1,10 @@
+from flask import Blueprint
+from typing import Dict, Tuple
+from utils.metrics import metrics, CONTENT_TYPE
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics() -> Tuple[str, int, Dict[str, str]]:
+    """Every metric of this process in the Prometheus text format"""
+    return metrics.render(), 200, {"Content-Type": CONTENT_TYPE}
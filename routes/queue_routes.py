@@ -1,19 +1,30 @@
 from flask import Blueprint, request, jsonify
 from typing import Dict, Any, Tuple
+from models.chat_handler import accepts_attachments, unsupported_model, unavailable_model
 from utils.queue_manager import queue_manager
+from utils.blob_store import blob_store
+from utils.config_manager import config_manager
+from utils.deadline import Deadline, DEADLINE_HEADER, DEADLINE_FIELD, resolve_timeout
 import logging
 
 queue_bp = Blueprint('queue', __name__)
 
 @queue_bp.route('/submit', methods=['POST'])
 def submit_task() -> Tuple[Dict[str, Any], int]:
-    """Submit new task to queue"""
+    """
+    Submit new task to queue
+
+    Attachments are decoded into the blob store up front so only small
+    references wait in the queue. The task's deadline (X-Request-Timeout
+    header or 'timeout' field, default QUEUE_TASK_TIMEOUT_SECONDS) covers
+    time spent queued; tasks still waiting when it passes are dropped.
+    """
     try:
         data = request.get_json()
         model = data.get('model')
         message = data.get('message')
         session_id = data.get('session_id')
-        files = data.get('files', [])
+        files_data = data.get('files', [])
 
         if not model or not message:
             return {
@@ -22,7 +33,43 @@ def submit_task() -> Tuple[Dict[str, Any], int]:
                 "data": None
             }, 400
 
-        transaction_id = queue_manager.add_task(model, message, session_id, files)
+        invalid = unsupported_model(model)
+        if invalid:
+            return invalid, 400
+        unavailable = unavailable_model(model)
+        if unavailable:
+            return unavailable
+
+        try:
+            deadline = Deadline.after(resolve_timeout(
+                model,
+                request.headers.get(DEADLINE_HEADER),
+                data.get(DEADLINE_FIELD),
+                default=config_manager.get('QUEUE_TASK_TIMEOUT_SECONDS')
+            ))
+        except ValueError as e:
+            return {
+                "status": False,
+                "message": str(e),
+                "data": None
+            }, 400
+
+        files = []
+        if accepts_attachments(model):
+            try:
+                files = blob_store.put_many_base64(files_data)
+            except ValueError as e:
+                return {
+                    "status": False,
+                    "message": f"Invalid file data: {str(e)}",
+                    "data": None
+                }, 400
+
+        try:
+            transaction_id = queue_manager.add_task(model, message, session_id, files, deadline)
+        except Exception:
+            blob_store.release_many(files)
+            raise
         
         return {
             "status": True,
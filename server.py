@@ -0,0 +1,108 @@
+"""
+Production server entry point.
+
+Runs the app under gunicorn with the application preloaded in the master
+process. Importing the app starts no threads, so preloading is fork-safe:
+each worker starts its own background services (config reload, session
+cleanup and snapshots, queue worker) after fork and stops them on exit.
+
+Run with:
+    python -m server --workers 4 --bind 0.0.0.0:5000
+    python -m server --workers 4 --asgi
+
+This is its own entry point rather than `python -m app serve`: running
+app.py as __main__ and then importing `app` for the workers would build the
+application twice.
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import logging
+from utils.config_manager import config_manager
+from utils.lifecycle import lifecycle
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m server", description="Run the API with preforked workers")
+    parser.add_argument("--workers", type=int, default=2, help="Number of worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="Threads per worker (WSGI mode only)")
+    parser.add_argument("--bind", default=None, help="HOST:PORT to listen on (default: HOST and PORT settings)")
+    parser.add_argument("--timeout", type=int, default=300, help="Seconds before a silent worker is restarted")
+    parser.add_argument("--asgi", action="store_true", help="Serve asgi:app with uvicorn workers")
+    return parser
+
+class _WorkerSlots:
+    """
+    Stable small integers for worker processes.
+
+    A replacement worker takes over the slot of the one it replaces, so
+    per-worker files such as session snapshots survive worker restarts.
+    """
+
+    def __init__(self):
+        self._assigned: Dict[int, int] = {}
+
+    def pre_fork(self, server: Any, worker: Any) -> None:
+        used = set(self._assigned.values())
+        slot = next(i for i in range(len(used) + 1) if i not in used)
+        worker.freeaiapi_slot = slot
+        self._assigned[id(worker)] = slot
+
+    def child_exit(self, server: Any, worker: Any) -> None:
+        self._assigned.pop(id(worker), None)
+
+def _post_fork(server: Any, worker: Any) -> None:
+    lifecycle.worker_slot = getattr(worker, "freeaiapi_slot", None)
+    lifecycle.start()
+
+def _worker_exit(server: Any, worker: Any) -> None:
+    lifecycle.stop()
+
+def serve(argv: Optional[List[str]] = None) -> None:
+    """Run the preforking production server"""
+    args = build_parser().parse_args(argv)
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("The production server requires gunicorn: pip install gunicorn")
+
+    if args.asgi:
+        try:
+            import uvicorn.workers  # noqa: F401
+        except ImportError:
+            raise SystemExit("ASGI mode requires uvicorn: pip install uvicorn")
+
+    # Import the app before reading settings: it loads .env and sets up logging
+    if args.asgi:
+        from asgi import app
+    else:
+        from app import app
+
+    slots = _WorkerSlots()
+    options = {
+        "bind": args.bind or f"{config_manager.get('HOST')}:{config_manager.get('PORT')}",
+        "workers": args.workers,
+        "timeout": args.timeout,
+        "preload_app": True,
+        "pre_fork": slots.pre_fork,
+        "child_exit": slots.child_exit,
+        "post_fork": _post_fork,
+        "worker_exit": _worker_exit,
+    }
+    if args.asgi:
+        options["worker_class"] = "uvicorn.workers.UvicornWorker"
+    else:
+        options["worker_class"] = "gthread"
+        options["threads"] = args.threads
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    logging.info(f"Starting {args.workers} {'ASGI' if args.asgi else 'WSGI'} workers on {options['bind']}")
+    Application().run()
+
+if __name__ == '__main__':
+    serve()
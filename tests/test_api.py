@@ -144,6 +144,25 @@ class TestAPI:
             print(f"Error in conversation test: {str(e)}")
             return False
 
+    def test_chat_history(self) -> Dict[str, Any]:
+        """Test conversation history endpoint"""
+        if not self.gpt_session_id:
+            return {
+                "status": False,
+                "message": "No session ID available",
+                "data": None
+            }
+
+        endpoint = f"{self.base_url}/chat/history/{self.gpt_session_id}"
+        print("\nTesting Conversation History:")
+
+        response = requests.get(endpoint, params={"offset": 0, "limit": 10}, headers=self.headers)
+        response_data = response.json()
+
+        print(f"Status Code: {response.status_code}")
+        print(f"Response: {json.dumps(response_data, indent=2)}")
+        return response_data
+
     def test_admin_routes(self) -> None:
         """Test admin routes"""
         try:
@@ -251,6 +270,7 @@ class TestAPI:
             ("Grok Basic Chat", self.test_chat_grok),
             ("Grok with Image", self.test_chat_grok_with_image),
             ("Conversation Flow", self.test_conversation),
+            ("Conversation History", self.test_chat_history),
             ("Queue Submit", self.test_queue_submit),
             ("Queue Status", self.test_queue_status),
             ("Admin Routes", self.test_admin_routes)
@@ -0,0 +1,198 @@
+from typing import Dict, Any, List, Optional
+from werkzeug.utils import secure_filename
+import base64
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from utils.config_manager import config_manager
+from utils.lifecycle import lifecycle
+
+# Base64 input is decoded in slices of this many characters (a multiple of 4)
+DECODE_CHUNK_CHARS = 64 * 1024
+
+# What b64decode discards: line breaks of MIME-wrapped input and other junk
+_NON_BASE64 = re.compile(r"[^A-Za-z0-9+/=]")
+
+class BlobStore:
+    """Content-addressed on-disk store for queued attachments"""
+
+    def __init__(self, root_dir: Optional[str] = None):
+        self.base_dir = root_dir or config_manager.get('BLOB_STORE_DIR')
+        self._refcounts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self.stats = {
+            "stored_total": 0,
+            "deduplicated_total": 0,
+            "collected_total": 0
+        }
+
+    @property
+    def root_dir(self) -> str:
+        """
+        Per-process blob directory
+
+        Blobs are only referenced by this process's queue, so each worker
+        process keeps its own directory and never collects another's files.
+        """
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._refcounts.clear()
+                    os.makedirs(os.path.join(self.base_dir, str(pid)), exist_ok=True)
+                    self._pid = pid
+        return os.path.join(self.base_dir, str(pid))
+
+    def start(self) -> None:
+        """Collect blobs left behind by this process's directory and by dead processes"""
+        self.collect_orphans()
+        for name in os.listdir(self.base_dir):
+            path = os.path.join(self.base_dir, name)
+            if not name.isdigit() or int(name) == os.getpid() or _pid_alive(int(name)):
+                continue
+            try:
+                shutil.rmtree(path)
+            except OSError as e:
+                logging.error(f"Failed to remove stale blob directory {path}: {str(e)}")
+
+    def stop(self) -> None:
+        """Nothing to stop; blobs of unfinished tasks are collected on next start"""
+
+    def put_base64(self, data: str, filename: str) -> Dict[str, Any]:
+        """
+        Decode base64 data into the store and take a reference on it
+
+        Args:
+            data: Base64 encoded file content
+            filename: Original filename, used for the stored suffix
+        Returns:
+            Blob reference dict with blob_id, filename and size
+        """
+        suffix = os.path.splitext(secure_filename(filename))[1]
+        digest = hashlib.sha256()
+        size = 0
+
+        root_dir = self.root_dir
+        fd, temp_path = tempfile.mkstemp(dir=root_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                # Characters past the last full quantum carry over to the next slice
+                pending = ""
+                for start in range(0, len(data), DECODE_CHUNK_CHARS):
+                    pending += _NON_BASE64.sub("", data[start:start + DECODE_CHUNK_CHARS])
+                    usable = len(pending) - len(pending) % 4
+                    chunk = base64.b64decode(pending[:usable])
+                    pending = pending[usable:]
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+                if pending:
+                    # Raises for truncated input, like decoding it whole would
+                    base64.b64decode(pending)
+
+            blob_id = digest.hexdigest() + suffix
+            final_path = self.path_for(blob_id)
+            with self._lock:
+                if os.path.exists(final_path):
+                    os.unlink(temp_path)
+                    self.stats["deduplicated_total"] += 1
+                else:
+                    os.replace(temp_path, final_path)
+                    self.stats["stored_total"] += 1
+                self._refcounts[blob_id] = self._refcounts.get(blob_id, 0) + 1
+        except Exception:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        return {
+            "blob_id": blob_id,
+            "filename": secure_filename(filename),
+            "size": size
+        }
+
+    def put_many_base64(self, files_data: list) -> List[Dict[str, Any]]:
+        """Store a list of {filename, base64} dicts, releasing everything on failure"""
+        refs = []
+        try:
+            for file_data in files_data or []:
+                if file_data.get('base64') and file_data.get('filename'):
+                    refs.append(self.put_base64(file_data['base64'], file_data['filename']))
+        except Exception:
+            self.release_many(refs)
+            raise
+        return refs
+
+    def path_for(self, blob_id: str) -> str:
+        """Return the on-disk path of a blob"""
+        if os.path.basename(blob_id) != blob_id:
+            raise ValueError(f"Invalid blob id: {blob_id}")
+        return os.path.join(self.root_dir, blob_id)
+
+    def release(self, blob_id: str) -> None:
+        """Drop one reference and delete the blob once unreferenced"""
+        # Resolved first: root_dir takes the lock itself after a fork
+        path = self.path_for(blob_id)
+        with self._lock:
+            count = self._refcounts.get(blob_id, 0) - 1
+            if count > 0:
+                self._refcounts[blob_id] = count
+                return
+            self._refcounts.pop(blob_id, None)
+            try:
+                os.unlink(path)
+                self.stats["collected_total"] += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.error(f"Failed to delete blob {blob_id}: {str(e)}")
+
+    def release_many(self, refs: List[Dict[str, Any]]) -> None:
+        """Release every reference in a list of blob refs"""
+        for ref in refs or []:
+            self.release(ref["blob_id"])
+
+    def collect_orphans(self) -> int:
+        """Delete blobs and partial writes with no live reference"""
+        removed = 0
+        root_dir = self.root_dir
+        with self._lock:
+            for name in os.listdir(root_dir):
+                if name in self._refcounts:
+                    continue
+                try:
+                    os.unlink(os.path.join(root_dir, name))
+                    removed += 1
+                except OSError:
+                    pass
+            self.stats["collected_total"] += removed
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get blob store statistics"""
+        with self._lock:
+            return {
+                **self.stats,
+                "live_blobs": len(self._refcounts),
+                "live_references": sum(self._refcounts.values())
+            }
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process with this id exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+blob_store = BlobStore()
+lifecycle.register("blobs", blob_store.start, blob_store.stop)
@@ -0,0 +1,219 @@
+from typing import Dict, Any, Optional, List
+from collections import deque
+import logging
+import threading
+import time
+from utils.config_manager import config_manager
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is temporarily unavailable after repeated upstream failures")
+        self.name = name
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Circuit breaker fed by the outcome and latency of upstream calls.
+
+    Closed: calls pass through; outcomes within the last window_seconds are
+    kept. Once at least min_calls were seen and the share of failures (calls
+    slower than slow_call_seconds count as failures) reaches failure_rate,
+    the circuit opens.
+    Open: calls fail immediately with CircuitOpenError for open_seconds.
+    Half-open: up to half_open_probes calls are let through; if all of them
+    succeed the circuit closes, any failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_rate: float, min_calls: int, window_seconds: float,
+                 open_seconds: float, half_open_probes: int, slow_call_seconds: Optional[float] = None):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.slow_call_seconds = slow_call_seconds
+        self.state = CLOSED
+        self._outcomes: deque = deque()  # (monotonic time, failed)
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls_total": 0,
+            "failures_total": 0,
+            "slow_calls_total": 0,
+            "rejected_total": 0,
+            "opened_total": 0
+        }
+
+    def acquire(self) -> None:
+        """
+        Ask permission for one call; every successful acquire must be
+        followed by record() or cancel()
+
+        Raises:
+            CircuitOpenError: While the circuit is open or all probes are taken
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                remaining = self._opened_at + self.open_seconds - now
+                if remaining > 0:
+                    self.stats["rejected_total"] += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self._transition(HALF_OPEN)
+
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight + self._probe_successes >= self.half_open_probes:
+                    self.stats["rejected_total"] += 1
+                    raise CircuitOpenError(self.name, 1.0)
+                self._probes_in_flight += 1
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets calls through again (0 if it does now)"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(self._opened_at + self.open_seconds - time.monotonic(), 0.0)
+
+    def cancel(self) -> None:
+        """Give back an acquired call that never reached the upstream"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes_in_flight:
+                self._probes_in_flight -= 1
+
+    def record(self, failed: bool, latency: Optional[float] = None) -> None:
+        """Record the outcome of an acquired call"""
+        slow = (latency is not None and self.slow_call_seconds is not None
+                and latency > self.slow_call_seconds)
+        failed = failed or slow
+        with self._lock:
+            self.stats["calls_total"] += 1
+            self.stats["failures_total"] += failed
+            self.stats["slow_calls_total"] += slow
+
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if failed:
+                    self._transition(OPEN)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self._transition(CLOSED)
+                return
+
+            if self.state == OPEN:
+                return
+
+            now = time.monotonic()
+            self._outcomes.append((now, failed))
+            self._prune(now)
+            calls = len(self._outcomes)
+            failures = sum(1 for _, f in self._outcomes if f)
+            if calls >= self.min_calls and failures / calls >= self.failure_rate:
+                self._transition(OPEN)
+
+    def reset(self) -> None:
+        """Close the circuit and forget recent outcomes"""
+        with self._lock:
+            self._transition(CLOSED)
+
+    def _prune(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        logging.warning(f"Circuit {self.name}: {self.state} -> {state}")
+        self.state = state
+        self._outcomes.clear()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.stats["opened_total"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Current state and counters"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now >= self._opened_at + self.open_seconds:
+                state, retry_after = HALF_OPEN, 0.0
+            else:
+                state = self.state
+                retry_after = max(self._opened_at + self.open_seconds - now, 0.0) if state == OPEN else 0.0
+            self._prune(now)
+            return {
+                **self.stats,
+                "state": state,
+                "retry_after": round(retry_after, 3),
+                "window_calls": len(self._outcomes),
+                "window_failures": sum(1 for _, f in self._outcomes if f)
+            }
+
+class BreakerRegistry:
+    """Circuit breakers by name, created with the configured thresholds on first use"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, slow_call_seconds: Optional[float] = None) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(name)
+                if breaker is None:
+                    breaker = CircuitBreaker(
+                        name,
+                        failure_rate=config_manager.get('CIRCUIT_FAILURE_RATE'),
+                        min_calls=config_manager.get('CIRCUIT_MIN_CALLS'),
+                        window_seconds=config_manager.get('CIRCUIT_WINDOW_SECONDS'),
+                        open_seconds=config_manager.get('CIRCUIT_OPEN_SECONDS'),
+                        half_open_probes=config_manager.get('CIRCUIT_HALF_OPEN_PROBES'),
+                        slow_call_seconds=slow_call_seconds
+                    )
+                    self._breakers[name] = breaker
+        return breaker
+
+    def retry_after(self, name: str) -> float:
+        """retry_after() of a breaker, 0 if it was never created"""
+        breaker = self._breakers.get(name)
+        return breaker.retry_after() if breaker else 0.0
+
+    def acquire_all(self, breakers: List[CircuitBreaker]) -> None:
+        """Acquire several breakers, giving back the ones already taken if one is open"""
+        acquired = []
+        try:
+            for breaker in breakers:
+                breaker.acquire()
+                acquired.append(breaker)
+        except CircuitOpenError:
+            for breaker in acquired:
+                breaker.cancel()
+            raise
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Stats of every breaker created so far"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.get_stats() for breaker in breakers}
+
+    def reset(self, name: Optional[str] = None) -> int:
+        """Close one breaker, or all of them; returns how many were reset"""
+        with self._lock:
+            breakers = [self._breakers[name]] if name in self._breakers else (
+                [] if name else list(self._breakers.values()))
+        for breaker in breakers:
+            breaker.reset()
+        return len(breakers)
+
+breakers = BreakerRegistry()
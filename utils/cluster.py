@@ -0,0 +1,135 @@
+from typing import Dict, Optional, List, Set, Tuple
+from bisect import bisect
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+import hashlib
+import logging
+import socket
+import threading
+import uuid
+import requests
+from utils.config_manager import config_manager
+
+NODE_TAG_SEPARATOR = "."
+FORWARDED_HEADER = "X-Forwarded-Node"
+VIRTUAL_NODES = 64
+
+class HashRing:
+    """Consistent hash ring used to place ids that carry no usable node tag"""
+
+    def __init__(self, nodes: List[str], virtual_nodes: int = VIRTUAL_NODES):
+        self._ring: List[Tuple[int, str]] = sorted(
+            (self._hash(f"{node}#{i}"), node)
+            for node in nodes
+            for i in range(virtual_nodes)
+        )
+        self._keys = [key for key, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def get(self, key: str) -> Optional[str]:
+        """Node responsible for a key"""
+        if not self._ring:
+            return None
+        index = bisect(self._keys, self._hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+class Cluster:
+    """
+    Node identity, id tagging and request forwarding for multi-node deployments.
+
+    Ids minted here are prefixed with NODE_ID so a load balancer (or the
+    forwarding middleware) can send follow-up requests to the node holding
+    the live client. Ids whose tag names no configured node fall back to the
+    consistent hash ring.
+    """
+
+    def __init__(self):
+        self.node_id = config_manager.get('NODE_ID')
+        self.nodes = self._parse_nodes(config_manager.get('CLUSTER_NODES'))
+        self.ring = HashRing(sorted(self.nodes))
+        self._http = None
+        self._http_lock = threading.Lock()
+        self._peer_addresses: Optional[Set[str]] = None
+
+    @staticmethod
+    def _parse_nodes(value: str) -> Dict[str, str]:
+        """Parse 'name=url,name=url' into a dict"""
+        nodes = {}
+        for entry in (value or "").split(','):
+            if '=' not in entry:
+                continue
+            name, url = entry.split('=', 1)
+            nodes[name.strip()] = url.strip().rstrip('/')
+        return nodes
+
+    def new_id(self) -> str:
+        """Mint a session or transaction id tagged with this node"""
+        raw = str(uuid.uuid4())
+        return f"{self.node_id}{NODE_TAG_SEPARATOR}{raw}" if self.node_id else raw
+
+    def owner_of(self, resource_id: str) -> Optional[str]:
+        """Node that owns an id, or None when clustering is not configured"""
+        if not self.nodes or not resource_id:
+            return None
+        tag = resource_id.split(NODE_TAG_SEPARATOR, 1)[0] if NODE_TAG_SEPARATOR in resource_id else None
+        if tag in self.nodes:
+            return tag
+        return self.ring.get(resource_id)
+
+    def is_peer(self, address: Optional[str]) -> bool:
+        """Whether a remote address belongs to one of the CLUSTER_NODES"""
+        if not address or not self.nodes:
+            return False
+        if self._peer_addresses is None:
+            addresses = set()
+            for url in self.nodes.values():
+                host = urlparse(url).hostname
+                try:
+                    addresses.update(info[4][0] for info in socket.getaddrinfo(host, None))
+                except (OSError, UnicodeError) as e:
+                    logging.warning(f"Failed to resolve cluster node {url}: {str(e)}")
+            self._peer_addresses = addresses
+        return address in self._peer_addresses
+
+    def is_local(self, resource_id: str) -> bool:
+        """
+        Whether this node should serve requests for an id
+
+        A node without NODE_ID mints untagged ids, so it keeps untagged ids
+        rather than hashing its own sessions away to peers.
+        """
+        if not self.node_id and resource_id and NODE_TAG_SEPARATOR not in resource_id:
+            return True
+        owner = self.owner_of(resource_id)
+        return owner is None or owner == self.node_id
+
+    def _session(self) -> requests.Session:
+        """Shared keep-alive HTTP session for forwarded requests"""
+        if self._http is None:
+            with self._http_lock:
+                if self._http is None:
+                    http = requests.Session()
+                    pool_size = config_manager.get('CLUSTER_FORWARD_POOL_SIZE')
+                    adapter = HTTPAdapter(pool_connections=max(len(self.nodes), 1), pool_maxsize=pool_size)
+                    http.mount("http://", adapter)
+                    http.mount("https://", adapter)
+                    self._http = http
+        return self._http
+
+    def forward(self, owner: str, method: str, path: str, headers: Dict[str, str],
+                body: bytes) -> requests.Response:
+        """Replay a request on the owning node"""
+        headers = dict(headers)
+        headers[FORWARDED_HEADER] = self.node_id or ""
+        return self._session().request(
+            method,
+            self.nodes[owner] + path,
+            headers=headers,
+            data=body,
+            timeout=(5, config_manager.get('CLUSTER_FORWARD_TIMEOUT_SECONDS'))
+        )
+
+cluster = Cluster()
@@ -1,9 +1,18 @@
-from typing import Set, Any, Dict
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+from types import MappingProxyType
 from dotenv import load_dotenv
+import hashlib
+import json
 import os
 import threading
 import time
 import ipaddress
+import re
+import tempfile
+from utils.lifecycle import lifecycle
+from utils.network_set import NetworkSet
+
+LOG_LEVEL_NAMES = ('debug', 'info', 'warning', 'error', 'critical')
 
 class ConfigManager:
     _instance = None
@@ -20,69 +29,319 @@ class ConfigManager:
         if not hasattr(self, 'initialized'):
             self.initialized = True
             self.last_load_time = 0
-            self.config: Dict[str, Any] = {}
+            self.generation = 0
+            self.config: Mapping[str, Any] = MappingProxyType({})
+            self._reload_lock = threading.RLock()
+            self._subscribers: List[Tuple[Optional[FrozenSet[str]], Callable[[Mapping, Mapping], None]]] = []
+            self._stop_event = threading.Event()
             self.load_config()
-            
-            if self.get_bool('RELOAD_ENV'):
-                self._start_reload_thread()
-
-    def load_config(self) -> None:
-        """Load or reload configuration from .env file"""
-        load_dotenv(override=True)
-        
-        self.config = {
+
+    def load_config(self) -> List[str]:
+        """
+        Load or reload configuration from .env file
+
+        The new settings are built completely and then swapped in as one
+        read-only snapshot, so readers see either the old or the new config,
+        never a mix. Subscribers of changed keys are notified afterwards.
+
+        Returns:
+            Names of the settings that changed
+        """
+        with self._reload_lock:
+            load_dotenv(override=True)
+            config = self._read_config()
+            old = self.config
+            self.config = MappingProxyType(config)
+            self.generation += 1
+            self.last_load_time = time.time()
+            changed = [key for key in config if key not in old or old[key] != config[key]]
+            if old:
+                self._notify(old, self.config, changed)
+        return changed
+
+    def _read_config(self) -> Dict[str, Any]:
+        config = {
             'HOST': os.getenv('HOST', '0.0.0.0'),
             'PORT': int(os.getenv('PORT', '5000')),
             'DEBUG': os.getenv('DEBUG', 'false').lower() == 'true',
             'RELOAD_ENV': os.getenv('RELOAD_ENV', 'true').lower() == 'true',
+            'CONFIG_WATCH_SECONDS': float(os.getenv('CONFIG_WATCH_SECONDS', '1')),
             'AUTH_TOKEN': os.getenv('AUTH_TOKEN'),
+            'API_TOKENS_FILE': os.getenv('API_TOKENS_FILE', ''),
+            'RATE_LIMIT_ENABLED': os.getenv('RATE_LIMIT_ENABLED', 'false').lower() == 'true',
+            'RATE_LIMIT_PER_MINUTE': float(os.getenv('RATE_LIMIT_PER_MINUTE', '60')),
+            'RATE_LIMIT_BURST': float(os.getenv('RATE_LIMIT_BURST', '10')),
+            'RATE_LIMIT_CONCURRENCY': int(os.getenv('RATE_LIMIT_CONCURRENCY', '4')),
+            'RATE_LIMIT_IP_PER_MINUTE': float(os.getenv('RATE_LIMIT_IP_PER_MINUTE', '120')),
+            'RATE_LIMIT_IP_BURST': float(os.getenv('RATE_LIMIT_IP_BURST', '20')),
+            'RATE_LIMIT_SHARED': os.getenv('RATE_LIMIT_SHARED', 'false').lower() == 'true',
             'ALLOWED_IPS': self._parse_allowed_ips(),
             'LOCAL_ONLY': os.getenv('LOCAL_ONLY', 'true').lower() == 'true',
             'MAX_SESSIONS': int(os.getenv('MAX_SESSIONS', '100')),
             'SESSION_TIMEOUT_MINUTES': int(os.getenv('SESSION_TIMEOUT_MINUTES', '30')),
             'CLEANUP_INTERVAL_MINUTES': int(os.getenv('CLEANUP_INTERVAL_MINUTES', '5')),
+            'SESSION_OVERFLOW_POLICY': self._parse_choice('SESSION_OVERFLOW_POLICY', 'reject', ('reject', 'evict', 'wait')),
+            'SESSION_OVERFLOW_WAIT_SECONDS': float(os.getenv('SESSION_OVERFLOW_WAIT_SECONDS', '10')),
+            'SESSION_OVERFLOW_RETRY_AFTER_SECONDS': int(os.getenv('SESSION_OVERFLOW_RETRY_AFTER_SECONDS', '5')),
+            'NODE_ID': self._parse_node_id(),
+            'CLUSTER_NODES': os.getenv('CLUSTER_NODES', ''),
+            'CLUSTER_FORWARDING': os.getenv('CLUSTER_FORWARDING', 'false').lower() == 'true',
+            'CLUSTER_FORWARD_TIMEOUT_SECONDS': float(os.getenv('CLUSTER_FORWARD_TIMEOUT_SECONDS', '180')),
+            'CLUSTER_FORWARD_POOL_SIZE': int(os.getenv('CLUSTER_FORWARD_POOL_SIZE', '20')),
+            'SESSION_STORE': self._parse_choice('SESSION_STORE', 'memory', ('memory', 'sqlite', 'redis')),
+            'SESSION_STORE_PATH': os.getenv('SESSION_STORE_PATH', os.path.join(tempfile.gettempdir(), 'freeaiapi-sessions.db')),
+            'SESSION_STORE_URL': os.getenv('SESSION_STORE_URL', 'redis://127.0.0.1:6379/0'),
+            'SESSION_STORE_SYNC_SECONDS': float(os.getenv('SESSION_STORE_SYNC_SECONDS', '5')),
+            'SESSION_SNAPSHOT_PATH': os.getenv('SESSION_SNAPSHOT_PATH', os.path.join(tempfile.gettempdir(), 'freeaiapi-sessions.jsonl')),
+            'SESSION_SNAPSHOT_INTERVAL_SECONDS': float(os.getenv('SESSION_SNAPSHOT_INTERVAL_SECONDS', '30')),
+            'HISTORY_MAX_TURNS': int(os.getenv('HISTORY_MAX_TURNS', '20')),
+            'HISTORY_MAX_BYTES': int(os.getenv('HISTORY_MAX_BYTES', '262144')),
+            'HISTORY_DIR': os.getenv('HISTORY_DIR', os.path.join(tempfile.gettempdir(), 'freeaiapi-history')),
+            'BROWSER_EXECUTOR_WORKERS': int(os.getenv('BROWSER_EXECUTOR_WORKERS', '4')),
+            'ENABLED_BACKENDS': self._parse_list('ENABLED_BACKENDS'),
+            'CIRCUIT_BREAKER_ENABLED': os.getenv('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true',
+            'CIRCUIT_FAILURE_RATE': float(os.getenv('CIRCUIT_FAILURE_RATE', '0.5')),
+            'CIRCUIT_MIN_CALLS': int(os.getenv('CIRCUIT_MIN_CALLS', '5')),
+            'CIRCUIT_WINDOW_SECONDS': float(os.getenv('CIRCUIT_WINDOW_SECONDS', '60')),
+            'CIRCUIT_OPEN_SECONDS': float(os.getenv('CIRCUIT_OPEN_SECONDS', '30')),
+            'CIRCUIT_HALF_OPEN_PROBES': int(os.getenv('CIRCUIT_HALF_OPEN_PROBES', '2')),
+            'CIRCUIT_SLOW_CALL_SECONDS': self._parse_timeouts('CIRCUIT_SLOW_CALL_SECONDS', 'grok=60,gpt=150'),
+            'REQUEST_TIMEOUTS': self._parse_timeouts('REQUEST_TIMEOUTS', 'grok=120,gpt=180'),
+            'REQUEST_TIMEOUT_DEFAULT_SECONDS': float(os.getenv('REQUEST_TIMEOUT_DEFAULT_SECONDS', '120')),
+            'REQUEST_TIMEOUT_MAX_SECONDS': float(os.getenv('REQUEST_TIMEOUT_MAX_SECONDS', '600')),
+            'HEDGE_MODELS': self._parse_list('HEDGE_MODELS', 'grok,gpt'),
+            'HEDGE_DELAY_SECONDS': float(os.getenv('HEDGE_DELAY_SECONDS', '3')),
+            'BATCH_MAX_ITEMS': int(os.getenv('BATCH_MAX_ITEMS', '50')),
+            'BATCH_MAX_CONCURRENCY': int(os.getenv('BATCH_MAX_CONCURRENCY', '4')),
+            'QUEUE_WORKERS': int(os.getenv('QUEUE_WORKERS', '1')),
+            'QUEUE_TASK_TIMEOUT_SECONDS': float(os.getenv('QUEUE_TASK_TIMEOUT_SECONDS', '3600')),
+            'QUEUE_MAX_ATTEMPTS': int(os.getenv('QUEUE_MAX_ATTEMPTS', '3')),
+            'QUEUE_RETRY_BASE_SECONDS': float(os.getenv('QUEUE_RETRY_BASE_SECONDS', '1')),
+            'QUEUE_RETRY_MAX_SECONDS': float(os.getenv('QUEUE_RETRY_MAX_SECONDS', '30')),
+            'BLOB_STORE_DIR': os.getenv('BLOB_STORE_DIR', os.path.join(tempfile.gettempdir(), 'freeaiapi-blobs')),
+            'SERVER_TIMING_ENABLED': os.getenv('SERVER_TIMING_ENABLED', 'true').lower() == 'true',
+            'TRACE_FILE': os.getenv('TRACE_FILE', ''),
+            'TRACE_SAMPLE_RATE': float(os.getenv('TRACE_SAMPLE_RATE', '0.01')),
+            'PROFILE_MAX_SECONDS': float(os.getenv('PROFILE_MAX_SECONDS', '120')),
+            'LOG_LEVEL': self._parse_choice('LOG_LEVEL', 'info', LOG_LEVEL_NAMES).upper(),
+            'LOG_LEVELS': self._parse_log_levels('LOG_LEVELS', ''),
+            'LOG_FORMAT': self._parse_choice('LOG_FORMAT', 'text', ('text', 'json')),
+            'LOG_FILE': os.getenv('LOG_FILE', ''),
+            'LOG_ROTATION': self._parse_choice('LOG_ROTATION', 'size', ('size', 'time')),
+            'LOG_MAX_BYTES': int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+            'LOG_ROTATE_WHEN': os.getenv('LOG_ROTATE_WHEN', 'midnight'),
+            'LOG_BACKUP_COUNT': int(os.getenv('LOG_BACKUP_COUNT', '5')),
+            'LOG_QUEUE_SIZE': int(os.getenv('LOG_QUEUE_SIZE', '10000')),
             # Model specific configs
             'GROK_BEARER_TOKEN': os.getenv('GROK_BEARER_TOKEN'),
             'GROK_CSRF_TOKEN': os.getenv('GROK_CSRF_TOKEN'),
             'GROK_COOKIES': os.getenv('GROK_COOKIES'),
+            'GROK_ACCOUNTS_FILE': os.getenv('GROK_ACCOUNTS_FILE', ''),
+            'GROK_ACCOUNT_RATE_PER_MINUTE': float(os.getenv('GROK_ACCOUNT_RATE_PER_MINUTE', '60')),
+            'GROK_ACCOUNT_BURST': float(os.getenv('GROK_ACCOUNT_BURST', '10')),
+            'GROK_ACCOUNT_PAUSE_SECONDS': float(os.getenv('GROK_ACCOUNT_PAUSE_SECONDS', '60')),
+            'GROK_UPLOAD_REUSE_SECONDS': float(os.getenv('GROK_UPLOAD_REUSE_SECONDS', '600')),
         }
-        self.last_load_time = time.time()
+        config['API_TOKENS'] = self._parse_api_tokens(config)
+        return config
 
-    def _parse_allowed_ips(self) -> Set[str]:
-        """Parse allowed IPs from environment"""
-        allowed_ips = set()
+    def _parse_allowed_ips(self) -> NetworkSet:
+        """Parse allowed addresses and CIDR ranges from environment"""
+        allowed_ips = NetworkSet()
         ips = os.getenv('ALLOWED_IPS', '127.0.0.1,::1').split(',')
-        
+
         for ip in ips:
             ip = ip.strip()
             try:
-                ipaddress.ip_address(ip)
-                allowed_ips.add(ip)
+                allowed_ips.add(ipaddress.ip_network(ip, strict=False))
             except ValueError:
                 print(f"Invalid IP address in config: {ip}")
-                
+
         return allowed_ips
 
-    def _start_reload_thread(self) -> None:
-        """Start thread for periodic config reloading"""
-        def reload_loop():
-            while True:
-                time.sleep(60)
+    def _parse_api_tokens(self, config: Dict[str, Any]) -> Dict[bytes, Dict[str, Any]]:
+        """
+        Map the digest (see token_digest) of every accepted API token to its
+        client: name and limits
+
+        AUTH_TOKEN is the client 'default', the operator, which is always an
+        admin. API_TOKENS_FILE adds named clients, a JSON list of objects with
+        name, token and optionally rate_per_minute, burst, max_concurrent and
+        admin; RATE_LIMIT_* fill the gaps and clients are not admins unless
+        they say so.
+        """
+        entries = []
+        if config['AUTH_TOKEN']:
+            entries.append({"name": "default", "token": config['AUTH_TOKEN'], "admin": True})
+        path = config['API_TOKENS_FILE']
+        if path:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entries.extend(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Error reading API_TOKENS_FILE {path}: {e}")
+
+        tokens = {}
+        for entry in entries:
+            if not isinstance(entry, dict) or not entry.get('name') or not entry.get('token'):
+                print("Invalid API token entry in config (needs name and token)")
+                continue
+            tokens[token_digest(str(entry['token']))] = {
+                'name': str(entry['name']),
+                'rate_per_minute': float(entry.get('rate_per_minute') or config['RATE_LIMIT_PER_MINUTE']),
+                'burst': float(entry.get('burst') or config['RATE_LIMIT_BURST']),
+                'max_concurrent': int(entry.get('max_concurrent') or config['RATE_LIMIT_CONCURRENCY']),
+                'admin': entry.get('admin') is True
+            }
+        return tokens
+
+    def _parse_node_id(self) -> str:
+        """Parse NODE_ID, which prefixes ids and so may not contain dots"""
+        node_id = os.getenv('NODE_ID', '').strip()
+        if node_id and not re.fullmatch(r"[A-Za-z0-9_-]+", node_id):
+            print(f"Invalid NODE_ID in config: {node_id}")
+            return ''
+        return node_id
+
+    def _parse_list(self, key: str, default: str = '') -> List[str]:
+        """Parse a comma separated setting into a list of lowercase names"""
+        return [item.strip().lower() for item in os.getenv(key, default).split(',') if item.strip()]
+
+    def _parse_timeouts(self, key: str, default: str) -> Dict[str, float]:
+        """Parse 'model=seconds,model=seconds' into a dict"""
+        timeouts = {}
+        for entry in os.getenv(key, default).split(','):
+            if '=' not in entry:
+                continue
+            model, seconds = entry.split('=', 1)
+            try:
+                timeouts[model.strip().lower()] = float(seconds)
+            except ValueError:
+                print(f"Invalid timeout in {key}: {entry}")
+        return timeouts
+
+    def _parse_log_levels(self, key: str, default: str) -> Dict[str, str]:
+        """Parse 'logger=level,logger=level' into a dict of logger names to level names"""
+        levels = {}
+        for entry in os.getenv(key, default).split(','):
+            if '=' not in entry:
+                continue
+            name, level = (part.strip() for part in entry.split('=', 1))
+            if level.lower() not in LOG_LEVEL_NAMES:
+                print(f"Invalid log level in {key}: {entry}")
+                continue
+            levels[name] = level.upper()
+        return levels
+
+    def _parse_choice(self, key: str, default: str, choices: tuple) -> str:
+        """Parse an enumerated setting, falling back to the default"""
+        value = os.getenv(key, default).strip().lower()
+        if value not in choices:
+            print(f"Invalid value for {key} in config: {value}")
+            return default
+        return value
+
+    def subscribe(self, callback: Callable[[Mapping, Mapping], None],
+                  keys: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """
+        Call callback(old, new) after a reload that changed any of keys
+
+        Args:
+            callback: Receives the previous and the new config snapshot
+            keys: Settings to watch; None for any change
+        Returns:
+            Function that removes the subscription
+        """
+        entry = (frozenset(keys) if keys is not None else None, callback)
+        with self._reload_lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe() -> None:
+            with self._reload_lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+    def _notify(self, old: Mapping, new: Mapping, changed: List[str]) -> None:
+        """Run subscribers interested in the changed keys. Caller holds _reload_lock"""
+        if not changed:
+            return
+        for keys, callback in list(self._subscribers):
+            if keys is None or keys.intersection(changed):
+                try:
+                    callback(old, new)
+                except Exception as e:
+                    print(f"Error applying config change: {e}")
+
+    def start(self) -> None:
+        """Watch .env and reload when it changes, if RELOAD_ENV is set"""
+        if not self.get_bool('RELOAD_ENV'):
+            return
+        self._stop_event.clear()
+
+        def watch_loop():
+            last_mtime = self._env_mtime()
+            while not self._stop_event.wait(self.get_float('CONFIG_WATCH_SECONDS', 1.0)):
+                mtime = self._env_mtime()
+                if mtime == last_mtime:
+                    continue
+                last_mtime = mtime
                 try:
-                    if os.path.getmtime('.env') > self.last_load_time:
-                        self.load_config()
+                    changed = self.load_config()
+                    if changed:
+                        print(f"Config reloaded, changed: {', '.join(changed)}")
                 except Exception as e:
                     print(f"Error reloading config: {e}")
 
-        thread = threading.Thread(target=reload_loop, daemon=True)
+        thread = threading.Thread(target=watch_loop, name="config-watch", daemon=True)
         thread.start()
 
+    def stop(self) -> None:
+        """Stop the watch thread"""
+        self._stop_event.set()
+
+    @staticmethod
+    def _env_mtime() -> Optional[float]:
+        try:
+            return os.stat('.env').st_mtime
+        except OSError:
+            return None
+
     def get(self, key: str, default: Any = None) -> Any:
         """Get config value by key"""
         return self.config.get(key, default)
 
     def get_bool(self, key: str) -> bool:
         """Get boolean config value"""
-        return self.config.get(key, False)
+        return bool(self.config.get(key, False))
+
+    def get_int(self, key: str, default: int = 0) -> int:
+        """Get integer config value, or default if missing or not a number"""
+        try:
+            return int(self.config[key])
+        except (KeyError, TypeError, ValueError):
+            return default
+
+    def get_float(self, key: str, default: float = 0.0) -> float:
+        """Get float config value, or default if missing or not a number"""
+        try:
+            return float(self.config[key])
+        except (KeyError, TypeError, ValueError):
+            return default
+
+    def get_str(self, key: str, default: str = '') -> str:
+        """Get string config value, or default if missing"""
+        value = self.config.get(key)
+        return default if value is None else str(value)
+
+def token_digest(token: str) -> bytes:
+    """
+    SHA-256 of an API token
+
+    Tokens are looked up by digest, so the time a lookup takes depends on
+    the digest and reveals nothing about how much of a token was right.
+    """
+    return hashlib.sha256(token.encode('utf-8')).digest()
 
 config_manager = ConfigManager()
+lifecycle.register("config", config_manager.start, config_manager.stop)
@@ -0,0 +1,144 @@
+from typing import Dict, Any, List, Optional
+from collections import deque
+from itertools import islice
+import json
+import logging
+import os
+import threading
+from utils.config_manager import config_manager
+
+class ConversationHistory:
+    """
+    Per-session message history with a bounded in-memory tail.
+
+    The newest messages stay in memory up to HISTORY_MAX_TURNS messages or
+    HISTORY_MAX_BYTES of content, whichever is hit first. Older messages are
+    appended to a JSONL file in HISTORY_DIR and only read back when a caller
+    pages through them. Spill files are named after the process that wrote
+    them, since a process adopting another's session keeps its own history
+    of it; a restored snapshot reattaches the file it recorded.
+    """
+
+    def __init__(self, session_id: str, max_turns: Optional[int] = None,
+                 max_bytes: Optional[int] = None, spill_dir: Optional[str] = None,
+                 spill_file: Optional[str] = None):
+        self.session_id = session_id
+        self.max_turns = max_turns or config_manager.get('HISTORY_MAX_TURNS')
+        self.max_bytes = max_bytes or config_manager.get('HISTORY_MAX_BYTES')
+        self.spill_dir = spill_dir or config_manager.get('HISTORY_DIR')
+        self.spill_file = spill_file or f"{session_id}.{os.getpid()}.jsonl"
+        self._recent: deque = deque()
+        self._recent_bytes = 0
+        self._spilled_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def spill_path(self) -> str:
+        """Path of this session's append-only spill file"""
+        return os.path.join(self.spill_dir, os.path.basename(self.spill_file))
+
+    def append(self, message: Dict[str, Any]) -> None:
+        """Add a message, spilling the oldest ones to disk when over budget"""
+        size = len(message.get("content") or "")
+        with self._lock:
+            self._recent.append((message, size))
+            self._recent_bytes += size
+            self._spill_overflow()
+
+    def _spill_overflow(self) -> None:
+        """Move messages beyond the in-memory budget to the spill file"""
+        spill = []
+        while len(self._recent) > 1 and (
+            len(self._recent) > self.max_turns or self._recent_bytes > self.max_bytes
+        ):
+            message, size = self._recent.popleft()
+            self._recent_bytes -= size
+            spill.append(message)
+
+        if not spill:
+            return
+
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(message, default=str) + "\n" for message in spill))
+        except OSError as e:
+            # The messages are lost; counting them would shift every later page
+            logging.error(f"Failed to spill history for session {self.session_id}: {str(e)}")
+            return
+        self._spilled_count += len(spill)
+
+    def __len__(self) -> int:
+        return self._spilled_count + len(self._recent)
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """Return the in-memory tail of the conversation"""
+        with self._lock:
+            return [message for message, _ in self._recent]
+
+    def page(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Return up to `limit` messages starting at `offset`, oldest first
+
+        Spilled messages are streamed from disk, so only the requested page is
+        materialized.
+        """
+        with self._lock:
+            spilled_count = self._spilled_count
+            recent = [message for message, _ in self._recent]
+
+        messages: List[Dict[str, Any]] = []
+        if offset < spilled_count:
+            try:
+                with open(self.spill_path, "r", encoding="utf-8") as f:
+                    for line in islice(f, offset, min(offset + limit, spilled_count)):
+                        messages.append(json.loads(line))
+            except (OSError, ValueError) as e:
+                logging.error(f"Failed to read history for session {self.session_id}: {str(e)}")
+
+        remaining = limit - len(messages)
+        start = max(offset - spilled_count, 0)
+        if remaining > 0:
+            messages.extend(recent[start:start + remaining])
+        return messages
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        """Serializable state; spilled messages stay in their file"""
+        with self._lock:
+            return {
+                "spill_file": self.spill_file,
+                "spilled_count": self._spilled_count,
+                "recent": [message for message, _ in self._recent]
+            }
+
+    @classmethod
+    def from_snapshot(cls, session_id: str, data: Dict[str, Any]) -> "ConversationHistory":
+        """Rebuild a history from to_snapshot() output, reattaching its spill file"""
+        history = cls(session_id, spill_file=data.get("spill_file"))
+        if os.path.exists(history.spill_path):
+            history._spilled_count = data.get("spilled_count", 0)
+        for message in data.get("recent", []):
+            history._recent.append((message, len(message.get("content") or "")))
+            history._recent_bytes += len(message.get("content") or "")
+        return history
+
+    def clear(self) -> None:
+        """Forget all messages, including the spill file"""
+        with self._lock:
+            self._recent.clear()
+            self._recent_bytes = 0
+            self._spilled_count = 0
+            self._delete_spill_file()
+
+    def delete(self) -> None:
+        """Remove on-disk state when the session goes away"""
+        with self._lock:
+            self._delete_spill_file()
+
+    def _delete_spill_file(self) -> None:
+        try:
+            os.unlink(self.spill_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.error(f"Failed to delete history for session {self.session_id}: {str(e)}")
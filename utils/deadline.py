@@ -0,0 +1,83 @@
+from typing import Any, Optional
+import time
+from utils.config_manager import config_manager
+
+DEADLINE_HEADER = "X-Request-Timeout"
+DEADLINE_FIELD = "timeout"
+
+class DeadlineExceeded(Exception):
+    """Raised when work is abandoned because its deadline has passed"""
+
+class Deadline:
+    """
+    Absolute point in time by which a request must be answered.
+
+    Stored as wall-clock epoch seconds so it can be kept on queued tasks
+    and reported in their status.
+    """
+
+    def __init__(self, expires_at: float):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        """Deadline that many seconds from now"""
+        return cls(time.time() + seconds)
+
+    def remaining(self) -> float:
+        """Seconds left, never negative"""
+        return max(self.expires_at - time.time(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+    def earliest(self, other: Optional["Deadline"]) -> "Deadline":
+        """The sooner of this deadline and another"""
+        if other is None or self.expires_at <= other.expires_at:
+            return self
+        return other
+
+    def cancel(self) -> None:
+        """Expire now, so work bounded by this deadline stops at its next check"""
+        self.expires_at = min(self.expires_at, time.time())
+
+    def check(self) -> None:
+        """Raise DeadlineExceeded if the deadline has passed"""
+        if self.expired:
+            raise DeadlineExceeded("Deadline exceeded")
+
+def model_timeout(model: str) -> float:
+    """Server default time budget for one request to a model"""
+    timeouts = config_manager.get('REQUEST_TIMEOUTS')
+    return timeouts.get(model, config_manager.get('REQUEST_TIMEOUT_DEFAULT_SECONDS'))
+
+def resolve_timeout(model: str, header_value: Any = None, body_value: Any = None,
+                    default: Optional[float] = None) -> float:
+    """
+    Time budget for a request
+
+    A value from the request (header first, then JSON field) wins over the
+    default, capped at REQUEST_TIMEOUT_MAX_SECONDS.
+
+    Args:
+        model: Model the request targets
+        header_value: Raw X-Request-Timeout header value
+        body_value: Raw 'timeout' JSON field value
+        default: Budget to use when the request gives none (default: per-model timeout)
+    Returns:
+        Timeout in seconds
+    Raises:
+        ValueError: If the requested timeout is not a positive number
+    """
+    requested = header_value if header_value not in (None, "") else body_value
+    if requested in (None, ""):
+        return default if default is not None else model_timeout(model)
+
+    try:
+        seconds = float(requested)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid timeout: {requested}")
+    if not seconds > 0:
+        raise ValueError(f"Invalid timeout: {requested}")
+    return min(seconds, config_manager.get('REQUEST_TIMEOUT_MAX_SECONDS'))
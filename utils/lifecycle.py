@@ -0,0 +1,63 @@
+from typing import Callable, List, Optional, Tuple
+import atexit
+import logging
+import os
+import threading
+
+class Lifecycle:
+    """
+    Start/stop registry for background services.
+
+    Modules register their services at import time but nothing runs until
+    start() is called, so importing the app (e.g. in a preforking master)
+    never creates threads that would be lost on fork. start() is idempotent
+    per process: after a fork the child starts its own copies.
+    """
+
+    def __init__(self):
+        self._services: List[Tuple[str, Callable[[], None], Callable[[], None]]] = []
+        self._started_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._atexit_registered = False
+        self.worker_slot: Optional[int] = None
+
+    def register(self, name: str, start: Callable[[], None], stop: Callable[[], None]) -> None:
+        """Register a service; services start in registration order and stop in reverse"""
+        self._services.append((name, start, stop))
+
+    @property
+    def running(self) -> bool:
+        """Whether services are running in this process"""
+        return self._started_pid == os.getpid()
+
+    def start(self) -> None:
+        """Start every registered service in this process"""
+        if self.running:
+            return
+        with self._lock:
+            if self.running:
+                return
+            for name, start, _ in self._services:
+                try:
+                    start()
+                except Exception as e:
+                    logging.error(f"Failed to start service {name}: {str(e)}")
+            self._started_pid = os.getpid()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+            logging.info(f"Background services started in process {os.getpid()}")
+
+    def stop(self) -> None:
+        """Stop every registered service, newest first"""
+        with self._lock:
+            if not self.running:
+                return
+            for name, _, stop in reversed(self._services):
+                try:
+                    stop()
+                except Exception as e:
+                    logging.error(f"Failed to stop service {name}: {str(e)}")
+            self._started_pid = None
+
+lifecycle = Lifecycle()
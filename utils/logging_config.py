@@ -1,21 +1,212 @@
+from typing import Any, Dict, List, Mapping, Optional, Set
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from queue import Queue, Full
+import copy
+import json
 import logging
 import os
-from datetime import datetime
+import sys
+import threading
+from utils.config_manager import config_manager
+from utils.lifecycle import lifecycle
+from utils.metrics import metrics
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+DROPPED = metrics.counter(
+    "log_records_dropped_total",
+    "Log records discarded because the logging queue was full"
+)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class _PipelineHandler(QueueHandler):
+    """
+    Root handler: hands records to the listener thread when it runs in
+    this process, otherwise writes them directly
+    """
+
+    def __init__(self, pipeline: "LogPipeline"):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Make the record safe to hand to another thread: merge the arguments
+        into the message and render the traceback, kept apart from the
+        message so each formatter can place it
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _TRACEBACK_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            # Dropping beats blocking the request that logged
+            DROPPED.inc()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.pipeline.running:
+            super().emit(record)
+        else:
+            self.pipeline.write(record)
+
+class LogPipeline:
+    """
+    Non-blocking logging for the whole process.
+
+    Loggers only put records on a bounded queue; a listener thread formats
+    them and does the console and file I/O, so a slow disk never holds up a
+    request. If the queue is full, records are dropped and counted rather
+    than waited on. The log file rotates by size or time. Records logged
+    before the listener starts (imports, the preforking master) or after it
+    stops are written directly.
+
+    Levels follow LOG_LEVEL and LOG_LEVELS live; format, file and rotation
+    apply at the next start.
+    """
+
+    def __init__(self):
+        self.queue: Optional[Queue] = None
+        self._handlers: List[logging.Handler] = []
+        self._listener: Optional[QueueListener] = None
+        self._listener_pid: Optional[int] = None
+        self._log_dir = ""
+        self._file_slot: Optional[int] = None
+        self._leveled: Set[str] = set()
+        self._write_lock = threading.Lock()
+        self._configured = False
+
+    @property
+    def running(self) -> bool:
+        """Whether the listener thread runs in this process"""
+        return self._listener_pid == os.getpid()
+
+    def configure(self, log_dir: str) -> None:
+        """Install the pipeline on the root logger; later calls do nothing"""
+        if self._configured:
+            return
+        self._configured = True
+        self._log_dir = log_dir
+        self.queue = Queue(maxsize=config_manager.get('LOG_QUEUE_SIZE'))
+        self._handlers = self._build_handlers()
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_PipelineHandler(self))
+        self.apply_levels()
+
+    def _build_handlers(self) -> List[logging.Handler]:
+        formatter = JsonFormatter() if config_manager.get('LOG_FORMAT') == 'json' else logging.Formatter(TEXT_FORMAT)
+        handlers: List[logging.Handler] = [logging.StreamHandler(sys.stderr), self._file_handler()]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        return handlers
+
+    def _file_handler(self) -> logging.Handler:
+        """
+        Rotating handler for LOG_FILE
+
+        Under the preforking server every worker slot writes its own file,
+        since rotating one file from several processes loses records.
+        """
+        path = config_manager.get('LOG_FILE') or os.path.join(self._log_dir, 'freeaiapi.log')
+        self._file_slot = lifecycle.worker_slot
+        if self._file_slot is not None:
+            path = f"{path}.{self._file_slot}"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if config_manager.get('LOG_ROTATION') == 'time':
+            return TimedRotatingFileHandler(path, when=config_manager.get('LOG_ROTATE_WHEN'),
+                                            backupCount=config_manager.get('LOG_BACKUP_COUNT'),
+                                            encoding="utf-8", delay=True)
+        return RotatingFileHandler(path, maxBytes=config_manager.get('LOG_MAX_BYTES'),
+                                   backupCount=config_manager.get('LOG_BACKUP_COUNT'),
+                                   encoding="utf-8", delay=True)
+
+    def write(self, record: logging.LogRecord) -> None:
+        """Write a record directly, for when no listener runs in this process"""
+        with self._write_lock:
+            for handler in self._handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def start(self) -> None:
+        """Start the listener thread of this process"""
+        if not self._configured or self.running:
+            return
+        if lifecycle.worker_slot != self._file_slot or self._listener is not None:
+            # Forked worker or restart: reopen the files instead of sharing
+            # another process's handles or reusing closed ones
+            self._close_handlers()
+            self._handlers = self._build_handlers()
+        self.queue = Queue(maxsize=config_manager.get('LOG_QUEUE_SIZE'))
+        for handler in logging.getLogger().handlers:
+            if isinstance(handler, _PipelineHandler):
+                handler.queue = self.queue
+        self._listener = QueueListener(self.queue, *self._handlers, respect_handler_level=True)
+        self._listener.start()
+        self._listener_pid = os.getpid()
+
+    def stop(self) -> None:
+        """Write out queued records and stop the listener thread"""
+        if not self.running:
+            return
+        self._listener_pid = None
+        self._listener.stop()
+        for handler in self._handlers:
+            handler.flush()
+
+    def _close_handlers(self) -> None:
+        for handler in self._handlers:
+            try:
+                handler.close()
+            except Exception:
+                pass
+
+    def apply_levels(self, old: Optional[Mapping] = None, new: Optional[Mapping] = None) -> None:
+        """Set the root level from LOG_LEVEL and per-logger levels from LOG_LEVELS"""
+        config = new or config_manager.config
+        logging.getLogger().setLevel(config['LOG_LEVEL'])
+        levels: Dict[str, Any] = config['LOG_LEVELS']
+        for name in self._leveled - set(levels):
+            logging.getLogger(name).setLevel(logging.NOTSET)
+        for name, level in levels.items():
+            logging.getLogger(name).setLevel(level)
+        self._leveled = set(levels)
+
+log_pipeline = LogPipeline()
+config_manager.subscribe(log_pipeline.apply_levels, ('LOG_LEVEL', 'LOG_LEVELS'))
+lifecycle.register("logging", log_pipeline.start, log_pipeline.stop)
 
 def setup_logging(log_dir: str) -> None:
     """
-    Configure logging with file handler
+    Route all logging through the non-blocking pipeline
     Args:
-        log_dir: Directory for log files
+        log_dir: Directory for the log file unless LOG_FILE is set
     """
-    current_time = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-    log_file = os.path.join(log_dir, f"{current_time}-error.log")
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
-    )
+    log_pipeline.configure(log_dir)
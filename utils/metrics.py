@@ -0,0 +1,212 @@
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+from bisect import bisect_left
+from contextlib import contextmanager
+import math
+import threading
+import time
+
+# Upper bounds in seconds; spans everything from a cache hit to a slow browser reply
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+SampleFunction = Callable[[], Union[float, Mapping]]
+
+class _Metric:
+    """
+    Base of the metric types: a name, help text and a value per label set.
+
+    A metric either records values as they happen or, when given a function,
+    reads them on every scrape. Functions return a number for metrics
+    without labels, otherwise a mapping from label values (a tuple, or a
+    plain value for a single label) to numbers.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 function: Optional[SampleFunction] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple("" if labels[name] is None else str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[Tuple[str, LabelValues, float]]:
+        if self.function is None:
+            with self._lock:
+                return [("", key, value) for key, value in self._values.items()]
+        values = self.function()
+        if not isinstance(values, Mapping):
+            return [("", (), values)]
+        return [("", key if isinstance(key, tuple) else (key,), value) for key, value in values.items()]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape_help(self.help)}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+
+    An observation costs one binary search and one increment under the
+    metric's lock; bucket counts are only accumulated when rendered.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (+Inf last), sum]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of the block, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[Tuple[str, LabelValues, float]]:
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        samples = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(("_bucket", key + (_number(bound),), cumulative))
+            samples.append(("_sum", key, total))
+            samples.append(("_count", key, cumulative))
+        return samples
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape_help(self.help)}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, value in self._samples():
+            names = self.labelnames + ("le",) if suffix == "_bucket" else self.labelnames
+            lines.append(f"{self.name}{suffix}{_labels(names, key)} {_number(value)}")
+        return lines
+
+class MetricsRegistry:
+    """
+    In-process metrics in the Prometheus text exposition format.
+
+    Modules declare their metrics at import time next to the code they
+    measure; declaring a name twice returns the existing metric. Values are
+    per process, so under the preforking server each worker reports its own.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = (),
+                function: Optional[SampleFunction] = None) -> Counter:
+        """Declare a counter; with function, its values are read from it on each scrape"""
+        return self._register(Counter(name, help, labelnames, function))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (),
+              function: Optional[SampleFunction] = None) -> Gauge:
+        """Declare a gauge; with function, its values are read from it on each scrape"""
+        return self._register(Gauge(name, help, labelnames, function))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Declare a histogram"""
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        """Every metric in the text exposition format"""
+        with self._lock:
+            registered = list(self._metrics.values())
+        lines = []
+        for metric in registered:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One failing reader must not take the whole scrape down
+                lines.append(f"# {metric.name} unavailable: {_escape_help(str(e))}")
+        return "\n".join(lines) + "\n"
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
+    return str(value)
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)) + "}"
+
+def _escape_label(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+metrics = MetricsRegistry()
@@ -0,0 +1,66 @@
+from typing import Dict, Iterable, Optional, Set, Union
+import ipaddress
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+class NetworkSet:
+    """
+    Set of IP networks with fast membership tests for single addresses.
+
+    Networks are stored as integer prefixes grouped by version and prefix
+    length, so a lookup is one shift and one set probe per distinct prefix
+    length instead of a scan over every network.
+    """
+
+    def __init__(self, networks: Iterable[IPNetwork] = ()):
+        # version -> prefix length -> network prefixes as integers
+        self._prefixes: Dict[int, Dict[int, Set[int]]] = {4: {}, 6: {}}
+        self._networks = []
+        for network in networks:
+            self.add(network)
+
+    def add(self, network: IPNetwork) -> None:
+        bits = network.max_prefixlen
+        prefix = int(network.network_address) >> (bits - network.prefixlen)
+        self._prefixes[network.version].setdefault(network.prefixlen, set()).add(prefix)
+        self._networks.append(network)
+
+    def contains(self, address: Union[str, ipaddress.IPv4Address, ipaddress.IPv6Address, None]) -> bool:
+        """Whether an address (string or ip_address) falls in any network; invalid input is not contained"""
+        ip = _address(address)
+        if ip is None:
+            return False
+        if ip.version == 6 and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        value = int(ip)
+        bits = ip.max_prefixlen
+        for prefixlen, prefixes in self._prefixes[ip.version].items():
+            if (value >> (bits - prefixlen)) in prefixes:
+                return True
+        return False
+
+    def __contains__(self, address) -> bool:
+        return self.contains(address)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, NetworkSet) and set(self._networks) == set(other._networks)
+
+    def __len__(self) -> int:
+        return len(self._networks)
+
+    def __iter__(self):
+        return iter(self._networks)
+
+    def __repr__(self) -> str:
+        return f"NetworkSet({', '.join(str(n) for n in self._networks)})"
+
+def _address(address) -> Optional[Union[ipaddress.IPv4Address, ipaddress.IPv6Address]]:
+    if isinstance(address, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+        return address
+    if not address:
+        return None
+    try:
+        # Scoped IPv6 addresses (fe80::1%eth0) match on the address alone
+        return ipaddress.ip_address(address.split('%', 1)[0])
+    except ValueError:
+        return None
@@ -0,0 +1,108 @@
+from typing import Dict, Optional, Tuple
+from collections import Counter
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: profiles are exclusive per process only
+    fcntl = None
+
+# Held while a profile runs, so workers of one server never profile at once
+LOCK_PATH = os.path.join(tempfile.gettempdir(), 'freeaiapi-profile.lock')
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+class SamplingProfiler:
+    """
+    Statistical profiler over every thread of the process.
+
+    While a profile runs, the calling thread wakes every interval, reads the
+    stack of every other thread with sys._current_frames() and counts each
+    distinct stack. Nothing is installed between profiles, so there is no
+    overhead when none is running. Threads blocked on a lock are sampled as
+    well, which makes contention show up as time spent in acquire/wait.
+
+    One profile runs at a time on the host: sampling is a busy loop over
+    every thread, and overlapping profiles from several workers would each
+    measure the others.
+
+    Results are collapsed stacks ("thread;outer;...;inner count" per line),
+    the input format of flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self):
+        self._running = threading.Lock()
+        self._labels: Dict[Tuple[object, int], str] = {}
+
+    def profile(self, seconds: float, interval: float) -> Tuple[str, int]:
+        """
+        Sample all threads for a while
+
+        Args:
+            seconds: How long to sample
+            interval: Seconds between samples
+        Returns:
+            Collapsed stacks, most frequent first, and the number of samples taken
+        Raises:
+            ProfilerBusy: If a profile is already running
+        """
+        if not self._running.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            host_lock = self._lock_host()
+        except ProfilerBusy:
+            self._running.release()
+            raise
+        try:
+            counts: Counter = Counter()
+            own = threading.get_ident()
+            samples = 0
+            end = time.monotonic() + seconds
+            while time.monotonic() < end:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != own:
+                        counts[self._collapse(names.get(ident, f"thread-{ident}"), frame)] += 1
+                samples += 1
+                time.sleep(interval)
+            return "".join(f"{stack} {count}\n" for stack, count in counts.most_common()), samples
+        finally:
+            self._labels.clear()
+            if host_lock is not None:
+                host_lock.close()
+            self._running.release()
+
+    @staticmethod
+    def _lock_host() -> Optional[object]:
+        """Take the host-wide profile lock; closing the returned file releases it"""
+        if fcntl is None:
+            return None
+        lock_file = open(LOCK_PATH, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise ProfilerBusy("A profile is already running in another worker")
+        return lock_file
+
+    def _collapse(self, thread_name: str, frame) -> str:
+        """One stack as 'thread;outermost;...;innermost'"""
+        labels = []
+        while frame is not None:
+            key = (frame.f_code, frame.f_lineno)
+            label = self._labels.get(key)
+            if label is None:
+                code = frame.f_code
+                name = getattr(code, "co_qualname", code.co_name)
+                label = self._labels[key] = f"{name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(thread_name.replace(";", ":"))
+        return ";".join(reversed(labels))
+
+profiler = SamplingProfiler()
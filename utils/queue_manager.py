@@ -1,17 +1,39 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Mapping, Optional
 from datetime import datetime
-import uuid
+import random
 import threading
 import logging
-from queue import Queue
+import time
+from queue import Queue, Full
 from dataclasses import dataclass, asdict
 from enum import Enum
+from utils.blob_store import blob_store
+from utils.cluster import cluster
+from utils.lifecycle import lifecycle
+from utils.config_manager import config_manager
+from utils.deadline import Deadline, model_timeout
+from utils.metrics import metrics
+from utils.scheduler import scheduler
+from utils.tracing import tracer
+
+QUEUE_WAIT = metrics.histogram(
+    "queue_wait_seconds",
+    "Time a task spent in the queue before a worker picked it up, per attempt",
+    ("model",)
+)
+QUEUE_TASKS = metrics.counter(
+    "queue_tasks_total",
+    "Tasks that reached a final state",
+    ("model", "status")
+)
 
 class TaskStatus(Enum):
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    EXPIRED = "expired"
+    RETRYING = "retrying"
 
 @dataclass
 class QueueTask:
@@ -19,23 +41,76 @@ class QueueTask:
     model: str
     message: str
     session_id: Optional[str]
-    files: list
+    files: list  # blob store references, see utils.blob_store
     status: TaskStatus
     result: Optional[Dict[str, Any]]
     created_at: datetime
     completed_at: Optional[datetime]
+    deadline: Optional[float] = None  # epoch seconds, see utils.deadline
+    attempts: int = 0
+    last_error: Optional[str] = None
+    next_attempt_at: Optional[datetime] = None
+    enqueued_at: Optional[datetime] = None  # when the current attempt was queued
+    timings: Optional[Dict[str, float]] = None  # milliseconds per stage of the last attempt
 
 class QueueManager:
     def __init__(self, max_queue_size: int = 1000):
         self.tasks: Dict[str, QueueTask] = {}
         self.queue = Queue(maxsize=max_queue_size)
         self._lock = threading.Lock()
-        self._start_worker()
+        self._workers: List[threading.Thread] = []
+        self._target_workers = 0
+        self._depth: Dict[str, int] = {}  # model -> tasks waiting in self.queue
+
+    def start(self) -> None:
+        """Start QUEUE_WORKERS background workers"""
+        self.resize(config_manager.get('QUEUE_WORKERS'))
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Ask the workers to exit after their current task and wait briefly for them"""
+        with self._lock:
+            workers = list(self._workers)
+        self.resize(0)
+        for worker in workers:
+            worker.join(timeout)
+
+    def resize(self, workers: int) -> None:
+        """
+        Change the number of workers
+
+        New workers start at once. Surplus workers exit after their current
+        task, or right away if idle; tasks are never interrupted.
+        """
+        with self._lock:
+            self._target_workers = max(workers, 0)
+            surplus = len(self._workers) - self._target_workers
+            while len(self._workers) < self._target_workers:
+                worker = threading.Thread(target=self._work, name=f"queue-worker-{len(self._workers)}", daemon=True)
+                self._workers.append(worker)
+                worker.start()
+        for _ in range(surplus):
+            try:
+                self.queue.put_nowait(None)  # wakes an idle worker
+            except Full:
+                break  # workers are busy and will notice after their task
+
+    def on_config_change(self, old: Mapping, new: Mapping) -> None:
+        """Config subscriber: follow QUEUE_WORKERS"""
+        if self._workers or self._target_workers:
+            self.resize(new['QUEUE_WORKERS'])
+
+    def _retire(self) -> bool:
+        """Whether the calling worker is surplus; if so it is removed and must exit"""
+        with self._lock:
+            if len(self._workers) <= self._target_workers:
+                return False
+            self._workers.remove(threading.current_thread())
+            return True
     
     def add_task(self, model: str, message: str, session_id: Optional[str] = None, 
-                 files: list = None) -> str:
+                 files: list = None, deadline: Optional[Deadline] = None) -> str:
         """Add new task to queue and return transaction ID"""
-        transaction_id = str(uuid.uuid4())
+        transaction_id = cluster.new_id()
         task = QueueTask(
             transaction_id=transaction_id,
             model=model,
@@ -45,12 +120,15 @@ class QueueManager:
             status=TaskStatus.PENDING,
             result=None,
             created_at=datetime.now(),
-            completed_at=None
+            completed_at=None,
+            deadline=deadline.expires_at if deadline else None,
+            enqueued_at=datetime.now()
         )
         
         with self._lock:
             self.tasks[transaction_id] = task
             self.queue.put(task)
+            self._depth[model] = self._depth.get(model, 0) + 1
             
         return transaction_id
     
@@ -64,43 +142,157 @@ class QueueManager:
             data = asdict(task)
             data['status'] = task.status.value
             return data
-            
-    def _start_worker(self) -> None:
-        """Start background worker thread"""
-        def worker():
-            while True:
-                task: QueueTask = self.queue.get()
-                try:
-                    with self._lock:
-                        task.status = TaskStatus.PROCESSING
-                    
-                    from models.chat_handler import handle_chat_request
+
+    def depth_by_model(self) -> Dict[str, int]:
+        """Number of tasks waiting for a worker, per model"""
+        with self._lock:
+            return dict(self._depth)
+
+    def _retry_delay(self, attempts: int, result: Dict[str, Any]) -> float:
+        """
+        Backoff before the next attempt: exponential in the attempts made so
+        far with full jitter, and never before an open circuit lets calls in
+        """
+        base = config_manager.get('QUEUE_RETRY_BASE_SECONDS')
+        cap = config_manager.get('QUEUE_RETRY_MAX_SECONDS')
+        delay = random.uniform(0, min(cap, base * 2 ** (attempts - 1)))
+        return max(delay, result.get("retry_after") or 0.0)
+
+    def _schedule_retry(self, task: QueueTask, result: Dict[str, Any]) -> bool:
+        """
+        Put a failed attempt back on a timer if the error is transient and
+        attempts and deadline allow it
+
+        Returns:
+            True if a retry was scheduled
+        """
+        if not result.get("retryable") or task.attempts >= config_manager.get('QUEUE_MAX_ATTEMPTS'):
+            return False
+        delay = self._retry_delay(task.attempts, result)
+        if task.deadline is not None and time.time() + delay >= task.deadline:
+            return False
+
+        with self._lock:
+            task.status = TaskStatus.RETRYING
+            task.next_attempt_at = datetime.fromtimestamp(time.time() + delay)
+        logging.info(f"Retrying task {task.transaction_id} in {delay:.1f}s (attempt {task.attempts} failed)")
+        scheduler.call_later(delay, self._requeue, task, on_drop=self._drop_retry)
+        return True
+
+    def _drop_retry(self, task: QueueTask) -> None:
+        """Scheduler callback on shutdown: settle a task whose retry will never run"""
+        if task.deadline is not None and Deadline(task.deadline).expired:
+            self._finish(task, TaskStatus.EXPIRED, {
+                "status": False,
+                "message": "Deadline exceeded before processing",
+                "data": None
+            })
+        else:
+            self._finish(task, TaskStatus.FAILED, {
+                "status": False,
+                "message": f"Shut down before retry, last error: {task.last_error}",
+                "data": None
+            })
+        blob_store.release_many(task.files)
+
+    def _requeue(self, task: QueueTask) -> None:
+        """Scheduler callback: hand a task back to the worker"""
+        with self._lock:
+            task.status = TaskStatus.PENDING
+            task.next_attempt_at = None
+            task.enqueued_at = datetime.now()
+            try:
+                self.queue.put_nowait(task)
+                self._depth[task.model] = self._depth.get(task.model, 0) + 1
+                queued = True
+            except Full:
+                queued = False
+        if not queued:
+            self._finish(task, TaskStatus.FAILED, {
+                "status": False,
+                "message": "Queue full, retry dropped",
+                "data": None
+            })
+            blob_store.release_many(task.files)
+
+    def _finish(self, task: QueueTask, status: TaskStatus, result: Dict[str, Any]) -> None:
+        with self._lock:
+            task.status = status
+            task.result = result
+            task.completed_at = datetime.now()
+        QUEUE_TASKS.inc(model=task.model, status=status.value)
+
+    def _work(self) -> None:
+        """Worker thread: process tasks until retired by resize()"""
+        while True:
+            task: Optional[QueueTask] = self.queue.get()
+            if task is None:
+                self.queue.task_done()
+                if self._retire():
+                    return
+                continue
+            with self._lock:
+                self._depth[task.model] -= 1
+            waited = (datetime.now() - task.enqueued_at).total_seconds() if task.enqueued_at else 0.0
+            QUEUE_WAIT.observe(waited, model=task.model)
+            retrying = False
+            try:
+                deadline = Deadline(task.deadline) if task.deadline is not None else None
+                if deadline and deadline.expired:
+                    self._finish(task, TaskStatus.EXPIRED, {
+                        "status": False,
+                        "message": "Deadline exceeded before processing",
+                        "data": None
+                    })
+                    continue
+
+                with self._lock:
+                    task.status = TaskStatus.PROCESSING
+                    task.attempts += 1
+
+                # The task's deadline may be hours away; one upstream call
+                # still gets no more than the model's request timeout
+                run_deadline = Deadline.after(model_timeout(task.model)).earliest(deadline)
+                from models.chat_handler import handle_chat_request
+                started = time.perf_counter() - waited
+                with tracer.trace("queue_task", started, model=task.model,
+                                  transaction_id=task.transaction_id, attempt=task.attempts) as trace:
+                    trace.add("queue_wait", started, waited)
                     result = handle_chat_request(
                         task.model,
                         task.message,
                         task.session_id,
-                        task.files
+                        [blob_store.path_for(ref["blob_id"]) for ref in task.files],
+                        run_deadline
                     )
-                    
+                    trace.attributes["status"] = result["status"]
                     with self._lock:
-                        task.status = TaskStatus.COMPLETED if result["status"] else TaskStatus.FAILED
-                        task.result = result
-                        task.completed_at = datetime.now()
-                        
-                except Exception as e:
-                    logging.error(f"Queue worker error: {str(e)}")
+                        task.timings = trace.summary()
+
+                if not result["status"]:
                     with self._lock:
-                        task.status = TaskStatus.FAILED
-                        task.result = {
-                            "status": False,
-                            "message": str(e),
-                            "data": None
-                        }
-                        task.completed_at = datetime.now()
-                finally:
-                    self.queue.task_done()
-
-        thread = threading.Thread(target=worker, daemon=True)
-        thread.start()
+                        task.last_error = result["message"]
+                    retrying = self._schedule_retry(task, result)
+                if not retrying:
+                    self._finish(task, TaskStatus.COMPLETED if result["status"] else TaskStatus.FAILED, result)
+
+            except Exception as e:
+                logging.error(f"Queue worker error: {str(e)}")
+                with self._lock:
+                    task.last_error = str(e)
+                self._finish(task, TaskStatus.FAILED, {
+                    "status": False,
+                    "message": str(e),
+                    "data": None
+                })
+            finally:
+                if not retrying:
+                    blob_store.release_many(task.files)
+                self.queue.task_done()
+            if self._retire():
+                return
 
 queue_manager = QueueManager()
+metrics.gauge("queue_depth", "Tasks waiting for a queue worker", ("model",), function=queue_manager.depth_by_model)
+config_manager.subscribe(queue_manager.on_config_change, ('QUEUE_WORKERS',))
+lifecycle.register("queue", queue_manager.start, queue_manager.stop)
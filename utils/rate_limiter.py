@@ -0,0 +1,153 @@
+from typing import Dict, Any, Optional
+import logging
+import threading
+import time
+from utils.config_manager import config_manager
+from utils.session_store import session_store
+from utils.token_bucket import TokenBucket
+
+# Idle per-IP buckets are dropped once this many are tracked
+MAX_TRACKED_IPS = 10000
+
+class RateLimitExceeded(Exception):
+    """Raised when a client is over its request rate or concurrency limit"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """
+    Per-client and per-IP limits for requests that consume upstream capacity.
+
+    Each API client (see ConfigManager._parse_api_tokens) has a token bucket
+    of rate_per_minute with bursts of burst, and at most max_concurrent
+    requests in flight in this process. Each client IP has a bucket of
+    RATE_LIMIT_IP_PER_MINUTE. With RATE_LIMIT_SHARED the rates are counted
+    in one-minute windows in the session store instead, so every process
+    sharing the store enforces one budget; concurrency stays per process.
+    A request doing the work of several (a batch) costs several tokens,
+    capped at the burst so it can still be admitted, and may hold several
+    concurrency slots.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._ip_buckets: Dict[str, TokenBucket] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, client: Dict[str, Any], ip: Optional[str], cost: int = 1, slots: int = 1) -> None:
+        """
+        Admit one request; every successful acquire must be followed by
+        release() with the same slots
+
+        Args:
+            client: The client's name and limits
+            ip: Client address, or None to skip the per-IP limit
+            cost: Requests' worth of rate tokens to take
+            slots: Concurrent requests' worth of slots to hold, at most max_concurrent
+        Raises:
+            RateLimitExceeded: If the request is over a limit
+        """
+        name = client["name"]
+        with self._lock:
+            stats = self._stats.setdefault(name, {
+                "requests_total": 0,
+                "rate_limited_total": 0,
+                "concurrency_limited_total": 0
+            })
+            stats["requests_total"] += 1
+            in_flight = self._in_flight.get(name, 0)
+            if in_flight + slots > client["max_concurrent"]:
+                stats["concurrency_limited_total"] += 1
+                raise RateLimitExceeded(f"Too many concurrent requests for client {name}", 1.0)
+            self._in_flight[name] = in_flight + slots
+
+        ip_taken = 0
+        try:
+            if ip:
+                ip_taken = self._take(f"ip:{ip}", config_manager.get('RATE_LIMIT_IP_PER_MINUTE'),
+                                      config_manager.get('RATE_LIMIT_IP_BURST'), self._ip_buckets,
+                                      f"Rate limit exceeded for {ip}", cost)
+            self._take(f"client:{name}", client["rate_per_minute"], client["burst"], self._buckets,
+                       f"Rate limit exceeded for client {name}", cost)
+        except RateLimitExceeded:
+            # A request the client's own limit refused doesn't count against its address
+            if ip_taken:
+                self._refund(f"ip:{ip}", self._ip_buckets, ip_taken)
+            with self._lock:
+                stats["rate_limited_total"] += 1
+            self.release(name, slots)
+            raise
+
+    def release(self, name: str, slots: int = 1) -> None:
+        """End a request admitted by acquire()"""
+        with self._lock:
+            self._in_flight[name] = max(self._in_flight.get(name, 0) - slots, 0)
+
+    def _take(self, key: str, rate_per_minute: float, burst: float,
+              buckets: Dict[str, TokenBucket], message: str, cost: int = 1) -> float:
+        """Take cost tokens, capped at what the limit allows at once, and return how many"""
+        if config_manager.get_bool('RATE_LIMIT_SHARED'):
+            return self._take_shared(key, rate_per_minute, message, cost)
+
+        with self._lock:
+            bucket = buckets.get(key)
+            if bucket is None or bucket.rate != rate_per_minute / 60 or bucket.capacity != burst:
+                if buckets is self._ip_buckets and len(buckets) >= MAX_TRACKED_IPS:
+                    self._prune(buckets)
+                bucket = buckets[key] = TokenBucket(rate_per_minute / 60, burst)
+        tokens = max(min(cost, bucket.capacity), 1)
+        if not bucket.try_acquire(tokens):
+            raise RateLimitExceeded(message, (tokens - bucket.available()) / bucket.rate)
+        return tokens
+
+    def _refund(self, key: str, buckets: Dict[str, TokenBucket], tokens: float = 1) -> None:
+        """Give back tokens taken by _take"""
+        if config_manager.get_bool('RATE_LIMIT_SHARED'):
+            try:
+                session_store.incr(f"ratelimit:{key}:{int(time.time() // 60)}", 60, -int(tokens))
+            except Exception as e:
+                logging.error(f"Shared rate limit refund failed: {str(e)}")
+            return
+        with self._lock:
+            bucket = buckets.get(key)
+        if bucket is not None:
+            bucket.refund(tokens)
+
+    def _take_shared(self, key: str, rate_per_minute: float, message: str, cost: int = 1) -> int:
+        """Count the request in the store's fixed one-minute window for key"""
+        window = int(time.time() // 60)
+        tokens = max(min(cost, int(rate_per_minute)), 1)
+        try:
+            count = session_store.incr(f"ratelimit:{key}:{window}", 60, tokens)
+        except Exception as e:
+            # Fail open: a store outage must not take the API down with it
+            logging.error(f"Shared rate limit check failed: {str(e)}")
+            return 0
+        if count > rate_per_minute:
+            raise RateLimitExceeded(message, 60 - time.time() % 60)
+        return tokens
+
+    @staticmethod
+    def _prune(buckets: Dict[str, TokenBucket]) -> None:
+        """Drop buckets that have refilled completely, i.e. idle clients"""
+        for key in [k for k, b in buckets.items() if b.available() >= b.capacity]:
+            del buckets[key]
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Counters and current usage per client"""
+        with self._lock:
+            return {
+                name: {
+                    **stats,
+                    "in_flight": self._in_flight.get(name, 0),
+                    "tokens": (round(self._buckets[f"client:{name}"].available(), 3)
+                               if f"client:{name}" in self._buckets else None)
+                }
+                for name, stats in self._stats.items()
+            }
+
+rate_limiter = RateLimiter()
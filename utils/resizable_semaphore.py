@@ -0,0 +1,44 @@
+from typing import Optional
+import threading
+
+class ResizableSemaphore:
+    """
+    Counting semaphore whose limit can change while it is in use.
+
+    Raising the limit wakes waiters at once. Lowering it never interrupts
+    holders: new acquirers wait until usage has dropped below the new limit.
+    """
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take a permit, waiting up to timeout seconds; returns False on timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._in_use < self._limit, timeout):
+                return False
+            self._in_use += 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            if self._in_use <= 0:
+                raise ValueError("Semaphore released too many times")
+            self._in_use -= 1
+            self._cond.notify()
+
+    def resize(self, limit: int) -> None:
+        """Change the number of permits"""
+        with self._cond:
+            self._limit = limit
+            self._cond.notify_all()
@@ -0,0 +1,83 @@
+from typing import Any, Callable, List, Optional, Tuple
+import heapq
+import itertools
+import logging
+import threading
+import time
+from utils.lifecycle import lifecycle
+
+class Scheduler:
+    """
+    Runs callbacks after a delay on a single timer thread.
+
+    Pending calls sit in a heap ordered by due time, so waiting work costs
+    no thread of its own. Callbacks should be quick (e.g. re-enqueue a
+    task); slow work belongs on a worker. Calls still pending at stop() are
+    dropped; their on_drop callback lets the caller settle them instead.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Callable[..., Any], tuple, Optional[Callable[..., Any]]]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the timer thread"""
+        with self._cond:
+            self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the timer thread; calls not yet due are dropped, running their on_drop"""
+        with self._cond:
+            self._stopping = True
+            dropped, self._heap = self._heap, []
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+        for _, _, _, args, on_drop in sorted(dropped):
+            if on_drop is None:
+                continue
+            try:
+                on_drop(*args)
+            except Exception as e:
+                logging.error(f"Dropping scheduled call failed: {str(e)}")
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args,
+                   on_drop: Optional[Callable[..., Any]] = None) -> None:
+        """Run callback(*args) once delay seconds have passed, or on_drop(*args) if stopped first"""
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + max(delay, 0.0), next(self._counter),
+                                        callback, args, on_drop))
+            self._cond.notify()
+
+    def pending(self) -> int:
+        """Number of calls waiting to run"""
+        with self._cond:
+            return len(self._heap)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                if self._stopping:
+                    return
+                _, _, callback, args, _ = heapq.heappop(self._heap)
+            try:
+                callback(*args)
+            except Exception as e:
+                logging.error(f"Scheduled call failed: {str(e)}")
+
+scheduler = Scheduler()
+lifecycle.register("scheduler", scheduler.start, scheduler.stop)
@@ -1,111 +1,607 @@
-from typing import Dict, Optional, Any, List
-from datetime import datetime, timedelta
-import uuid
+from typing import Callable, Dict, Optional, Any, List, Iterator, Mapping
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import os
 import threading
 import time
+import logging
 from utils.config_manager import config_manager
+from utils.conversation_history import ConversationHistory
+from utils.session_store import session_store, current_owner
+from utils.cluster import cluster
+from utils.lifecycle import lifecycle
+from utils.metrics import metrics
+from models.backends import backend_registry
+
+STRIPE_COUNT = 16
+
+class _SessionStripe:
+    """
+    One shard of the session table.
+
+    Sessions are kept in last-access order, so the least recently used
+    entries are always at the front and expiry never has to look past the
+    first session that is still live.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
 
 class SessionManager:
     def __init__(self):
-        self.sessions: Dict[str, Dict[str, Any]] = {}
-        self._lock = threading.Lock()
-        self._start_cleanup_thread()
+        self._stripes = [_SessionStripe() for _ in range(STRIPE_COUNT)]
+        self._capacity = threading.Condition(threading.RLock())
+        self._stats_lock = threading.Lock()
         self.session_stats = {
             "created_total": 0,
             "expired_total": 0,
-            "cleared_total": 0
+            "cleared_total": 0,
+            "evicted_total": 0,
+            "overflow_rejected_total": 0,
+            "overflow_waited_total": 0,
+            "overflow_wait_timeouts_total": 0,
+            "restored_total": 0,
+            "snapshots_total": 0
         }
-        
+        self._snapshot_cache: Dict[str, tuple] = {}
+        self._snapshot_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake = threading.Condition()
+
+    def start(self) -> None:
+        """Restore the last snapshot and start cleanup and snapshot threads"""
+        self._stop_event.clear()
+        if self._snapshot_path():
+            self.restore_sessions()
+        self._start_cleanup_thread()
+        self._start_snapshot_thread()
+
+    def stop(self) -> None:
+        """Stop background threads and write a final snapshot"""
+        with self._wake:
+            self._stop_event.set()
+            self._wake.notify_all()
+        if self._snapshot_path():
+            self.snapshot_sessions()
+
+    def _snapshot_path(self) -> str:
+        """
+        Snapshot file for this process
+
+        Under the preforking server every worker slot gets its own file, so
+        workers never overwrite each other and a restarted worker restores
+        what its predecessor in the same slot held.
+        """
+        path = config_manager.get('SESSION_SNAPSHOT_PATH')
+        if path and lifecycle.worker_slot is not None:
+            return f"{path}.{lifecycle.worker_slot}"
+        return path
+
+    def _stripe_for(self, session_id: str) -> _SessionStripe:
+        """Return the stripe owning a session id"""
+        return self._stripes[hash(session_id) % STRIPE_COUNT]
+
+    def _timeout_seconds(self) -> float:
+        """Session idle timeout in seconds"""
+        return config_manager.get('SESSION_TIMEOUT_MINUTES') * 60
+
+    def _count_stat(self, key: str, amount: int = 1) -> None:
+        """Increment a session statistics counter"""
+        if amount:
+            with self._stats_lock:
+                self.session_stats[key] += amount
+
+    def count(self) -> int:
+        """Number of live sessions across all stripes"""
+        return sum(len(stripe.sessions) for stripe in self._stripes)
+
     def create_session(self, model_type: str) -> Optional[str]:
-        """Creates new session if under limit"""
-        with self._lock:
-            if len(self.sessions) >= config_manager.get('MAX_SESSIONS'):
+        """
+        Creates new session, applying SESSION_OVERFLOW_POLICY when at the limit
+
+        Policies:
+            reject: return None straight away
+            evict: close and drop the least recently used idle session
+            wait: wait up to SESSION_OVERFLOW_WAIT_SECONDS for a free slot
+        Returns:
+            New session id, or None if no slot could be obtained
+        """
+        with self._capacity:
+            if not self._reserve_slot():
                 return None
-                
-            session_id = str(uuid.uuid4())
-            self.sessions[session_id] = {
-                "model_type": model_type,
-                "created_at": datetime.now(),
-                "last_accessed": datetime.now(),
-                "conversation": [],
-                "client": None,
-                "session_id": session_id
-            }
-            self.session_stats["created_total"] += 1
-            return session_id
+
+            session_id = cluster.new_id()
+            session = self._new_session(session_id, model_type, datetime.now())
+            stripe = self._stripe_for(session_id)
+            with stripe.lock:
+                stripe.sessions[session_id] = session
+        self.sync_session(session)
+        self._count_stat("created_total")
+        return session_id
+
+    def _new_session(self, session_id: str, model_type: str, created_at: datetime,
+                     conversation_id: Optional[str] = None, account: Optional[str] = None) -> Dict[str, Any]:
+        """Build the local record for a session owned by this process"""
+        return {
+            "model_type": model_type,
+            "created_at": created_at,
+            "last_accessed": datetime.now(),
+            "last_accessed_monotonic": time.monotonic(),
+            "last_synced_monotonic": 0.0,
+            "conversation": ConversationHistory(session_id),
+            "conversation_id": conversation_id,
+            "account": account,
+            "client": None,
+            "in_use": 0,
+            "session_id": session_id
+        }
+
+    def _call_store(self, method: str, *args) -> Any:
+        """Call the shared session store, logging instead of failing the request"""
+        try:
+            return getattr(session_store, method)(*args)
+        except Exception as e:
+            logging.error(f"Session store {method} failed: {str(e)}")
+            return None
+
+    def sync_session(self, session: Dict[str, Any]) -> None:
+        """Write a session's shareable metadata to the session store"""
+        session["last_synced_monotonic"] = time.monotonic()
+        self._call_store("save", session["session_id"], {
+            "session_id": session["session_id"],
+            "model_type": session["model_type"],
+            "created_at": session["created_at"].isoformat(),
+            "last_accessed": session["last_accessed"].isoformat(),
+            "conversation_id": session.get("conversation_id"),
+            "account": session.get("account"),
+            "conversation_length": len(session["conversation"]),
+            "owner": current_owner()
+        }, self._timeout_seconds())
+
+    def get_session_owner(self, session_id: str) -> Optional[str]:
+        """Owner recorded in the session store for a session, if any"""
+        metadata = self._call_store("load", session_id) if session_id else None
+        return metadata.get("owner") if metadata else None
+
+    def _adopt_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Take over a session another process created
+
+        Backends with portable sessions (Grok, whose conversations live
+        upstream) can be rebound from their conversation id. Sessions backed
+        by a browser stay with the owning process and cannot be adopted.
+        """
+        metadata = self._call_store("load", session_id)
+        if not metadata:
+            return None
+        capabilities = backend_registry.capabilities(metadata["model_type"])
+        if metadata.get("owner") != current_owner() and not (capabilities and capabilities.portable_sessions):
+            return None
+
+        with self._capacity:
+            stripe = self._stripe_for(session_id)
+            with stripe.lock:
+                if session_id in stripe.sessions:
+                    return stripe.sessions[session_id]
+            if not self._reserve_slot():
+                return None
+
+            session = self._new_session(
+                session_id,
+                metadata["model_type"],
+                datetime.fromisoformat(metadata["created_at"]),
+                metadata.get("conversation_id"),
+                metadata.get("account")
+            )
+            with stripe.lock:
+                stripe.sessions[session_id] = session
+        self.sync_session(session)
+        logging.info(f"Adopted session {session_id} from {metadata.get('owner')}")
+        return session
+
+    def _has_capacity(self) -> bool:
+        """Whether a new session fits under MAX_SESSIONS"""
+        return self.count() < config_manager.get('MAX_SESSIONS')
+
+    def _reserve_slot(self) -> bool:
+        """Make room for one session. Caller holds self._capacity"""
+        if self._has_capacity():
+            return True
+
+        self._cleanup_expired_sessions()
+        if self._has_capacity():
+            return True
+
+        policy = config_manager.get('SESSION_OVERFLOW_POLICY')
+        if policy == "evict":
+            while not self._has_capacity():
+                if not self._evict_lru_idle_session():
+                    break
+            if self._has_capacity():
+                return True
+        elif policy == "wait":
+            self._count_stat("overflow_waited_total")
+            timeout = config_manager.get('SESSION_OVERFLOW_WAIT_SECONDS')
+            if self._capacity.wait_for(self._has_capacity, timeout=timeout):
+                return True
+            self._count_stat("overflow_wait_timeouts_total")
+
+        self._count_stat("overflow_rejected_total")
+        return False
+
+    def _evict_lru_idle_session(self) -> bool:
+        """Close and remove the least recently used session not serving a request"""
+        candidate = None
+        for stripe in self._stripes:
+            with stripe.lock:
+                for sid, session in stripe.sessions.items():
+                    if session["in_use"]:
+                        continue
+                    if candidate is None or session["last_accessed_monotonic"] < candidate[2]:
+                        candidate = (stripe, sid, session["last_accessed_monotonic"])
+                    break
+
+        if candidate is None:
+            return False
+
+        stripe, sid, _ = candidate
+        with stripe.lock:
+            session = stripe.sessions.get(sid)
+            if not session or session["in_use"]:
+                return True
+            del stripe.sessions[sid]
+
+        self._release_sessions([session], forget_shared=True)
+        self._count_stat("evicted_total")
+        logging.info(f"Evicted idle session {sid} to make room for a new session")
+        return True
+
+    def _release_sessions(self, sessions: List[Dict[str, Any]], forget_shared: bool = False) -> None:
+        """
+        Close the clients of removed sessions and wake waiting creators
+
+        Args:
+            sessions: Session records already removed from their stripes
+            forget_shared: Also delete the records from the session store.
+                Expired sessions are left to the store's own TTL, since
+                another process may still be serving them.
+        """
+        for session in sessions:
+            if forget_shared:
+                self._call_store("delete", session["session_id"])
+            session["conversation"].delete()
+            client = session.get("client")
+            session["client"] = None
+            if client is not None and hasattr(client, "close"):
+                try:
+                    client.close()
+                except Exception as e:
+                    logging.error(f"Error closing client for session {session['session_id']}: {str(e)}")
+
+        if sessions:
+            with self._capacity:
+                self._capacity.notify_all()
 
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Get session if exists and not expired"""
-        with self._lock:
-            session = self.sessions.get(session_id)
+        """
+        Get session if exists and not expired
+
+        Sessions unknown to this process are looked up in the session store
+        and adopted when their client can be rebuilt here.
+        """
+        if not session_id:
+            return None
+
+        stripe = self._stripe_for(session_id)
+        now = time.monotonic()
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
             if not session:
-                return None
-                
-            timeout = timedelta(minutes=config_manager.get('SESSION_TIMEOUT_MINUTES'))
-            if datetime.now() - session["last_accessed"] > timeout:
-                del self.sessions[session_id]
-                return None
-                
-            session["last_accessed"] = datetime.now()
-            return session
+                state = "missing"
+            elif now - session["last_accessed_monotonic"] > self._timeout_seconds() and not session["in_use"]:
+                del stripe.sessions[session_id]
+                state = "expired"
+            else:
+                session["last_accessed"] = datetime.now()
+                session["last_accessed_monotonic"] = now
+                stripe.sessions.move_to_end(session_id)
+                stale = now - session["last_synced_monotonic"] >= config_manager.get('SESSION_STORE_SYNC_SECONDS')
+                state = "stale" if stale else "live"
+
+        if state == "missing":
+            return self._adopt_session(session_id)
+        if state == "expired":
+            self._release_sessions([session])
+            self._count_stat("expired_total")
+            return None
+        if state == "stale":
+            self.sync_session(session)
+        return session
+
+    @contextmanager
+    def use_session(self, session_id: str) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Get a session and mark it busy for the duration of the block
+
+        Busy sessions are never evicted to make room for new ones.
+        """
+        session = self.get_session(session_id)
+        if not session:
+            yield None
+            return
+
+        stripe = self._stripe_for(session_id)
+        with stripe.lock:
+            session["in_use"] += 1
+        try:
+            yield session
+        finally:
+            with stripe.lock:
+                session["in_use"] -= 1
+
+    def end_session(self, session_id: str) -> bool:
+        """Close and remove one session, unless it is serving a request"""
+        stripe = self._stripe_for(session_id)
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            if not session or session["in_use"]:
+                return False
+            del stripe.sessions[session_id]
+        self._release_sessions([session], forget_shared=True)
+        self._count_stat("cleared_total")
+        return True
 
     def get_all_sessions(self) -> List[Dict[str, Any]]:
         """Get info for all active sessions"""
-        with self._lock:
-            return [{
-                "session_id": sid,
-                "model_type": session["model_type"],
-                "created_at": session["created_at"].isoformat(),
-                "last_accessed": session["last_accessed"].isoformat(),
-                "conversation_length": len(session.get("conversation", []))
-            } for sid, session in self.sessions.items()]
+        sessions = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                sessions.extend({
+                    "session_id": sid,
+                    "model_type": session["model_type"],
+                    "created_at": session["created_at"].isoformat(),
+                    "last_accessed": session["last_accessed"].isoformat(),
+                    "account": session.get("account"),
+                    "conversation_length": len(session.get("conversation", []))
+                } for sid, session in stripe.sessions.items())
+        return sessions
 
     def clear_all_sessions(self) -> int:
         """Clear all active sessions and return count of cleared sessions"""
-        with self._lock:
-            count = len(self.sessions)
-            self.sessions.clear()
-            self.session_stats["cleared_total"] += count
-            return count
+        cleared = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                cleared.extend(stripe.sessions.values())
+                stripe.sessions.clear()
+        self._call_store("clear", current_owner())
+        self._release_sessions(cleared)
+        self._count_stat("cleared_total", len(cleared))
+        return len(cleared)
+
+    def counters(self) -> Dict[str, int]:
+        """Current values of the session statistics counters"""
+        with self._stats_lock:
+            return dict(self.session_stats)
 
     def get_session_stats(self) -> Dict[str, Any]:
         """Get session statistics"""
-        with self._lock:
-            return {
-                **self.session_stats,
-                "active_count": len(self.sessions),
-                "active_by_model": self._get_model_distribution()
-            }
+        return {
+            **self.counters(),
+            "overflow_policy": config_manager.get('SESSION_OVERFLOW_POLICY'),
+            "active_count": self.count(),
+            "shared_count": self._call_store("count"),
+            "active_by_model": self._get_model_distribution()
+        }
 
     def _get_model_distribution(self) -> Dict[str, int]:
         """Get count of active sessions by model type"""
         distribution = {}
-        for session in self.sessions.values():
-            model = session["model_type"]
-            distribution[model] = distribution.get(model, 0) + 1
+        for stripe in self._stripes:
+            with stripe.lock:
+                for session in stripe.sessions.values():
+                    model = session["model_type"]
+                    distribution[model] = distribution.get(model, 0) + 1
         return distribution
 
+    def _run_periodically(self, interval: Callable[[], float], task: Callable[[], None]) -> None:
+        """
+        Run task every interval() seconds until stopped
+
+        The interval is re-read when the config changes, so a new setting
+        applies from the last run instead of after the old wait ran out.
+        """
+        last_run = time.monotonic()
+        while True:
+            with self._wake:
+                if self._stop_event.is_set():
+                    return
+                remaining = last_run + interval() - time.monotonic()
+                if remaining > 0:
+                    self._wake.wait(remaining)
+                    continue
+            last_run = time.monotonic()
+            task()
+
+    def on_config_change(self, old: Mapping, new: Mapping) -> None:
+        """Config subscriber: wake waiters and timers so new limits take effect now"""
+        with self._capacity:
+            self._capacity.notify_all()
+        with self._wake:
+            self._wake.notify_all()
+
     def _start_cleanup_thread(self) -> None:
         """Start thread for periodic session cleanup"""
-        def cleanup_loop():
-            while True:
-                time.sleep(config_manager.get('CLEANUP_INTERVAL_MINUTES') * 60)
-                self._cleanup_expired_sessions()
-
-        thread = threading.Thread(target=cleanup_loop, daemon=True)
+        thread = threading.Thread(
+            target=self._run_periodically,
+            args=(lambda: config_manager.get('CLEANUP_INTERVAL_MINUTES') * 60, self._cleanup_expired_sessions),
+            name="session-cleanup",
+            daemon=True
+        )
         thread.start()
 
     def _cleanup_expired_sessions(self) -> None:
-        """Remove expired sessions"""
-        with self._lock:
-            now = datetime.now()
-            timeout = timedelta(minutes=config_manager.get('SESSION_TIMEOUT_MINUTES'))
-            expired = [
-                sid for sid, session in self.sessions.items()
-                if now - session["last_accessed"] > timeout
-            ]
-            for sid in expired:
-                del self.sessions[sid]
-                self.session_stats["expired_total"] += 1
+        """
+        Remove expired sessions
+
+        Each stripe is popped from its least recently used end until a live
+        session is found, so a sweep costs time proportional to the number of
+        expired sessions and only holds one stripe lock at a time. A session
+        still serving a request that outlasted SESSION_TIMEOUT is moved to the
+        most recently used end instead, like eviction never takes busy ones.
+        """
+        cutoff = time.monotonic() - self._timeout_seconds()
+        expired = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                for _ in range(len(stripe.sessions)):
+                    sid, session = next(iter(stripe.sessions.items()))
+                    if session["last_accessed_monotonic"] >= cutoff:
+                        break
+                    if session["in_use"]:
+                        stripe.sessions.move_to_end(sid)
+                        continue
+                    del stripe.sessions[sid]
+                    expired.append(session)
+        self._release_sessions(expired)
+        self._count_stat("expired_total", len(expired))
+
+    def snapshot_sessions(self) -> int:
+        """
+        Write session metadata and history tails to SESSION_SNAPSHOT_PATH
+
+        Only sessions whose access time, history length or conversation id
+        changed since the last snapshot are re-serialized. The file is written
+        to a temporary name and atomically renamed into place.
+
+        Returns:
+            Number of sessions re-serialized
+        """
+        path = self._snapshot_path()
+        if not path:
+            return 0
+
+        with self._snapshot_lock:
+            live = set()
+            changed = []
+            for stripe in self._stripes:
+                with stripe.lock:
+                    for sid, session in stripe.sessions.items():
+                        live.add(sid)
+                        stamp = (session["last_accessed"], len(session["conversation"]), session.get("conversation_id"))
+                        cached = self._snapshot_cache.get(sid)
+                        if not cached or cached[0] != stamp:
+                            changed.append((sid, stamp, session))
+
+            for sid in list(self._snapshot_cache):
+                if sid not in live:
+                    del self._snapshot_cache[sid]
+            for sid, stamp, session in changed:
+                self._snapshot_cache[sid] = (stamp, json.dumps({
+                    "session_id": sid,
+                    "model_type": session["model_type"],
+                    "created_at": session["created_at"].isoformat(),
+                    "last_accessed": session["last_accessed"].isoformat(),
+                    "conversation_id": session.get("conversation_id"),
+                    "account": session.get("account"),
+                    "conversation": session["conversation"].to_snapshot()
+                }, default=str))
+
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for _, line in self._snapshot_cache.values():
+                    f.write(line + "\n")
+            os.replace(temp_path, path)
+
+        self._count_stat("snapshots_total")
+        return len(changed)
+
+    def restore_sessions(self) -> int:
+        """
+        Load sessions from SESSION_SNAPSHOT_PATH after a restart
+
+        Clients are not recreated here: Grok sessions rebind to their
+        conversation id on first use and ChatGPT sessions open a new browser.
+
+        Returns:
+            Number of sessions restored
+        """
+        path = self._snapshot_path()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logging.error(f"Failed to read session snapshot {path}: {str(e)}")
+            return 0
+
+        now = datetime.now()
+        timeout = self._timeout_seconds()
+        restored = 0
+        # Most recently used first, so those are kept when capacity runs short;
+        # malformed records sort last and are skipped below
+        records = [record for record in records if isinstance(record, dict)]
+        for record in sorted(records, key=lambda r: str(r.get("last_accessed") or ""), reverse=True):
+            try:
+                session_id = record["session_id"]
+                last_accessed = datetime.fromisoformat(record["last_accessed"])
+                idle = (now - last_accessed).total_seconds()
+                if idle > timeout or not self._has_capacity():
+                    # Not coming back: drop its spilled history too
+                    ConversationHistory.from_snapshot(session_id, record.get("conversation", {})).delete()
+                    continue
+
+                session = self._new_session(
+                    session_id,
+                    record["model_type"],
+                    datetime.fromisoformat(record["created_at"]),
+                    record.get("conversation_id"),
+                    record.get("account")
+                )
+                session["conversation"] = ConversationHistory.from_snapshot(session_id, record.get("conversation", {}))
+                session["last_accessed"] = last_accessed
+                session["last_accessed_monotonic"] = time.monotonic() - max(idle, 0)
+                stripe = self._stripe_for(session_id)
+                with stripe.lock:
+                    stripe.sessions[session_id] = session
+                self.sync_session(session)
+                restored += 1
+            except (KeyError, TypeError, ValueError) as e:
+                logging.error(f"Skipping invalid session snapshot record: {str(e)}")
+
+        self._count_stat("restored_total", restored)
+        logging.info(f"Restored {restored} sessions from {path}")
+        return restored
+
+    def _start_snapshot_thread(self) -> None:
+        """Start thread for periodic session snapshots"""
+        if not self._snapshot_path():
+            return
+
+        def snapshot():
+            try:
+                self.snapshot_sessions()
+            except Exception as e:
+                logging.error(f"Session snapshot failed: {str(e)}")
+
+        thread = threading.Thread(
+            target=self._run_periodically,
+            args=(lambda: config_manager.get('SESSION_SNAPSHOT_INTERVAL_SECONDS'), snapshot),
+            name="session-snapshot",
+            daemon=True
+        )
+        thread.start()
 
 session_manager = SessionManager()
+metrics.gauge("sessions_active", "Live sessions held by this process", ("model",),
+              function=session_manager._get_model_distribution)
+metrics.counter("session_events_total", "Sessions created, expired, evicted, restored and so on", ("event",),
+                function=lambda: {name[:-len("_total")]: value for name, value in session_manager.counters().items()})
+config_manager.subscribe(session_manager.on_config_change, (
+    'MAX_SESSIONS', 'CLEANUP_INTERVAL_MINUTES', 'SESSION_SNAPSHOT_INTERVAL_SECONDS'
+))
+lifecycle.register("sessions", session_manager.start, session_manager.stop)
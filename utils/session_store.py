@@ -0,0 +1,378 @@
+from typing import Dict, Any, Optional, List, Tuple
+from abc import ABC, abstractmethod
+from urllib.parse import urlparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from utils.config_manager import config_manager
+
+class SessionStore(ABC):
+    """
+    Shared session metadata backend.
+
+    Only JSON-serializable metadata lives here (model type, timestamps, the
+    owning process and the Grok conversation id). Live client objects stay
+    pinned in the owning process's SessionManager.
+    """
+
+    @abstractmethod
+    def save(self, session_id: str, metadata: Dict[str, Any], ttl_seconds: float) -> None:
+        """Create or replace a session record that expires after ttl_seconds"""
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return a session record, or None if missing or expired"""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Remove a session record"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of unexpired session records"""
+
+    @abstractmethod
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """Return all unexpired session records"""
+
+    @abstractmethod
+    def clear(self, owner: Optional[str] = None) -> None:
+        """Remove every session record, or only those owned by owner"""
+
+    @abstractmethod
+    def incr(self, key: str, ttl_seconds: float, amount: int = 1) -> int:
+        """
+        Add amount (which may be negative) to a shared counter and return its new value
+
+        A counter starts at 0 and disappears ttl_seconds after it was
+        created, which makes it a fixed-window counter for rate limits.
+        """
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store, the default for single-process deployments"""
+
+    def __init__(self):
+        self._records: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._counters: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def save(self, session_id: str, metadata: Dict[str, Any], ttl_seconds: float) -> None:
+        with self._lock:
+            self._records[session_id] = (time.time() + ttl_seconds, dict(metadata))
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(session_id)
+            if not record:
+                return None
+            if record[0] < time.time():
+                del self._records[session_id]
+                return None
+            return dict(record[1])
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._records.pop(session_id, None)
+
+    def count(self) -> int:
+        return len(self.list_sessions())
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (expires_at, _) in self._records.items() if expires_at < now]
+            for sid in expired:
+                del self._records[sid]
+            return [dict(metadata) for _, metadata in self._records.values()]
+
+    def clear(self, owner: Optional[str] = None) -> None:
+        with self._lock:
+            if owner is None:
+                self._records.clear()
+                return
+            for sid in [sid for sid, (_, metadata) in self._records.items() if metadata.get("owner") == owner]:
+                del self._records[sid]
+
+    def incr(self, key: str, ttl_seconds: float, amount: int = 1) -> int:
+        now = time.time()
+        with self._lock:
+            expires_at, value = self._counters.get(key, (0.0, 0))
+            if expires_at < now:
+                if len(self._counters) > 10000:
+                    self._counters = {k: v for k, v in self._counters.items() if v[0] >= now}
+                expires_at, value = now + ttl_seconds, 0
+            self._counters[key] = (expires_at, value + amount)
+            return value + amount
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite-backed store shared by every worker process on one host.
+
+    Each thread gets its own connection; WAL mode lets readers proceed while
+    another process writes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def save(self, session_id: str, metadata: Dict[str, Any], ttl_seconds: float) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(metadata), time.time() + ttl_seconds)
+        )
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE session_id = ? AND expires_at >= ?",
+            (session_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, session_id: str) -> None:
+        self._connection().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _purge_expired(self) -> None:
+        self._connection().execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+
+    def count(self) -> int:
+        self._purge_expired()
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        self._purge_expired()
+        rows = self._connection().execute("SELECT data FROM sessions").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def clear(self, owner: Optional[str] = None) -> None:
+        conn = self._connection()
+        if owner is None:
+            conn.execute("DELETE FROM sessions")
+            return
+        rows = conn.execute("SELECT session_id, data FROM sessions").fetchall()
+        owned = [(sid,) for sid, data in rows if json.loads(data).get("owner") == owner]
+        conn.executemany("DELETE FROM sessions WHERE session_id = ?", owned)
+
+    def incr(self, key: str, ttl_seconds: float, amount: int = 1) -> int:
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM counters WHERE expires_at < ?", (now,))
+            conn.execute(
+                "INSERT INTO counters (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                (key, amount, now + ttl_seconds)
+            )
+            value = conn.execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+class RespClient:
+    """
+    Minimal RESP2 client, enough for the commands the stores use.
+
+    Speaking the protocol directly avoids a hard dependency on redis-py and
+    lets tests point the store at any local Redis-compatible stand-in.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> Tuple[socket.socket, Any]:
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        reader = sock.makefile("rb")
+        self._local.conn = (sock, reader)
+        self._local.pid = os.getpid()
+        if self.password:
+            self.execute("AUTH", self.password)
+        if self.db:
+            self.execute("SELECT", self.db)
+        return self._local.conn
+
+    def _get_conn(self) -> Tuple[socket.socket, Any]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._connect()
+        return conn
+
+    def _drop_conn(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn:
+            try:
+                conn[0].close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _encode(args: tuple) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def _read_reply(self, reader) -> Any:
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            raise RespError(payload.decode("utf-8"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply(reader) for _ in range(length)]
+        raise RespError(f"Unexpected reply type: {line!r}")
+
+    def execute(self, *args, retry: bool = True) -> Any:
+        """
+        Send one command and return its decoded reply
+
+        A dropped connection is reconnected and the command sent once more,
+        unless retry is False: a command that isn't idempotent (INCR) may
+        already have run before the connection dropped.
+        """
+        for attempt in range(2 if retry else 1):
+            sock, reader = self._get_conn()
+            try:
+                sock.sendall(self._encode(args))
+                return self._read_reply(reader)
+            except (ConnectionError, OSError):
+                self._drop_conn()
+                if attempt or not retry:
+                    raise
+
+# INCRBY KEYS[1] by ARGV[1], giving a counter without a TTL one of ARGV[2] seconds
+_INCR_SCRIPT = """
+local count = redis.call('INCRBY', KEYS[1], ARGV[1])
+if redis.call('TTL', KEYS[1]) == -1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return count
+"""
+
+class RedisSessionStore(SessionStore):
+    """
+    Redis-protocol store for sharing sessions between processes or hosts.
+
+    Records are plain keys with a TTL; a sorted set scored by expiry time
+    indexes them so counting and listing never need KEYS or SCAN.
+    """
+
+    def __init__(self, url: str, prefix: str = "freeaiapi:session:"):
+        self.client = RespClient(url)
+        self.prefix = prefix
+        self.index_key = prefix.rstrip(":") + "s"
+
+    def save(self, session_id: str, metadata: Dict[str, Any], ttl_seconds: float) -> None:
+        ttl = max(int(ttl_seconds), 1)
+        self.client.execute("SET", self.prefix + session_id, json.dumps(metadata), "EX", ttl)
+        self.client.execute("ZADD", self.index_key, time.time() + ttl, session_id)
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        data = self.client.execute("GET", self.prefix + session_id)
+        return json.loads(data) if data else None
+
+    def delete(self, session_id: str) -> None:
+        self.client.execute("DEL", self.prefix + session_id)
+        self.client.execute("ZREM", self.index_key, session_id)
+
+    def _purge_expired(self) -> None:
+        self.client.execute("ZREMRANGEBYSCORE", self.index_key, "-inf", time.time())
+
+    def count(self) -> int:
+        self._purge_expired()
+        return self.client.execute("ZCARD", self.index_key)
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        self._purge_expired()
+        session_ids = self.client.execute("ZRANGE", self.index_key, 0, -1)
+        if not session_ids:
+            return []
+        values = self.client.execute("MGET", *[self.prefix + sid for sid in session_ids])
+        return [json.loads(value) for value in values if value]
+
+    def clear(self, owner: Optional[str] = None) -> None:
+        session_ids = self.client.execute("ZRANGE", self.index_key, 0, -1)
+        if not session_ids:
+            return
+        if owner is not None:
+            values = self.client.execute("MGET", *[self.prefix + sid for sid in session_ids])
+            session_ids = [sid for sid, value in zip(session_ids, values)
+                           if value and json.loads(value).get("owner") == owner]
+            if not session_ids:
+                return
+        self.client.execute("DEL", *[self.prefix + sid for sid in session_ids])
+        self.client.execute("ZREM", self.index_key, *session_ids)
+
+    def incr(self, key: str, ttl_seconds: float, amount: int = 1) -> int:
+        counter_key = self.prefix.split(":", 1)[0] + ":counter:" + key
+        # One script, so the counter never exists without its TTL and can't
+        # outlive its window; not retried, as it may have run already
+        return self.client.execute("EVAL", _INCR_SCRIPT, 1, counter_key, amount, max(int(ttl_seconds), 1),
+                                   retry=False)
+
+def create_session_store(backend: Optional[str] = None) -> SessionStore:
+    """Build the session store selected by SESSION_STORE"""
+    backend = backend or config_manager.get('SESSION_STORE')
+    if backend == "sqlite":
+        return SQLiteSessionStore(config_manager.get('SESSION_STORE_PATH'))
+    if backend == "redis":
+        return RedisSessionStore(config_manager.get('SESSION_STORE_URL'))
+    return InMemorySessionStore()
+
+def current_owner() -> str:
+    """Identifier of this worker process, recorded as the owner of sessions it creates"""
+    return f"{config_manager.get('NODE_ID') or socket.gethostname()}:{os.getpid()}"
+
+session_store = create_session_store()
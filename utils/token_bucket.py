@@ -0,0 +1,60 @@
+from typing import Optional
+import threading
+import time
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Holds up to `capacity` tokens and refills at `rate` (> 0) tokens per second.
+    A call either takes a token now (try_acquire) or reserves the next free
+    one and learns how long to wait for it (reserve), so callers never spin.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if they are available now"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def reserve(self, max_wait: Optional[float] = None, tokens: float = 1.0) -> Optional[float]:
+        """
+        Reserve tokens, possibly ahead of the refill
+
+        Returns:
+            Seconds to wait before using the reservation, or None (and nothing
+            reserved) if that would take longer than max_wait
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = max(tokens - self._tokens, 0.0) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= tokens
+            return wait
+
+    def refund(self, tokens: float = 1.0) -> None:
+        """Return tokens taken for a request that was not admitted after all"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def available(self) -> float:
+        """Tokens available right now (negative while reservations are outstanding)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
@@ -0,0 +1,211 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from queue import Empty, Full, Queue
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from utils.config_manager import config_manager
+from utils.lifecycle import lifecycle
+from utils.metrics import Histogram, metrics
+
+# Sampled traces waiting for the writer thread before new ones are dropped
+TRACE_QUEUE_SIZE = 1000
+
+TRACES_DROPPED = metrics.counter(
+    "trace_records_dropped_total",
+    "Sampled traces discarded because the trace writer's queue was full"
+)
+
+class Trace:
+    """
+    Timed spans of one request or queued task.
+
+    Spans are (name, start, duration) in perf_counter seconds. A stage that
+    runs more than once, such as one upload per attachment, adds a span
+    each time; summary() adds them up per name.
+    """
+
+    def __init__(self, name: str, sampled: bool, started: Optional[float] = None, **attributes):
+        now = time.perf_counter()
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.sampled = sampled
+        self.attributes: Dict[str, Any] = attributes
+        self.start = now if started is None else started
+        self.started_at = time.time() - (now - self.start)
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def add(self, name: str, start: float, duration: float) -> None:
+        # list.append is atomic, so spans may come from worker threads too
+        self.spans.append((name, start, duration))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def summary(self) -> Dict[str, float]:
+        """Milliseconds per span name in order of first appearance, plus the total so far"""
+        totals: Dict[str, float] = {}
+        for name, _, duration in list(self.spans):
+            totals[name] = totals.get(name, 0.0) + duration
+        totals["total"] = self.elapsed()
+        return {name: round(seconds * 1000, 1) for name, seconds in totals.items()}
+
+    def server_timing(self) -> str:
+        """The summary as a Server-Timing header value"""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.summary().items())
+
+    def to_record(self) -> Dict[str, Any]:
+        """JSON-serializable record for the trace file"""
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": round(self.started_at, 6),
+            "duration_ms": round(self.elapsed() * 1000, 3),
+            **self.attributes,
+            "spans": [
+                {
+                    "name": name,
+                    "offset_ms": round((start - self.start) * 1000, 3),
+                    "duration_ms": round(duration * 1000, 3)
+                }
+                for name, start, duration in list(self.spans)
+            ]
+        }
+
+class Tracer:
+    """
+    Span instrumentation carried in a context variable.
+
+    The current trace follows a request through the calls it makes,
+    including coroutines on the same task; work handed to thread pools
+    must be run in a copy of the caller's context (contextvars.copy_context)
+    to keep adding to it. Spans outside a trace cost two clock reads. A
+    TRACE_SAMPLE_RATE share of traces is appended to TRACE_FILE as JSON lines
+    by a writer thread, so requests never wait on the disk; while no writer
+    runs in the process (before start, after stop) traces are written directly.
+    """
+
+    def __init__(self):
+        self._current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+        self._write_lock = threading.Lock()
+        self._queue: Queue = Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+
+    def start(self) -> None:
+        """Start this process's trace writer thread"""
+        if self._writer_pid == os.getpid():
+            return
+        self._queue = Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._writer = threading.Thread(target=self._drain, args=(self._queue,), name="trace-writer", daemon=True)
+        self._writer.start()
+        self._writer_pid = os.getpid()
+
+    def stop(self) -> None:
+        """Write out queued traces and stop the writer thread"""
+        if self._writer_pid != os.getpid():
+            return
+        self._writer_pid = None
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+    def current(self) -> Optional[Trace]:
+        """The trace of the running request, if any"""
+        return self._current.get()
+
+    def begin(self, name: str, started: Optional[float] = None, **attributes) -> Token:
+        """
+        Make a new trace current; pass the returned token to end()
+
+        Args:
+            name: What is traced, e.g. 'POST /api/chat/send'
+            started: perf_counter time the trace began, if before now
+            attributes: Extra fields for the trace file record
+        """
+        sampled = bool(config_manager.get('TRACE_FILE')) and random.random() < config_manager.get('TRACE_SAMPLE_RATE')
+        return self._current.set(Trace(name, sampled, started, **attributes))
+
+    def end(self, token: Token) -> Optional[Trace]:
+        """Finish the trace begun with token, writing it out if sampled"""
+        trace = self._current.get()
+        self._current.reset(token)
+        if trace is not None and trace.sampled:
+            self._write(trace)
+        return trace
+
+    @contextmanager
+    def trace(self, name: str, started: Optional[float] = None, **attributes) -> Iterator[Trace]:
+        """Run the block as a new trace"""
+        token = self.begin(name, started, **attributes)
+        try:
+            yield self._current.get()
+        finally:
+            self.end(token)
+
+    @contextmanager
+    def span(self, name: str, histogram: Optional[Histogram] = None, **labels) -> Iterator[None]:
+        """
+        Time the block as a span of the current trace
+
+        Args:
+            name: Span name; must be a token, as it is sent in Server-Timing
+            histogram: Also observe the duration here, with labels
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            trace = self._current.get()
+            if trace is not None:
+                trace.add(name, start, duration)
+            if histogram is not None:
+                histogram.observe(duration, **labels)
+
+    def _write(self, trace: Trace) -> None:
+        try:
+            line = json.dumps(trace.to_record(), default=str)
+        except ValueError as e:
+            logging.error(f"Failed to serialize trace {trace.trace_id}: {str(e)}")
+            return
+        if self._writer_pid != os.getpid():
+            self._append([line])
+            return
+        try:
+            self._queue.put_nowait(line)
+        except Full:
+            # Dropping beats blocking the request that was traced
+            TRACES_DROPPED.inc()
+
+    def _drain(self, queue: Queue) -> None:
+        """Writer thread: append queued traces in batches until stopped"""
+        while True:
+            lines = [queue.get()]
+            try:
+                while len(lines) < TRACE_QUEUE_SIZE:
+                    lines.append(queue.get_nowait())
+            except Empty:
+                pass
+            stopping = None in lines
+            self._append([line for line in lines if line is not None])
+            if stopping:
+                return
+
+    def _append(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        path = config_manager.get('TRACE_FILE')
+        try:
+            with self._write_lock:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("".join(line + "\n" for line in lines))
+        except OSError as e:
+            logging.error(f"Failed to write traces to {path}: {str(e)}")
+
+tracer = Tracer()
+lifecycle.register("tracing", tracer.start, tracer.stop)